@@ -0,0 +1,279 @@
+# -- coding: utf-8 --
+
+# Batch design of many sgRNA arrays. The manifest is a JSON Lines file, one
+# construct per line:
+#
+#     {"id": "lib1-007", "modules": ["g1\tGATTACA...", "g2\tTTGACC...,ACGTTG..."],
+#      "donor": "pGN1102", "promoter_order": ["m6a", "m3"], "max_designs": 3}
+#
+# modules are the lines of a target file (see
+# primerMakerEngine.parse_target_lines); donor, promoter_order,
+# upstream_overhang, downstream_overhang, max_designs, enzyme and enzymes are
+# optional and default to the options of the run. id defaults to the line
+# number. overhang_plan (see primerMakerEngine.design) is set by libraryPlan.
+#
+#     python batchDesign.py -m manifest.jsonl -o results.jsonl -w 8
+#
+# The constructs are sent to a process pool in chunks and every result is
+# written as soon as its chunk is done, one JSON object per line with the id
+# and either the design ("status": "ok") or the error ("status": "error"). The
+# results file is also the checkpoint: with --resume the constructs already in
+# it are skipped and the new results are appended.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import primerMakerEngine as engine
+from designCache import DesignCache, result_to_dict
+from ligationFidelity import default_matrix_path
+
+DEFAULT_CHUNK_SIZE = 16
+# chunks sent to the pool ahead of the results, per worker
+CHUNKS_AHEAD = 2
+CONSTRUCT_KEYS = ('id', 'modules', 'donor', 'promoter_order', 'upstream_overhang', 'downstream_overhang',
+                  'max_designs', 'enzyme', 'enzymes', 'overhang_plan')
+
+
+class ManifestError(Exception):
+    pass
+
+
+# (id, record, error) of every construct of the manifest; a line that cannot be read, or repeats an id, gets the id
+# "line <number>", no record and the error
+def read_manifest(lines):
+    seen = set()
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('a construct must be a JSON object')
+        except ValueError as e:
+            yield f'line {number}', None, f'Bad manifest line {number}: {e}'
+            continue
+        construct_id = str(record.get('id', f'line {number}'))
+        if construct_id in seen:
+            yield f'line {number}', None, f'Duplicate construct id {construct_id} at line {number}'
+            continue
+        seen.add(construct_id)
+        yield construct_id, record, None
+
+
+# ids already in a results file; a last line cut by an interrupted run is removed
+def completed_ids(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb+') as f:
+        good = 0
+        for line in f:
+            try:
+                done.add(json.loads(line)['id'])
+            except (ValueError, KeyError):
+                break
+            good += len(line)
+        f.truncate(good)
+    return done
+
+
+_worker = {}
+
+
+def _init_worker(options):
+    _worker['options'] = options
+    _worker['cache'] = DesignCache(options['cache_dir']) if options.get('cache_dir') else None
+
+
+# (candidate_target_seq, module_name, promoter_order) of a construct record
+def construct_inputs(record):
+    unknown = set(record) - set(CONSTRUCT_KEYS)
+    if unknown:
+        raise ManifestError(f'Unknown construct fields: {", ".join(sorted(unknown))}')
+    modules = record.get('modules')
+    if isinstance(modules, str):
+        modules = modules.splitlines()
+    if not isinstance(modules, list) or not modules:
+        raise ManifestError('A construct needs a non empty list of modules')
+    if not all(isinstance(x, str) for x in modules):
+        raise ManifestError('Every module must be a string, "name<TAB>sequence" or "sequence"')
+    candidate_target_seq, module_num, module_name = engine.parse_target_lines(modules)
+    promoter_order = record.get('promoter_order')
+    if isinstance(promoter_order, str):
+        promoter_order = [x.strip() for x in promoter_order.split(',') if x.strip()]
+    if promoter_order is not None and (not isinstance(promoter_order, list) or
+                                       not all(isinstance(x, str) for x in promoter_order)):
+        raise ManifestError('promoter_order must be a list of promoter names')
+    return candidate_target_seq, module_name, promoter_order
+
+
+# a construct with an overhang_plan (see libraryPlan) is designed on its own when it has no design within the plan,
+# its result then says which ("plan": "shared" or "own")
+def design_construct(construct_id, record, options, cache=None):
+    start = time.perf_counter()
+    plan = None
+    try:
+        candidate_target_seq, module_name, promoter_order = construct_inputs(record)
+        enzyme = record.get('enzyme', options['enzyme'])
+        fidelity_matrix = options['fidelity_matrix']
+        if fidelity_matrix is None:
+            fidelity_matrix = default_matrix_path(engine.get_profile(enzyme).overhang_length)
+        def run(overhang_plan):
+            return engine.design(candidate_target_seq, module_name, record.get('donor', options['donor']),
+                                 promoter_order or None, record.get('upstream_overhang', ''),
+                                 record.get('downstream_overhang', ''),
+                                 int(record.get('max_designs', options['max_designs'])), fidelity_matrix,
+                                 max_nodes=options['max_nodes'], cache=cache, enzymes=record.get('enzymes'),
+                                 profile=enzyme, overhang_plan=overhang_plan)
+        if record.get('overhang_plan') is not None:
+            try:
+                result = run(record['overhang_plan'])
+                plan = 'shared'
+            except engine.DesignError:
+                result = run(None)
+                plan = 'own'
+        else:
+            result = run(None)
+    except (engine.DesignError, ManifestError, ValueError, TypeError, OSError) as e:
+        return {'id': construct_id, 'status': 'error', 'error': str(e).strip(),
+                'seconds': round(time.perf_counter() - start, 6)}
+    # any other failure is still the error of this construct only, the batch goes on
+    except Exception as e:
+        return {'id': construct_id, 'status': 'error', 'error': f'{type(e).__name__}: {e}',
+                'seconds': round(time.perf_counter() - start, 6)}
+    x = {'id': construct_id, 'status': 'ok', 'result': result_to_dict(result),
+         'seconds': round(time.perf_counter() - start, 6)}
+    if plan is not None:
+        x['plan'] = plan
+    return x
+
+
+def _design_chunk(chunk):
+    return [design_construct(construct_id, record, _worker['options'], _worker['cache'])
+            for construct_id, record in chunk]
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# designs the constructs of manifest (an iterable of lines) and writes their results to output (a text file) in
+# order of completion; done holds the ids to skip. Returns the number of constructs designed and failed.
+def run_batch(manifest, output, options, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, done=(), on_result=None):
+    counts = {'ok': 0, 'error': 0}
+
+    def write(results):
+        for x in results:
+            output.write(json.dumps(x) + '\n')
+            counts[x['status']] += 1
+            if on_result is not None:
+                on_result(x)
+        # flushed after every chunk, an interrupted run only loses the chunks it was designing
+        output.flush()
+
+    def constructs():
+        for construct_id, record, error in read_manifest(manifest):
+            if construct_id in done:
+                continue
+            if error is not None:
+                write([{'id': construct_id, 'status': 'error', 'error': error}])
+            else:
+                yield construct_id, record
+
+    # the manifest is read as the chunks are sent, it is never held whole
+    chunks = _chunks(constructs(), chunk_size)
+    if workers <= 1:
+        _init_worker(options)
+        for chunk in chunks:
+            write(_design_chunk(chunk))
+        return counts['ok'], counts['error']
+
+    # imported here, like the parallel overhang search
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as pool:
+        pending = set()
+        try:
+            for chunk in chunks:
+                pending.add(pool.submit(_design_chunk, chunk))
+                if len(pending) >= workers * CHUNKS_AHEAD:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        write(future.result())
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(future.result())
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return counts['ok'], counts['error']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='batchDesign', description='Design the primers of many sgRNA arrays.')
+    parser.add_argument('-m', '--manifest', required=True, help='JSON Lines file, one construct per line')
+    parser.add_argument('-o', '--output', required=True, help='JSON Lines results, one construct per line')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip the constructs already in the output and append the others')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes designing constructs (default: the number of CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='constructs sent to a process at once (default: %(default)s)')
+    parser.add_argument('-d', '--donor', default='pGN1101', choices=engine.DONORS,
+                        help='donor of the constructs without one')
+    parser.add_argument('-n', '--max-designs', type=int, default=5)
+    parser.add_argument('-e', '--enzyme', default=engine.DEFAULT_PROFILE, choices=list(engine.PROFILES))
+    parser.add_argument('--fidelity-matrix', default=None)
+    parser.add_argument('--max-nodes', type=int, default=engine.MAX_SEARCH_NODES)
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--order', default=None,
+                        help='also write the de-duplicated oligo order of all the results to this file (see orderPlan)')
+    args = parser.parse_args(argv)
+
+    options = {'donor': args.donor, 'max_designs': args.max_designs, 'enzyme': args.enzyme,
+               'fidelity_matrix': args.fidelity_matrix, 'max_nodes': args.max_nodes, 'cache_dir': args.cache_dir}
+
+    def report_error(x):
+        if x['status'] == 'error':
+            sys.stderr.write(f'{x["id"]}: {x["error"]}\n')
+
+    start = time.perf_counter()
+    done = completed_ids(args.output) if args.resume else set()
+    try:
+        with open(args.manifest, 'r') as manifest, open(args.output, 'a' if args.resume else 'w') as output:
+            designed, failed = run_batch(manifest, output, options, args.workers, args.chunk_size, done,
+                                         report_error)
+    except OSError as e:
+        sys.stderr.write(f'Error: {e}\n')
+        return 1
+    except KeyboardInterrupt:
+        sys.stderr.write('Interrupted, run again with --resume to design the rest.\n')
+        return 130
+    sys.stderr.write(f'{designed} constructs designed, {failed} failed, {len(done)} already done, '
+                     f'{time.perf_counter() - start:.1f} s\n')
+    if args.order:
+        from orderPlan import plan_order
+        try:
+            with open(args.output, 'r') as f:
+                primers, oligos = plan_order(f, args.order)
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f'Error: {e}\n')
+            return 1
+        sys.stderr.write(f'{primers} primers, {oligos} distinct oligos written to {args.order}\n')
+    return 0 if failed == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
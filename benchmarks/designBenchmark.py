@@ -0,0 +1,202 @@
+# -- coding: utf-8 --
+
+# Benchmark of the design pipeline, no display needed:
+#
+#     python benchmarks/designBenchmark.py -o bench.json
+#     python benchmarks/designBenchmark.py -o new.json --compare bench.json
+#
+# The inputs are generated from a seed, so two runs (e.g. on two commits) time
+# the same arrays. For every case it reports the best wall time of each stage
+# (deal_candidate_target_seq, filter_targets, target_combination,
+# primerMakerForOneTarget) and of the whole design(), the peak memory of one
+# design() and the number of search nodes evaluated.
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import primerMakerEngine as engine  # noqa: E402
+
+DEFAULT_MODULES = [1, 2, 3, 4, 6, 8, 10, 12, 16, 20, 24]
+DONORS = [x for x in engine.PROMOTER_ENCODE if x not in engine.PROMOTERS]
+# overhangs of the custom donor: dissimilar to each other and to their reverse complements
+CUSTOM_OVERHANGS = ('AGCG', 'GTTT')
+
+
+def random_spacer(rng, length=20):
+    while True:
+        spacer = ''.join(rng.choice('ACGT') for _ in range(length))
+        if 'GGTCTC' not in spacer and 'GAGACC' not in spacer:
+            return spacer
+
+
+# every donor with the default promoter order and with a random one, for every module count
+def generate_cases(seed, modules, candidates=1):
+    rng = random.Random(seed)
+    cases = []
+    for module_num in modules:
+        for donor in DONORS:
+            for order in ('default', 'custom'):
+                if order == 'custom' and module_num < 2:
+                    continue
+                cases.append({'name': f'{module_num}x{candidates}-{donor}-{order}',
+                              'module_num': module_num,
+                              'donor': donor,
+                              'candidate_target_seq': {m: [random_spacer(rng) for _ in range(candidates)]
+                                                       for m in range(1, module_num + 1)},
+                              'promoter_order': None if order == 'default' else
+                              [rng.choice(engine.PROMOTERS) for _ in range(module_num - 1)]})
+    return cases
+
+
+def best_time(function, repeat):
+    best = None
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+
+# the stages of engine.design, prepared the same way
+def time_stages(case, max_designs, max_nodes, scorer, repeat):
+    module_num = case['module_num']
+    donor = case['donor']
+    candidate_target_seq = case['candidate_target_seq']
+    promoter_downstream = dict(engine.PROMOTER_DOWNSTREAM)
+    downstream = engine.DOWNSTREAM_OVERHANG
+    if donor == 'custom_donor':
+        upstream, downstream = engine.check_custom_donor(*CUSTOM_OVERHANGS)
+        promoter_downstream[engine.PROMOTER_ENCODE[donor]] = upstream
+    seq_decode = dict(engine.SEQ_DECODE)
+    seq_decode[5] = [engine.SEQ_DECODE[5][0], engine.SEQ_DECODE[5][1],
+                     engine.SEQ_DECODE[5][2].format(engine.get_reverse_complement(downstream))]
+    if case['promoter_order'] is None:
+        promoter_order = engine.get_promoter_order(module_num, 'y', donor, engine.PROMOTER_ENCODE, '')
+    else:
+        promoter_order = engine.get_promoter_order(module_num, 'n', donor, engine.PROMOTER_ENCODE,
+                                                   ''.join(engine.PROMOTER_ENCODE[x] for x in case['promoter_order']))
+    donor_downstream = promoter_downstream[engine.PROMOTER_ENCODE[donor]]
+
+    stages = {}
+    stages['deal_candidate_target_seq'], deal_target_seq = best_time(
+        lambda: engine.deal_candidate_target_seq(promoter_order, candidate_target_seq, promoter_downstream,
+                                                 module_num), repeat)
+    stages['filter_targets'], filtered_target = best_time(
+        lambda: engine.filter_targets(deal_target_seq, module_num, promoter_order, promoter_downstream,
+                                      engine.BAD_SELF_PAIR_SEQ, downstream), repeat)
+    if module_num <= 2:
+        return stages, None, None
+    filtered_overhang = {m: [(seq, site, target) for target in sorted(filtered_target[m].keys())
+                             for seq, site in filtered_target[m][target]] for m in range(2, module_num)}
+    candidates = sum(len(x) for x in filtered_overhang.values())
+    stats = {}
+
+    def search():
+        stats.clear()
+        return engine.target_combination(filtered_overhang, max_sets=max_designs, scorer=scorer,
+                                         fixed_overhangs=[donor_downstream, downstream], max_nodes=max_nodes,
+                                         stats=stats)
+    stages['target_combination'], scored = best_time(search, repeat)
+    if not scored:
+        return stages, stats.get('explored'), candidates
+    end_targets = (min(filtered_target[1].keys()), min(filtered_target[module_num].keys()))
+    stages['primerMakerForOneTarget'], _ = best_time(
+        lambda: engine.primerMakerForOneTarget([combo for score, combo in scored], promoter_order, seq_decode,
+                                               deal_target_seq, end_targets), repeat)
+    return stages, stats.get('explored'), candidates
+
+
+def run_case(case, max_designs, max_nodes, fidelity_matrix, scorer, repeat):
+    upstream, downstream = CUSTOM_OVERHANGS if case['donor'] == 'custom_donor' else ('', '')
+
+    def design():
+        return engine.design(case['candidate_target_seq'], None, case['donor'], case['promoter_order'], upstream,
+                             downstream, max_designs, fidelity_matrix, max_nodes)
+
+    report = {'name': case['name'], 'module_num': case['module_num'], 'donor': case['donor'],
+              'promoter_order': 'default' if case['promoter_order'] is None else 'custom'}
+    try:
+        report['stages'], report['evaluated'], report['candidate_overhangs'] = \
+            time_stages(case, max_designs, max_nodes, scorer, repeat)
+        report['end_to_end'], result = best_time(design, repeat)
+        report['designs'] = len(result.designs)
+        tracemalloc.start()
+        design()
+        report['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    except engine.DesignError as e:
+        report['error'] = str(e).strip()
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(reports, baseline_path, out):
+    with open(baseline_path) as f:
+        baseline = {x['name']: x for x in json.load(f)['cases']}
+    print(f'{"case":32}\t{"end_to_end":>10}\t{"baseline":>10}\t{"ratio":>6}', file=out)
+    for report in reports:
+        old = baseline.get(report['name'])
+        if old is None or 'end_to_end' not in old or 'end_to_end' not in report:
+            continue
+        ratio = report['end_to_end'] / old['end_to_end'] if old['end_to_end'] else float('inf')
+        print(f'{report["name"]:32}\t{report["end_to_end"] * 1e3:9.2f}ms\t{old["end_to_end"] * 1e3:9.2f}ms\t'
+              f'{ratio:6.2f}', file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the GoGo design pipeline.')
+    parser.add_argument('-o', '--output', default='-', help='JSON report (default: stdout)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--modules', default=','.join(str(x) for x in DEFAULT_MODULES),
+                        help='comma separated module counts')
+    parser.add_argument('--candidates', type=int, default=1, help='candidate protospacers per module')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measure, the best is kept')
+    parser.add_argument('-n', '--max-designs', type=int, default=5)
+    parser.add_argument('--max-nodes', type=int, default=engine.MAX_SEARCH_NODES)
+    parser.add_argument('--fidelity-matrix', default=None)
+    parser.add_argument('--compare', default=None, help='a previous JSON report to compare the end-to-end times with')
+    args = parser.parse_args(argv)
+
+    scorer = None
+    if args.fidelity_matrix is not None:
+        scorer = engine.load_scorer(args.fidelity_matrix, engine.get_tables(4, engine.BAD_SELF_PAIR_SEQ))
+    cases = generate_cases(args.seed, [int(x) for x in args.modules.split(',')], args.candidates)
+    reports = [run_case(case, args.max_designs, args.max_nodes, args.fidelity_matrix, scorer, args.repeat)
+               for case in cases]
+    output = {'meta': {'commit': git_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+                       'seed': args.seed, 'candidates': args.candidates, 'repeat': args.repeat,
+                       'max_designs': args.max_designs, 'max_nodes': args.max_nodes,
+                       'fidelity_matrix': args.fidelity_matrix},
+              'cases': reports}
+    text = json.dumps(output, indent=1)
+    if args.output == '-':
+        sys.stdout.write(text + '\n')
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if args.compare:
+        # the JSON report can be on stdout
+        compare(reports, args.compare, sys.stderr if args.output == '-' else sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
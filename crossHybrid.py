@@ -0,0 +1,189 @@
+# -- coding: utf-8 --
+
+# Cross-hybridisation screening of a primer pool. The primers of a
+# multi-module array (or of a whole batch) share one PCR set, so the 3' end of
+# one primer must not anneal to another primer or to a protospacer it brings
+# in. A primer primes where a sequence reads the reverse complement of its 3'
+# end; a SeedIndex maps every k-mer of every sequence of the pool, packed in
+# an int (2 bits per base), to where it occurs, so the sites of a primer are
+# found from its 3' seed and extended, without comparing every pair.
+#
+#     python crossHybrid.py results.jsonl
+#
+# lists the 3' end hits of the primers of the first design of every construct
+# of a batchDesign results file.
+
+import argparse
+import json
+import sys
+from collections import namedtuple
+
+from overhangTables import BASE_CODE
+
+DEFAULT_SEED_LENGTH = 8
+# bases of the 3' end of a primer paired with a site for it to be reported
+DEFAULT_MIN_MATCH = 10
+
+# the 3' end of `primer` matches `length` bases of sequence `target` from `start` on `strand` ('-' for the reverse
+# complement of the target)
+SeedHit = namedtuple('SeedHit', ['primer', 'target', 'strand', 'start', 'length'])
+
+_COMPLEMENT = str.maketrans('ACGTacgt', 'TGCAtgca')
+
+
+def reverse_complement(sequence):
+    return sequence.translate(_COMPLEMENT)[::-1]
+
+
+# (start, packed k-mer) of every k-mer of sequence made of A, C, G and T only
+def packed_kmers(sequence, k):
+    mask = (1 << 2 * k) - 1
+    code = 0
+    valid = 0
+    for i, base in enumerate(sequence):
+        b = BASE_CODE.get(base)
+        if b is None:
+            code = valid = 0
+            continue
+        code = ((code << 2) | b) & mask
+        valid += 1
+        if valid >= k:
+            yield i - k + 1, code
+
+
+class SeedIndex:
+    def __init__(self, seed_length=DEFAULT_SEED_LENGTH):
+        self.seed_length = seed_length
+        self.names = []
+        # (top strand, reverse complement or None) of every sequence
+        self.sequences = []
+        # packed k-mer: [(sequence number, strand, start), ...]
+        self.kmers = {}
+
+    # single stranded sequences (primers) are only read on their strand, double stranded ones (templates, PCR
+    # products) on both
+    def add(self, name, sequence, both_strands=False):
+        number = len(self.sequences)
+        top = sequence.upper()
+        bottom = reverse_complement(top) if both_strands else None
+        self.names.append(name)
+        self.sequences.append((top, bottom))
+        for strand, seq in (('+', top), ('-', bottom)):
+            if seq is None:
+                continue
+            for start, code in packed_kmers(seq, self.seed_length):
+                self.kmers.setdefault(code, []).append((number, strand, start))
+        return number
+
+    # every site where at least min_match bases of the 3' end of primer anneal, the longest match at each site
+    def sites(self, primer, min_match=DEFAULT_MIN_MATCH, name=None):
+        probe = reverse_complement(primer.upper())
+        seed = next(packed_kmers(probe[:self.seed_length], self.seed_length), None)
+        if seed is None:
+            return []
+        hits = []
+        for number, strand, start in self.kmers.get(seed[1], ()):
+            target = self.sequences[number][0 if strand == '+' else 1]
+            length = self.seed_length
+            while length < len(probe) and start + length < len(target) and probe[length] == target[start + length]:
+                length += 1
+            if length >= min_match:
+                hits.append(SeedHit(name, self.names[number], strand, start, length))
+        return hits
+
+
+# screening of a pool of primers against each other and the templates, and the veto of the candidate search
+class CrossCheck:
+    def __init__(self, seed_length=DEFAULT_SEED_LENGTH, min_match=DEFAULT_MIN_MATCH):
+        if not 0 < seed_length <= min_match:
+            raise ValueError('The seed length must be positive and at most the minimum match')
+        self.seed_length = seed_length
+        self.min_match = min_match
+
+    # settings the hits depend on, for cache keys
+    def identity(self):
+        return [self.seed_length, self.min_match]
+
+    # every 3' end hit of the primers ({name: sequence}) on the primers and the templates ({name: sequence}, read on
+    # both strands); a primer sequence repeated under several names is indexed and looked up once
+    def hits(self, primers, templates=None):
+        index = SeedIndex(self.seed_length)
+        names = {}
+        for name, sequence in primers.items():
+            names.setdefault(sequence.upper(), []).append(name)
+        for sequence, same in names.items():
+            index.add(same[0], sequence)
+        for name, sequence in (templates or {}).items():
+            index.add(name, sequence, both_strands=True)
+        hits = []
+        for sequence, same in names.items():
+            found = index.sites(sequence, self.min_match)
+            for name in same:
+                hits += [x._replace(primer=name) for x in found]
+        return hits
+
+    # the keys of options ({key: [sequence, ...]}, double stranded) holding a site of the 3' end of one of primers
+    def vetoed(self, options, primers):
+        index = SeedIndex(self.seed_length)
+        for key, sequences in options.items():
+            for sequence in sequences:
+                index.add(key, sequence, both_strands=True)
+        vetoed = set()
+        for primer in set(x.upper() for x in primers):
+            vetoed.update(x.target for x in index.sites(primer, self.min_match))
+        return vetoed
+
+
+def format_hit(hit):
+    return f'{hit.primer}\t{hit.target}\t{hit.strand}\t{hit.start + 1}\t{hit.length}'
+
+
+# ({name: primer}, {name: protospacer}) of the first design of every construct of batchDesign results designed by PCR
+def results_pool(lines):
+    primers = {}
+    templates = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        x = json.loads(line)
+        # the annealed oligos of a single module are made to pair, they are not PCR primers
+        if x.get('status') != 'ok' or not x['result']['designs'] or x['result']['mode'] == 'oligo':
+            continue
+        one_design = x['result']['designs'][0]
+        for pair in one_design['primers']:
+            primers[f'{x["id"]}:{pair["forward_name"]}'] = pair['forward']
+            primers[f'{x["id"]}:{pair["reverse_name"]}'] = pair['reverse']
+        for i, target in enumerate(one_design['targets'], 1):
+            templates[f'{x["id"]}:module{i}'] = target
+    return primers, templates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='crossHybrid',
+                                     description="List the 3' end cross-hybridisations of the primers of a batch.")
+    parser.add_argument('results', help='results file of batchDesign.py')
+    parser.add_argument('-o', '--output', default='-', help='TSV of the hits (default: stdout)')
+    parser.add_argument('--seed-length', type=int, default=DEFAULT_SEED_LENGTH)
+    parser.add_argument('--min-match', type=int, default=DEFAULT_MIN_MATCH,
+                        help="3' end bases paired for a hit (default: %(default)s)")
+    args = parser.parse_args(argv)
+    try:
+        check = CrossCheck(args.seed_length, args.min_match)
+        with open(args.results, 'r') as f:
+            primers, templates = results_pool(f)
+    except (OSError, ValueError, KeyError) as e:
+        sys.stderr.write(f'Error: {e}\n')
+        return 1
+    hits = check.hits(primers, templates)
+    lines = ['Primer\tTarget\tStrand\tPosition\tLength'] + [format_hit(x) for x in hits]
+    if args.output == '-':
+        sys.stdout.write('\n'.join(lines) + '\n')
+    else:
+        with open(args.output, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+    sys.stderr.write(f'{len(primers)} primers, {len(templates)} templates, {len(hits)} hits\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# -- coding: utf-8 --
+
+# Cache of design results. The key is the sha256 of the canonical JSON of
+# everything a design depends on (see primerMakerEngine.design), so a design
+# run again with the same processed inputs is returned without searching.
+#
+# Two tiers: the last `memory_items` results of this process in an LRU dict,
+# and JSON files in a directory shared by sessions and batch workers. Files
+# are written atomically and the directory is kept under `max_bytes` by
+# removing the least recently used files, down to EVICT_TO of it. The
+# directory is only scanned on the first write, when the running total of the
+# writes since passes max_bytes, and every RESCAN_PUTS writes to see the files
+# of the other processes sharing it.
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import asdict
+
+from designModel import Design, DesignResult, PrimerPair
+
+# change it when the output of design() changes for the same inputs
+CACHE_VERSION = 1
+DEFAULT_MEMORY_ITEMS = 128
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+RESCAN_PUTS = 256
+# fraction of max_bytes an eviction goes down to, so that the next writes do not go over max_bytes again at once
+EVICT_TO = 0.9
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.environ.get('GOGO_CACHE_DIR') or os.path.join(base, 'gogo')
+
+
+def cache_key(inputs):
+    text = json.dumps({'version': CACHE_VERSION, 'inputs': inputs}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def result_to_dict(result):
+    return asdict(result)
+
+
+def result_from_dict(data):
+    designs = [Design(x['number'], [PrimerPair(**p) for p in x['primers']], x['overhangs'], x['targets'],
+                      x['fidelity'], x.get('thermo')) for x in data['designs']]
+    # JSON object keys are strings, the module positions are ints
+    candidate_target_seq = {int(k): v for k, v in data['candidate_target_seq'].items()}
+    return DesignResult(candidate_target_seq, data['module_num'], data['module_name'], data['promoter_order'],
+                        data['promoter_order_decode'], data['mode'], designs, data['exhaustive'],
+                        data.get('repaired', False))
+
+
+class DesignCache:
+    def __init__(self, directory=None, memory_items=DEFAULT_MEMORY_ITEMS, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        # bytes in the directory at the last scan plus those written since, None before the first scan
+        self.size = None
+        self.puts = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    # a new DesignResult every time, the caller may change it
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            return result_from_dict(data)
+        if self.directory is None:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        self.remember(key, data)
+        return result_from_dict(data)
+
+    def put(self, key, result):
+        data = result_to_dict(result)
+        self.remember(key, data)
+        if self.directory is None:
+            return
+        path = self.path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            written = os.path.getsize(temp)
+            try:
+                written -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(temp, path)
+            self.puts += 1
+            if self.size is not None:
+                self.size += written
+            if self.size is None or self.size > self.max_bytes or self.puts % RESCAN_PUTS == 0:
+                self.evict()
+        except OSError:
+            # the cache is only an optimisation, a read-only or full disk must not stop a design
+            pass
+
+    def remember(self, key, data):
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        files = []
+        total = 0
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+                total += stat.st_size
+        if total > self.max_bytes:
+            for mtime, path, size in sorted(files):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+        self.size = total
+
+    def clear(self):
+        self.memory.clear()
+        self.size = None
+        if self.directory is None:
+            return
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError:
+                        pass
@@ -0,0 +1,175 @@
+# -- coding: utf-8 --
+
+# Writing designs to files while they are produced. An exporter gets the
+# designs one by one through write_design and keeps at most chunk_size rows in
+# memory before writing them out, so a long batch run never holds its whole
+# output.
+#
+# Formats: 'tsv' and 'csv' (the columns of designModel.COLUMNS), 'jsonl' (one
+# JSON object per design) and 'plate96' / 'plate384' (an oligo order sheet:
+# every primer gets a well, filled column by column, A1, B1, ..., then the
+# next plate).
+
+import abc
+import csv
+import io
+import json
+import os
+from dataclasses import asdict
+
+from designModel import COLUMNS, design_rows
+from primerMakerEngine import DesignMonitor
+
+DEFAULT_CHUNK_SIZE = 256
+
+
+# a format gives the rows of a design and writes a row to self.buffer
+class DesignExporter(abc.ABC):
+    def __init__(self, f, chunk_size=DEFAULT_CHUNK_SIZE, close_file=False):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.close_file = close_file
+        self.buffer = io.StringIO()
+        self.buffered = 0
+        self.start()
+
+    def start(self):
+        pass
+
+    @abc.abstractmethod
+    def rows(self, result, one_design):
+        pass
+
+    @abc.abstractmethod
+    def write_row(self, row):
+        pass
+
+    def write_design(self, result, one_design):
+        for row in self.rows(result, one_design):
+            self.write_row(row)
+            self.buffered += 1
+        if self.buffered >= self.chunk_size:
+            self.flush()
+
+    def write_result(self, result):
+        for one_design in result.designs:
+            self.write_design(result, one_design)
+
+    def flush(self):
+        self.f.write(self.buffer.getvalue())
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        if self.close_file:
+            self.f.close()
+        else:
+            self.f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TableExporter(DesignExporter):
+    delimiter = '\t'
+
+    def start(self):
+        self.writer = csv.writer(self.buffer, delimiter=self.delimiter, lineterminator='\n')
+        self.writer.writerow(COLUMNS)
+
+    def rows(self, result, one_design):
+        return design_rows(one_design)
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+
+
+class CsvExporter(TableExporter):
+    delimiter = ','
+
+
+class JsonLinesExporter(DesignExporter):
+    def rows(self, result, one_design):
+        record = asdict(one_design)
+        record['module_name'] = result.module_name
+        record['promoter_order'] = result.promoter_order_decode
+        return [record]
+
+    def write_row(self, row):
+        self.buffer.write(json.dumps(row) + '\n')
+
+
+# (plate, well) of the n-th oligo (from 0) of an order, the wells filled column by column
+def plate_well(n, plate_rows=8, plate_columns=12):
+    plate, n = divmod(n, plate_rows * plate_columns)
+    column, row = divmod(n, plate_rows)
+    return plate + 1, f'{chr(ord("A") + row)}{column + 1}'
+
+
+class PlateExporter(DesignExporter):
+    plate_rows = 8
+    plate_columns = 12
+
+    def start(self):
+        self.writer = csv.writer(self.buffer, delimiter='\t', lineterminator='\n')
+        self.writer.writerow(['Plate', 'Well', 'Name', 'Sequence', 'Length'])
+        self.wells = 0
+
+    def well(self, n):
+        return plate_well(n, self.plate_rows, self.plate_columns)
+
+    def rows(self, result, one_design):
+        for pair in one_design.primers:
+            for name, sequence in ((pair.forward_name, pair.forward), (pair.reverse_name, pair.reverse)):
+                plate, well = self.well(self.wells)
+                self.wells += 1
+                yield [plate, well, f'{name}_{one_design.number}', sequence, len(sequence)]
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+
+
+class Plate384Exporter(PlateExporter):
+    plate_rows = 16
+    plate_columns = 24
+
+
+# writes every design as soon as design() has it
+class ExportMonitor(DesignMonitor):
+    def __init__(self, exporter):
+        self.exporter = exporter
+
+    def design_found(self, result, one_design):
+        self.exporter.write_design(result, one_design)
+
+
+EXPORT_FORMATS = {'tsv': TableExporter,
+                  'csv': CsvExporter,
+                  'jsonl': JsonLinesExporter,
+                  'plate96': PlateExporter,
+                  'plate384': Plate384Exporter}
+
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in EXPORT_FORMATS:
+        return extension
+    if extension == 'json':
+        return 'jsonl'
+    return 'tsv'
+
+
+# an exporter writing to the file at path (created or overwritten), or to an already open text file
+def open_exporter(path_or_file, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    if isinstance(path_or_file, str):
+        fmt = fmt or guess_format(path_or_file)
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f'Unknown export format {fmt}')
+        f = open(path_or_file, 'w', newline='')
+        return EXPORT_FORMATS[fmt](f, chunk_size, close_file=True)
+    return EXPORT_FORMATS[fmt or 'tsv'](path_or_file, chunk_size)
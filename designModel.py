@@ -0,0 +1,69 @@
+# -- coding: utf-8 --
+
+# In-memory model of a design result. primerMakerEngine.design returns a
+# DesignResult; the text output, the GUI table and the exported files are all
+# built from it.
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class PrimerPair:
+    forward_name: str
+    forward: str
+    reverse_name: str
+    reverse: str
+
+
+@dataclass
+class Design:
+    number: int
+    primers: List[PrimerPair]
+    overhangs: List[str]
+    targets: List[str]
+    fidelity: Optional[float] = None
+    # primer thermodynamics checks (see primerThermo.PrimerChecker.check), when made
+    thermo: Optional[dict] = None
+
+
+@dataclass
+class DesignResult:
+    candidate_target_seq: dict
+    module_num: int
+    module_name: List[str]
+    promoter_order: List[str]
+    promoter_order_decode: List[str]
+    # 'oligo' (one module), 'single' (two modules, one PCR) or 'multi'
+    mode: str
+    designs: List[Design] = field(default_factory=list)
+    # False when the search stopped at its node limit
+    exhaustive: bool = True
+    # True when only the junctions changed since a previous design were searched (see IncrementalDesigner)
+    repaired: bool = False
+
+    @property
+    def multi_candidates(self):
+        return any(len(x) > 1 for x in self.candidate_target_seq.values())
+
+
+COLUMNS = ['Choice', 'ForwardName', 'Forward', 'ForwardLength', 'ReverseName', 'Reverse', 'ReverseLength',
+           'Overhangs', 'Fidelity', 'Targets']
+
+
+# the row of one primer pair of a design, in the order of COLUMNS
+def pair_row(one_design, pair):
+    fidelity = '' if one_design.fidelity is None else f'{one_design.fidelity:.4f}'
+    return [one_design.number, pair.forward_name, pair.forward, len(pair.forward),
+            pair.reverse_name, pair.reverse, len(pair.reverse),
+            ','.join(one_design.overhangs), fidelity, ','.join(one_design.targets)]
+
+
+def design_rows(one_design):
+    for pair in one_design.primers:
+        yield pair_row(one_design, pair)
+
+
+def result_rows(result):
+    for one_design in result.designs:
+        yield from design_rows(one_design)
@@ -0,0 +1,302 @@
+# -- coding: utf-8 --
+
+# Local HTTP/JSON design service, standard library only:
+#
+#     python designService.py --port 8765 -w 4
+#
+#     POST /design   a construct, as a line of a batchDesign manifest; the answer is the same
+#                    JSON object as a line of its results ("status": "ok" or "error")
+#     GET /metrics   requests by answer, latency percentiles, queue depth, batches
+#     GET /health
+#
+# The front end is asyncio. Requests wait in a bounded queue (a full queue
+# answers 503 at once) and are sent to a process pool in batches of the
+# requests that arrived together, at most one batch per worker at a time.
+# The pool is started with the service and keeps its processes, so their
+# imports, overhang tables and design cache are set up once. A request not
+# answered within its timeout gets 504.
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+
+import batchDesign
+import primerMakerEngine as engine
+
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_BATCH_SIZE = 16
+# how long the first request of a batch waits for others
+DEFAULT_BATCH_WINDOW = 0.005
+DEFAULT_TIMEOUT = 60.0
+MAX_BODY = 1 << 20
+LATENCY_SAMPLES = 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+def _warm_worker(options):
+    batchDesign._init_worker(options)
+    profile = engine.get_profile(options['enzyme'])
+    engine.get_tables(profile.overhang_length, engine.profile_overhangs(profile)[2])
+
+
+# the answers of a batch, each designed on its own so that a record breaking the design only fails its request:
+# (True, result) or (False, error message)
+def _design_each(chunk):
+    answers = []
+    for construct_id, record in chunk:
+        try:
+            answers.append((True, batchDesign._design_chunk([(construct_id, record)])[0]))
+        except Exception as e:
+            answers.append((False, f'{type(e).__name__}: {e}'))
+    return answers
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class DesignService:
+    def __init__(self, options, workers=1, queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 batch_window=DEFAULT_BATCH_WINDOW, timeout=DEFAULT_TIMEOUT):
+        self.options = options
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.pool = None
+        self.queue = None
+        self.slots = None
+        self.batcher = None
+        self.server = None
+        self.started = time.time()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.answers = {}
+        self.batches = 0
+        self.batched = 0
+        self.in_flight = 0
+        self.next_id = 0
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        from concurrent.futures import ProcessPoolExecutor
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                        initargs=(self.options,))
+        # start every process now rather than on the first requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, time.sleep, 0.05) for _ in range(self.workers)])
+        self.queue = asyncio.Queue(self.queue_size)
+        self.slots = asyncio.Semaphore(self.workers)
+        self.batcher = asyncio.create_task(self.run_batches())
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.batcher is not None:
+            self.batcher.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    # takes the requests of the queue in batches, a batch is sent once a worker is free
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0)))
+                except asyncio.TimeoutError:
+                    break
+            # requests that already timed out are not designed
+            batch = [x for x in batch if not x[2].done()]
+            if not batch:
+                continue
+            await self.slots.acquire()
+            self.batches += 1
+            self.batched += len(batch)
+            asyncio.create_task(self.run_batch(batch))
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        self.in_flight += len(batch)
+        try:
+            answers = await loop.run_in_executor(self.pool, _design_each,
+                                                 [(construct_id, record) for construct_id, record, future in batch])
+            for (construct_id, record, future), (ok, answer) in zip(batch, answers):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(answer)
+                else:
+                    future.set_exception(RuntimeError(answer))
+        # the pool itself failed (a worker died), every request of the batch gets the error
+        except Exception as e:
+            for construct_id, record, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.in_flight -= len(batch)
+            self.slots.release()
+
+    async def design(self, record):
+        self.next_id += 1
+        construct_id = str(record.get('id', self.next_id))
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((construct_id, record, future))
+        except asyncio.QueueFull:
+            return 503, {'error': 'The design queue is full, try again later.'}
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            return 504, {'id': construct_id, 'error': f'No design within {self.timeout} s.'}
+        except Exception as e:
+            return 500, {'id': construct_id, 'error': str(e)}
+        return 200, result
+
+    def metrics(self):
+        latencies = list(self.latencies)
+        return {'uptime': round(time.time() - self.started, 3),
+                'answers': dict(self.answers),
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'workers': self.workers,
+                'batches': self.batches,
+                'mean_batch_size': round(self.batched / self.batches, 3) if self.batches else None,
+                'latency': {'samples': len(latencies),
+                            'p50': percentile(latencies, 0.5),
+                            'p90': percentile(latencies, 0.9),
+                            'p99': percentile(latencies, 0.99),
+                            'max': max(latencies) if latencies else None}}
+
+    async def route(self, method, path, body):
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, self.metrics()
+        if path != '/design':
+            return 404, {'error': f'Unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST to design'}
+        try:
+            record = json.loads(body or b'null')
+        except ValueError as e:
+            return 400, {'error': f'Bad JSON: {e}'}
+        if not isinstance(record, dict):
+            return 400, {'error': 'A construct must be a JSON object'}
+        return await self.design(record)
+
+    # HTTP/1.1 with keep-alive, one request at a time per connection
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                start = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.answer(writer, 400, {'error': 'Bad request line'}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    await self.answer(writer, 400, {'error': 'Bad Content-Length'}, False)
+                    break
+                if length > MAX_BODY:
+                    await self.answer(writer, 413, {'error': 'Request too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self.route(method.upper(), target.split('?')[0], body)
+                if target.startswith('/design'):
+                    self.latencies.append(time.perf_counter() - start)
+                    self.answers[status] = self.answers.get(status, 0) + 1
+                await self.answer(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        # a client gets an answer rather than a closed connection
+        except Exception as e:
+            try:
+                await self.answer(writer, 500, {'error': f'{type(e).__name__}: {e}'}, False)
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def answer(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        head = [f'HTTP/1.1 {status} {REASONS.get(status, "")}', 'Content-Type: application/json',
+                f'Content-Length: {len(body)}', f'Connection: {"keep-alive" if keep_alive else "close"}']
+        if status == 503:
+            head.append('Retry-After: 1')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(service, host, port):
+    server = await service.start(host, port)
+    sys.stderr.write(f'GoGo design service on http://{host}:{port} with {service.workers} workers\n')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='designService', description='Serve GoGo designs over local HTTP/JSON.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-w', '--workers', type=int, default=2, help='design processes (default: %(default)s)')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='requests waiting beyond this get 503 (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--batch-window', type=float, default=DEFAULT_BATCH_WINDOW,
+                        help='seconds the first request of a batch waits for others (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='seconds before a request gets 504 (default: %(default)s)')
+    parser.add_argument('-d', '--donor', default='pGN1101', choices=engine.DONORS)
+    parser.add_argument('-n', '--max-designs', type=int, default=5)
+    parser.add_argument('-e', '--enzyme', default=engine.DEFAULT_PROFILE, choices=list(engine.PROFILES))
+    parser.add_argument('--fidelity-matrix', default=None)
+    parser.add_argument('--max-nodes', type=int, default=engine.MAX_SEARCH_NODES)
+    parser.add_argument('--cache-dir', default=None)
+    args = parser.parse_args(argv)
+    options = {'donor': args.donor, 'max_designs': args.max_designs, 'enzyme': args.enzyme,
+               'fidelity_matrix': args.fidelity_matrix, 'max_nodes': args.max_nodes, 'cache_dir': args.cache_dir}
+    service = DesignService(options, args.workers, args.queue_size, args.batch_size, args.batch_window,
+                            args.timeout)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# -- coding: utf-8 --
+
+# Recognition sites of the Type IIS enzymes used for assemblies, and a
+# scanner finding all of them at once. The scanner is an Aho-Corasick
+# automaton over every site and its reverse complement, so a sequence is read
+# once whatever the number of enzymes, and every hit is reported.
+
+from collections import namedtuple
+
+# name: recognition site, 5' to 3' on the top strand
+ENZYMES = {'BsaI': 'GGTCTC',
+           'BbsI': 'GAAGAC',
+           'Esp3I': 'CGTCTC',
+           'BsmBI': 'CGTCTC',
+           'SapI': 'GCTCTTC'}
+
+
+# the overhang lengths the overhang tables are built for: 4 nt (BsaI, BbsI, Esp3I, BsmBI) and 3 nt (SapI)
+OVERHANG_LENGTHS = (3, 4)
+
+
+def check_overhang_length(enzyme, overhang_length):
+    if overhang_length not in OVERHANG_LENGTHS:
+        raise ValueError(f'Unsupported overhang length {overhang_length} for {enzyme}: the overhangs must be 3 or 4 nt')
+
+
+# how the primers use an enzyme: flank + site + spacer is added 5' of the sequence starting with the overhang, the
+# enzyme cuts after the spacer and leaves an overhang of overhang_length bases
+class EnzymeProfile(namedtuple('EnzymeProfile', ['enzyme', 'site', 'spacer', 'overhang_length', 'flank'])):
+    def __new__(cls, enzyme, site, spacer, overhang_length, flank):
+        check_overhang_length(enzyme, overhang_length)
+        return super().__new__(cls, enzyme, site, spacer, overhang_length, flank)
+
+    @property
+    def prefix(self):
+        return self.flank.lower() + self.site.upper() + self.spacer.lower()
+
+
+PROFILES = {'BsaI': EnzymeProfile('BsaI', ENZYMES['BsaI'], 't', 4, 'ggctac'),
+            'BbsI': EnzymeProfile('BbsI', ENZYMES['BbsI'], 'tt', 4, 'ggctac'),
+            'Esp3I': EnzymeProfile('Esp3I', ENZYMES['Esp3I'], 't', 4, 'ggctac'),
+            'BsmBI': EnzymeProfile('BsmBI', ENZYMES['BsmBI'], 't', 4, 'ggctac'),
+            'SapI': EnzymeProfile('SapI', ENZYMES['SapI'], 't', 3, 'ggctac')}
+
+# start is the 0-based position of the site in the scanned sequence, strand '-' for a site read on the reverse
+# complement (its top-strand sequence is then the reverse complement of site)
+SiteHit = namedtuple('SiteHit', ['enzyme', 'site', 'strand', 'start'])
+# a hit in candidate `candidate` (index in the list of its module) of module `module`
+ModuleSiteHit = namedtuple('ModuleSiteHit', ['module', 'candidate', 'sequence', 'hit'])
+
+_COMPLEMENT = str.maketrans('ACGT', 'TGCA')
+
+
+def reverse_complement(sequence):
+    return sequence.upper().translate(_COMPLEMENT)[::-1]
+
+
+class SiteScanner:
+    def __init__(self, enzymes=('BsaI',), enzyme_table=None):
+        enzyme_table = ENZYMES if enzyme_table is None else enzyme_table
+        self.enzymes = tuple(enzymes)
+        for enzyme in self.enzymes:
+            if enzyme not in enzyme_table:
+                raise KeyError(f'Unknown enzyme {enzyme}')
+        # node 0 is the root; goto[node] maps a base to the next node, output[node] lists the
+        # (enzyme, site, strand, length) of the patterns ending at node
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for enzyme in self.enzymes:
+            site = enzyme_table[enzyme].upper()
+            self._add(site, (enzyme, site, '+', len(site)))
+            if reverse_complement(site) != site:
+                self._add(reverse_complement(site), (enzyme, site, '-', len(site)))
+        self._link()
+
+    def _add(self, pattern, output):
+        node = 0
+        for base in pattern:
+            if base not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][base] = len(self.goto) - 1
+            node = self.goto[node][base]
+        self.output[node].append(output)
+
+    # breadth first, the failure link of a node is the longest proper suffix of its path that is also a path
+    def _link(self):
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for base, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and base not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(base, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def scan(self, sequence):
+        hits = []
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        node = 0
+        for i, base in enumerate(sequence.upper()):
+            while node and base not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(base, 0)
+            for enzyme, site, strand, length in output[node]:
+                hits.append(SiteHit(enzyme, site, strand, i - length + 1))
+        return hits
+
+    def contains_site(self, sequence):
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        node = 0
+        for base in sequence.upper():
+            while node and base not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(base, 0)
+            if output[node]:
+                return True
+        return False
+
+    # every hit in every candidate of every module of {module: [sequence, ...]}
+    def scan_modules(self, sequences):
+        hits = []
+        for module, candidates in sequences.items():
+            for candidate, sequence in enumerate(candidates):
+                hits += [ModuleSiteHit(module, candidate, sequence, hit) for hit in self.scan(sequence)]
+        return hits
+
+
+_scanners = {}
+
+
+def get_scanner(enzymes=('BsaI',)):
+    key = tuple(enzymes)
+    if key not in _scanners:
+        _scanners[key] = SiteScanner(key)
+    return _scanners[key]
+
+
+def format_hit(module_hit):
+    hit = module_hit.hit
+    return f'{hit.enzyme} site {hit.site} ({hit.strand} strand) at position {hit.start + 1} within the candidate ' \
+           f'target {module_hit.sequence} of module {module_hit.module}'
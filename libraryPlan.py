@@ -0,0 +1,319 @@
+# -- coding: utf-8 --
+
+# Overhangs shared by a library of arrays. Designed one by one, the arrays of
+# a library get different junction overhangs, so their modules cannot be
+# mixed and no promoter or donor part can be made once for all of them. The
+# planner looks for a small set of mutually compatible junction overhangs that
+# as many arrays as possible can use:
+#
+# - 'position': one overhang per junction position (the junction of module 2
+#   of every array, then of module 3, ...), so the module parts of a position
+#   are interchangeable between arrays;
+# - 'global': a set of overhangs every array takes its junction overhangs
+#   from.
+#
+# Both are a cover of the arrays: with the arrays as bitsets, the overhangs are
+# first chosen greedily (the one completing the most arrays, then the one
+# bringing the most junctions), then improved by local search (an overhang is
+# replaced by a compatible one while that completes more arrays). The arrays
+# left over keep the planned overhang at the junctions that can take one and
+# are searched freely at the others; an array with no design within the plan
+# is designed on its own (see batchDesign).
+#
+#     python libraryPlan.py -m manifest.jsonl -o results.jsonl --mode position -w 8
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import batchDesign
+import primerMakerEngine as engine
+
+MODES = ('position', 'global')
+# local search passes over the planned overhangs
+DEFAULT_ROUNDS = 10
+
+
+# bitsets of the arrays: hits[p][code] of the arrays whose junction p can take the overhang code, short[p] of the
+# arrays with no junction p
+def _array_bitsets(domains, positions):
+    hits = [{} for _ in range(positions)]
+    short = [0] * positions
+    for i, junctions in enumerate(domains):
+        bit = 1 << i
+        for p in range(positions):
+            if p >= len(junctions):
+                short[p] |= bit
+                continue
+            for code in _codes(junctions[p]):
+                hits[p][code] = hits[p].get(code, 0) | bit
+    return hits, short
+
+
+def _codes(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+# the codes compatible with every code of chosen (other than skip)
+def _compatible(tables, chosen, skip=None):
+    mask = tables.all
+    for code in chosen:
+        if code is not None and code != skip:
+            mask &= tables.compatible[code]
+    return mask
+
+
+# one overhang per junction position: (plan, bitset of the arrays it covers)
+def plan_positions(tables, domains, rounds=DEFAULT_ROUNDS):
+    positions = max((len(x) for x in domains), default=0)
+    hits, short = _array_bitsets(domains, positions)
+    everyone = (1 << len(domains)) - 1
+    plan = [None] * positions
+
+    def covered(skip=None):
+        bits = everyone
+        for p in range(positions):
+            if p != skip and plan[p] is not None:
+                bits &= hits[p][plan[p]] | short[p]
+        return bits
+
+    # the positions most arrays have first
+    for p in sorted(range(positions), key=lambda p: -sum(x.bit_count() for x in hits[p].values())):
+        mask = _compatible(tables, plan)
+        bits = covered()
+        candidates = [code for code in hits[p] if (mask >> code) & 1]
+        if candidates:
+            plan[p] = max(candidates, key=lambda code: ((bits & (hits[p][code] | short[p])).bit_count(),
+                                                        hits[p][code].bit_count(), -code))
+    for _ in range(rounds):
+        improved = False
+        for p in range(positions):
+            others = covered(p)
+            mask = _compatible(tables, plan, plan[p])
+            current = (others & (hits[p][plan[p]] | short[p])).bit_count() if plan[p] is not None else -1
+            for code in hits[p]:
+                if (mask >> code) & 1 and (others & (hits[p][code] | short[p])).bit_count() > current:
+                    plan[p] = code
+                    current = (others & (hits[p][code] | short[p])).bit_count()
+                    improved = True
+        if not improved:
+            break
+    return plan, covered()
+
+
+# a set of overhangs the arrays take their junction overhangs from: (codes, bitset of the arrays it covers). The
+# greedy choice and the local search count the arrays every junction of which can take a chosen overhang; as an
+# overhang serves one junction only, the arrays covered are then those with a matching (see _covered)
+def plan_global(tables, domains, max_overhangs=None, rounds=DEFAULT_ROUNDS):
+    positions = max((len(x) for x in domains), default=0)
+    hits, short = _array_bitsets(domains, positions)
+    everyone = (1 << len(domains)) - 1
+    used = set()
+    for p in range(positions):
+        used.update(hits[p])
+    chosen = []
+
+    # per position, the arrays whose junction there can take an overhang of codes
+    def reached_at(codes):
+        return [short[p] | _union(hits[p], codes) for p in range(positions)]
+
+    def reached(at, code):
+        bits = everyone
+        for p in range(positions):
+            bits &= at[p] | hits[p].get(code, 0)
+        return bits.bit_count()
+
+    while max_overhangs is None or len(chosen) < max_overhangs:
+        mask = _compatible(tables, chosen)
+        at = reached_at(chosen)
+        candidates = [code for code in used if (mask >> code) & 1]
+        # the overhang completing the most arrays, then reaching the most new junctions
+        if not candidates:
+            break
+        scores = {code: (reached(at, code),
+                         sum((hits[p].get(code, 0) & ~at[p]).bit_count() for p in range(positions)))
+                  for code in candidates}
+        best = max(candidates, key=lambda code: (scores[code], -code))
+        if scores[best][1] == 0:
+            break
+        chosen.append(best)
+    current = reached(reached_at(chosen), None) if chosen else 0
+    for _ in range(rounds):
+        improved = False
+        for i in range(len(chosen)):
+            others = chosen[:i] + chosen[i + 1:]
+            at = reached_at(others)
+            mask = _compatible(tables, others)
+            for code in used:
+                if (mask >> code) & 1 and code not in chosen and reached(at, code) > current:
+                    chosen[i] = code
+                    current = reached(at, code)
+                    improved = True
+        if not improved:
+            break
+    at = reached_at(chosen)
+    candidates = everyone
+    for p in range(positions):
+        candidates &= at[p]
+    return sorted(chosen), _covered(domains, chosen, candidates)
+
+
+def _union(hits, codes):
+    bits = 0
+    for code in codes:
+        bits |= hits.get(code, 0)
+    return bits
+
+
+# the arrays of candidates (a bitset) whose junctions can each take a different overhang of codes
+def _covered(domains, codes, candidates):
+    allowed = 0
+    for code in codes:
+        allowed |= 1 << code
+    bits = 0
+    for i in _codes(candidates):
+        if _has_matching([x & allowed for x in domains[i]]):
+            bits |= 1 << i
+    return bits
+
+
+def _has_matching(domains, used=0):
+    if not domains:
+        return True
+    domains = sorted(domains, key=int.bit_count)
+    for code in _codes(domains[0] & ~used):
+        if _has_matching(domains[1:], used | (1 << code)):
+            return True
+    return False
+
+
+# the overhang_plan of design for an array: per position the planned overhang of its junction when it can take it,
+# globally the planned overhangs it can take at every junction; None where it has to choose its own
+def array_plan(tables, junctions, mode, plan):
+    entries = []
+    for p, domain in enumerate(junctions):
+        if mode == 'position':
+            code = plan[p]
+            entries.append(tables.seq[code] if code is not None and (domain >> code) & 1 else None)
+        else:
+            own = [tables.seq[code] for code in plan if (domain >> code) & 1]
+            entries.append(own or None)
+    return entries
+
+
+# plans the shared overhangs of the constructs of a manifest ((id, record, error) of batchDesign.read_manifest), the
+# constructs of one assembly enzyme together; returns the records with their overhang_plan and the plan of every
+# enzyme
+def plan_library(constructs, options, mode='position', max_overhangs=None, rounds=DEFAULT_ROUNDS):
+    groups = {}
+    for construct_id, record, error in constructs:
+        if error is not None:
+            continue
+        try:
+            candidate_target_seq, module_name, promoter_order = batchDesign.construct_inputs(record)
+            tables, junctions = engine.junction_domains(candidate_target_seq, record.get('donor', options['donor']),
+                                                        promoter_order, record.get('upstream_overhang', ''),
+                                                        record.get('downstream_overhang', ''), record.get('enzymes'),
+                                                        record.get('enzyme', options['enzyme']))
+        except Exception:
+            # designed, and reported, as it is
+            continue
+        if junctions:
+            groups.setdefault(record.get('enzyme', options['enzyme']), (tables, []))[1].append((record, junctions))
+    plans = {}
+    for enzyme, (tables, arrays) in groups.items():
+        domains = [junctions for record, junctions in arrays]
+        if mode == 'position':
+            plan, covered = plan_positions(tables, domains, rounds)
+            overhangs = [tables.seq[x] if x is not None else None for x in plan]
+        else:
+            plan, covered = plan_global(tables, domains, max_overhangs, rounds)
+            overhangs = [tables.seq[x] for x in plan]
+        plans[enzyme] = {'mode': mode, 'overhangs': overhangs, 'arrays': len(arrays),
+                         'covered': covered.bit_count()}
+        for record, junctions in arrays:
+            record['overhang_plan'] = array_plan(tables, junctions, mode, plan)
+    return plans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='libraryPlan',
+                                     description='Design a library of sgRNA arrays with shared junction overhangs.')
+    parser.add_argument('-m', '--manifest', required=True, help='JSON Lines file, one construct per line')
+    parser.add_argument('-o', '--output', required=True, help='JSON Lines results, one construct per line')
+    parser.add_argument('--plan', default=None, help='write the shared overhangs as JSON to this file')
+    parser.add_argument('--mode', default='position', choices=MODES,
+                        help='one overhang per junction position, or one set for all junctions (default: '
+                             '%(default)s)')
+    parser.add_argument('--max-overhangs', type=int, default=None,
+                        help='largest shared set in global mode (default: while it covers more arrays)')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS,
+                        help='local search passes (default: %(default)s)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=batchDesign.DEFAULT_CHUNK_SIZE)
+    parser.add_argument('-d', '--donor', default='pGN1101', choices=engine.DONORS)
+    parser.add_argument('-n', '--max-designs', type=int, default=5)
+    parser.add_argument('-e', '--enzyme', default=engine.DEFAULT_PROFILE, choices=list(engine.PROFILES))
+    parser.add_argument('--fidelity-matrix', default=None)
+    parser.add_argument('--max-nodes', type=int, default=engine.MAX_SEARCH_NODES)
+    parser.add_argument('--cache-dir', default=None)
+    args = parser.parse_args(argv)
+    options = {'donor': args.donor, 'max_designs': args.max_designs, 'enzyme': args.enzyme,
+               'fidelity_matrix': args.fidelity_matrix, 'max_nodes': args.max_nodes, 'cache_dir': args.cache_dir}
+
+    start = time.perf_counter()
+    try:
+        with open(args.manifest, 'r') as f:
+            constructs = list(batchDesign.read_manifest(f))
+    except OSError as e:
+        sys.stderr.write(f'Error: {e}\n')
+        return 1
+    plans = plan_library(constructs, options, args.mode, args.max_overhangs, args.rounds)
+    for enzyme, plan in plans.items():
+        sys.stderr.write(f'{enzyme}: {plan["covered"]} of {plan["arrays"]} arrays with junctions use only the '
+                         f'shared overhangs {",".join(x or "-" for x in plan["overhangs"])} '
+                         f'({time.perf_counter() - start:.1f} s)\n')
+    if args.plan:
+        with open(args.plan, 'w') as f:
+            json.dump(plans, f, indent=1)
+            f.write('\n')
+
+    # the planned records go through the batch runner as a manifest, with the ids read_manifest gave them
+    manifest = (json.dumps(dict(record, id=construct_id)) for construct_id, record, error in constructs
+                if error is None)
+    shared = {'shared': 0, 'own': 0}
+
+    def count(x):
+        if 'plan' in x:
+            shared[x['plan']] += 1
+        if x['status'] == 'error':
+            sys.stderr.write(f'{x["id"]}: {x["error"]}\n')
+
+    try:
+        with open(args.output, 'w') as output:
+            errors = [{'id': construct_id, 'status': 'error', 'error': error}
+                      for construct_id, record, error in constructs if error is not None]
+            for x in errors:
+                output.write(json.dumps(x) + '\n')
+                count(x)
+            designed, failed = batchDesign.run_batch(manifest, output, options, args.workers, args.chunk_size,
+                                                     on_result=count)
+    except OSError as e:
+        sys.stderr.write(f'Error: {e}\n')
+        return 1
+    except KeyboardInterrupt:
+        sys.stderr.write('Interrupted.\n')
+        return 130
+    failed += len(errors)
+    sys.stderr.write(f'{designed} constructs designed ({shared["shared"]} within the plan, {shared["own"]} with '
+                     f'their own overhangs), {failed} failed, {time.perf_counter() - start:.1f} s\n')
+    return 0 if failed == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# -- coding: utf-8 --
+
+# Ligation fidelity scoring of overhang sets.
+#
+# The ligation-frequency matrix is a local tab or comma separated file with
+# 4^k rows and columns (256 x 256 for 4 nt overhangs). The first row and the
+# first column hold the overhang sequences, cell (a, b) is how often overhang a
+# was seen ligated to overhang b, so (a, reverse complement of a) is the correct
+# Watson-Crick pairing. Such tables are published by ligation-fidelity
+# profiling studies of T4 DNA ligase with Type IIS overhangs.
+#
+# The fidelity of an assembly is the product, over every end present (each
+# overhang and its reverse complement), of the correct ligation frequency
+# divided by the ligation frequency of that end with all ends present. Adding
+# overhangs never increases it; the search bounds a partial set by also adding
+# to every denominator the least frequency each missing junction must bring.
+
+import os
+
+DEFAULT_MATRIX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ligation_frequency.tsv')
+
+
+class FidelityError(Exception):
+    pass
+
+
+class LigationScorer:
+    def __init__(self, matrix, tables):
+        self.matrix = matrix
+        self.tables = tables
+        rc = tables.reverse_complement
+        self.correct = [matrix[c][rc[c]] for c in range(tables.size)]
+        self.columns = [[matrix[c][n] for c in range(tables.size)] for n in range(tables.size)]
+
+    # a state is (ends, denominators, row_sums): the codes of all ends present, for each of them the sum of its
+    # ligation frequencies with all ends present, and for every overhang the sum of its ligation frequencies
+    # with all ends present
+    def empty_state(self):
+        return (), (), [0.0] * self.tables.size
+
+    # with codes, only the row sums of these overhangs (and of the ends of code) are brought up to date, the others
+    # are left stale: a search passes the overhangs it can still read
+    def add(self, state, code, codes=None):
+        ends, denominators, row_sums = state
+        matrix = self.matrix
+        new = (code, self.tables.reverse_complement[code])
+        denominators = tuple(d + matrix[e][new[0]] + matrix[e][new[1]] for e, d in zip(ends, denominators))
+        column_a = self.columns[new[0]]
+        column_b = self.columns[new[1]]
+        if codes is None:
+            row_sums = [r + a + b for r, a, b in zip(row_sums, column_a, column_b)]
+        else:
+            row_sums = list(row_sums)
+            for n in set(codes).union(new):
+                row_sums[n] = row_sums[n] + column_a[n] + column_b[n]
+        denominators += tuple(row_sums[n] for n in new)
+        return ends + new, denominators, row_sums
+
+    def score(self, state):
+        fidelity = 1.0
+        correct = self.correct
+        for e, d in zip(state[0], state[1]):
+            if d <= 0:
+                return 0.0
+            fidelity *= correct[e] / d
+        return fidelity
+
+    # the factor the ends of code would add to the fidelity of state; adding more overhangs later only makes
+    # it smaller, and it ignores how much code lowers the factors of the ends already present
+    def optimistic(self, state, code):
+        row_sums = state[2]
+        matrix = self.matrix
+        rc = self.tables.reverse_complement[code]
+        d1 = row_sums[code] + matrix[code][code] + matrix[code][rc]
+        d2 = row_sums[rc] + matrix[rc][code] + matrix[rc][rc]
+        if d1 <= 0 or d2 <= 0:
+            return 0.0
+        return self.correct[code] / d1 * self.correct[rc] / d2
+
+    # for one junction, the least ligation frequency every overhang would gain with the ends of whichever
+    # candidate the junction ends up with
+    def least_gain(self, codes):
+        matrix = self.matrix
+        rc = self.tables.reverse_complement
+        gains = [float('inf')] * self.tables.size
+        for code in set(codes):
+            column = self.columns[code]
+            column_rc = self.columns[rc[code]]
+            gains = [min(g, a + b) for g, a, b in zip(gains, column, column_rc)]
+        return gains
+
+    # fidelity of a complete set, computed in a canonical order so that equal sets always give the same float
+    def fidelity(self, codes):
+        rc = self.tables.reverse_complement
+        ends = []
+        for code in sorted(codes):
+            ends += [code, rc[code]]
+        fidelity = 1.0
+        for e in ends:
+            row = self.matrix[e]
+            d = sum(row[p] for p in ends)
+            if d <= 0:
+                return 0.0
+            fidelity *= self.correct[e] / d
+        return fidelity
+
+
+def read_ligation_matrix(path, tables):
+    with open(path, 'r') as f:
+        lines = [line.rstrip('\r\n') for line in f if line.strip()]
+    if not lines:
+        raise FidelityError(f'The ligation frequency file {path} is empty')
+    delimiter = '\t' if '\t' in lines[0] else ','
+    header = [x.strip().upper() for x in lines[0].split(delimiter)]
+    columns = header[1:] if len(header) == tables.size + 1 else header
+    try:
+        column_codes = [tables.encode(x) for x in columns]
+    except KeyError as e:
+        raise FidelityError(f'Unknown overhang {e} in the header of {path}')
+    if len(set(column_codes)) != tables.size:
+        raise FidelityError(f'The ligation frequency file {path} must have one column for each of the '
+                            f'{tables.size} overhangs')
+
+    matrix = [[0.0] * tables.size for _ in range(tables.size)]
+    seen = set()
+    for line in lines[1:]:
+        record = [x.strip() for x in line.split(delimiter)]
+        try:
+            row = tables.encode(record[0])
+            values = [float(x) for x in record[1:]]
+        except (KeyError, ValueError):
+            raise FidelityError(f'Bad record in {path}: {record[0]}')
+        if len(values) != tables.size:
+            raise FidelityError(f'The row {record[0]} of {path} must have {tables.size} values')
+        for code, value in zip(column_codes, values):
+            matrix[row][code] = value
+        seen.add(row)
+    if len(seen) != tables.size:
+        raise FidelityError(f'The ligation frequency file {path} must have one row for each of the '
+                            f'{tables.size} overhangs')
+    return matrix
+
+
+# the matrix shipped with a GoGo installation, if there is one; it is a matrix of 4 nt overhangs
+def default_matrix_path(length=4):
+    if length == 4 and os.path.exists(DEFAULT_MATRIX_PATH):
+        return DEFAULT_MATRIX_PATH
+    return None
+
+
+_scorers = {}
+
+
+def load_scorer(path, tables):
+    key = (os.path.abspath(path), os.path.getmtime(path), tables.length)
+    if key not in _scorers:
+        _scorers[key] = LigationScorer(read_ligation_matrix(path, tables), tables)
+    return _scorers[key]
@@ -0,0 +1,167 @@
+# -- coding: utf-8 --
+
+# Oligo order of a design batch. Constructs sharing modules, promoters or the
+# donor get many identical primers, the order lists every distinct primer
+# once. A primer is identified by a hash of its sequence (case ignored), and
+# the design of every construct is chosen among the designs ranking equal to
+# its best one (same ligation fidelity and failed primer checks) so as to
+# reuse the primers the other constructs already order.
+#
+#     python orderPlan.py results.jsonl -o order.tsv --constructs constructs.tsv
+#
+# order.tsv has one row per oligo (plate, well, id, sequence and every
+# construct primer it is), constructs.tsv one row per primer of every
+# construct with the id and the well of its oligo.
+
+import argparse
+import csv
+import hashlib
+import json
+import sys
+from collections import Counter
+
+from designCache import result_from_dict
+from designExport import plate_well
+
+# passes over the constructs re-choosing their designs
+DEFAULT_PASSES = 4
+PLATES = {'96': (8, 12), '384': (16, 24)}
+
+
+def oligo_id(sequence):
+    return 'GG' + hashlib.sha256(sequence.upper().encode('ascii')).hexdigest()[:12].upper()
+
+
+# (name, sequence) of every primer of a design
+def design_oligos(one_design):
+    for pair in one_design.primers:
+        yield pair.forward_name, pair.forward
+        yield pair.reverse_name, pair.reverse
+
+
+def _failed(one_design):
+    return one_design.thermo['failed'] if one_design.thermo else 0
+
+
+# the designs of result ranking equal to its first one; without ligation fidelity the designs are in search order and
+# all rank equal
+def tied_designs(result):
+    first = result.designs[0]
+    tied = []
+    for one_design in result.designs:
+        if (one_design.fidelity is None) != (first.fidelity is None) or _failed(one_design) != _failed(first):
+            continue
+        if first.fidelity is not None and abs(one_design.fidelity - first.fidelity) > 1e-9:
+            continue
+        tied.append(one_design)
+    return tied
+
+
+# {construct id: design} for constructs ([(id, DesignResult), ...], with designs): starting from the first design of
+# every construct, each construct in turn takes the tied design adding the fewest oligos to those of the others, until
+# no construct changes or after passes passes
+def plan_designs(constructs, passes=DEFAULT_PASSES):
+    options = {construct_id: tied_designs(result) for construct_id, result in constructs}
+    oligos = {construct_id: [{oligo_id(seq) for name, seq in design_oligos(x)} for x in designs]
+              for construct_id, designs in options.items()}
+    choice = {construct_id: 0 for construct_id in options}
+    ordered = Counter()
+    for construct_id, ids in oligos.items():
+        ordered.update(ids[0])
+    for _ in range(passes):
+        changed = False
+        for construct_id, ids in oligos.items():
+            if len(ids) == 1:
+                continue
+            ordered.subtract(ids[choice[construct_id]])
+            best = min(range(len(ids)), key=lambda i: (sum(1 for x in ids[i] if ordered[x] <= 0), i))
+            if best != choice[construct_id]:
+                choice[construct_id] = best
+                changed = True
+            ordered.update(ids[best])
+        if not changed:
+            break
+    return {construct_id: options[construct_id][i] for construct_id, i in choice.items()}
+
+
+# {oligo id: [sequence, [(construct id, primer name), ...]]} of the chosen designs, in order of first use
+def order_oligos(constructs, chosen):
+    oligos = {}
+    for construct_id, result in constructs:
+        for name, sequence in design_oligos(chosen[construct_id]):
+            key = oligo_id(sequence)
+            oligo = oligos.setdefault(key, [sequence, []])
+            if oligo[0].upper() != sequence.upper():
+                raise ValueError(f'Oligo id {key} is the hash of {oligo[0]} and {sequence}')
+            oligo[1].append((construct_id, name))
+    return oligos
+
+
+# (id, DesignResult) of every construct of batchDesign results with at least one design
+def read_results(lines):
+    constructs = []
+    for line in lines:
+        if not line.strip():
+            continue
+        x = json.loads(line)
+        if x.get('status') == 'ok' and x['result']['designs']:
+            constructs.append((x['id'], result_from_dict(x['result'])))
+    return constructs
+
+
+def write_order(f, oligos, plate='96'):
+    writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+    writer.writerow(['Plate', 'Well', 'OligoID', 'Sequence', 'Length', 'Uses'])
+    wells = {}
+    for n, (key, (sequence, uses)) in enumerate(oligos.items()):
+        wells[key] = plate_well(n, *PLATES[plate])
+        writer.writerow(list(wells[key]) + [key, sequence, len(sequence),
+                                            ';'.join(f'{construct_id}:{name}' for construct_id, name in uses)])
+    return wells
+
+
+def write_constructs(f, constructs, chosen, wells):
+    writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+    writer.writerow(['Construct', 'Design', 'Name', 'OligoID', 'Plate', 'Well'])
+    for construct_id, result in constructs:
+        one_design = chosen[construct_id]
+        for name, sequence in design_oligos(one_design):
+            key = oligo_id(sequence)
+            writer.writerow([construct_id, one_design.number, name, key] + list(wells[key]))
+
+
+# plans the order of batchDesign results (an iterable of lines) and writes it; returns the number of primers of the
+# chosen designs and of distinct oligos
+def plan_order(results, order_path, constructs_path=None, plate='96', passes=DEFAULT_PASSES):
+    constructs = read_results(results)
+    chosen = plan_designs(constructs, passes)
+    oligos = order_oligos(constructs, chosen)
+    with open(order_path, 'w', newline='') as f:
+        wells = write_order(f, oligos, plate)
+    if constructs_path:
+        with open(constructs_path, 'w', newline='') as f:
+            write_constructs(f, constructs, chosen, wells)
+    return sum(len(uses) for sequence, uses in oligos.values()), len(oligos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='orderPlan', description='Plan the de-duplicated oligo order of a batch.')
+    parser.add_argument('results', help='results file of batchDesign.py')
+    parser.add_argument('-o', '--output', required=True, help='order sheet, one row per distinct oligo')
+    parser.add_argument('--constructs', default=None, help='the primers and oligos of every construct')
+    parser.add_argument('--plate', default='96', choices=list(PLATES))
+    parser.add_argument('--passes', type=int, default=DEFAULT_PASSES,
+                        help='passes re-choosing the designs to share primers (default: %(default)s)')
+    args = parser.parse_args(argv)
+    try:
+        with open(args.results, 'r') as f:
+            primers, oligos = plan_order(f, args.output, args.constructs, args.plate, args.passes)
+    except (OSError, ValueError, KeyError) as e:
+        sys.stderr.write(f'Error: {e}\n')
+        return 1
+    sys.stderr.write(f'{primers} primers, {oligos} distinct oligos to order\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
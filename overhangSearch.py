@@ -0,0 +1,585 @@
+# -- coding: utf-8 --
+
+# Depth-first search for mutually compatible overhang sets.
+#
+# Every junction of the array has a list of candidate tuples whose first item
+# is the overhang code, e.g. (code, position) or (code, position, spacer).
+# The search keeps, for every junction that is not assigned yet, the bitset of
+# overhang codes that are still compatible with everything assigned so far
+# (forward checking). It always branches on the junction with the fewest codes
+# left, drops a branch as soon as one junction has nothing left, and stops
+# once max_sets solutions are found. The visiting order only depends on the
+# input, so the result is the same on every run.
+#
+# With a scorer (see ligationFidelity) the search is a branch and bound: the
+# best max_sets sets are kept in a bounded heap, candidates are tried best
+# score first and a branch is cut when the upper bound of every set below it
+# is not better than the worst set of a full heap (on equal scores the set
+# found first is kept). The sets kept are distinct: candidates of a junction
+# differing only by the position of their overhang window are searched once,
+# and a set found again with its overhangs at other junctions is not kept
+# twice.
+#
+# max_nodes caps the number of nodes visited, with or without scorer; when it
+# is hit the (best) sets found so far are returned and exhaustive is False.
+# With a budget, the search first runs serially on FIRST_STAGE_SHARE of it;
+# when that does not finish, every branch of the first junction is searched
+# again on its own with an equal part of the nodes left (a scored branch cuts
+# only against its own sets and those of the first stage), and all the sets
+# are merged in visiting order. What a branch finds then never depends on how
+# far the other branches got, so the result is the same whatever the number
+# of workers.
+#
+# With workers > 1 the branches of the first junction are searched in a
+# process pool. Every branch publishes how many sets it found, or the score of
+# its worst kept set, in shared arrays so that the other branches can stop or
+# prune early (the scores only without budget), and the branch results are
+# merged in visiting order: the output is the one of the serial search
+# whatever the number of workers.
+
+import heapq
+
+# relative slack of the upper bound: the bound is summed in another order than the scores of the sets, it is
+# raised a little so that rounding never cuts a set scoring as much as the bound
+BOUND_SLACK = 1e-9
+
+# share of the node budget of a search spent before its first branches are searched one by one
+FIRST_STAGE_SHARE = 0.5
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+# what makes two solutions the same design for a scored search: their overhangs, whatever the junction, and the
+# candidate protospacer of every junction, whatever the window
+def set_key(solution):
+    return frozenset(candidate[0] for candidate in solution), tuple(tuple(candidate[2:]) for candidate in solution)
+
+
+# A monitor (see primerMakerEngine.DesignMonitor) gets progress({'stage': 'search', ...}) every REPORT_INTERVAL
+# nodes and can stop the search by returning True from cancelled(); on_solution(score, solution) is called for
+# every set found by a search without scorer.
+class OverhangSearch:
+    REPORT_INTERVAL = 256
+
+    def __init__(self, junctions, tables, max_sets=10, scorer=None, fixed_overhangs=(), max_nodes=None,
+                 monitor=None, on_solution=None):
+        self.junctions = junctions
+        self.tables = tables
+        self.max_sets = max_sets
+        self.scorer = scorer
+        self.fixed_codes = [tables.encode(x) if isinstance(x, str) else x for x in fixed_overhangs]
+        self.solutions = []
+        self.heap = []
+        self.kept = set()
+        self.found = 0
+        self.max_nodes = max_nodes
+        self.exhaustive = True
+        self.explored = 0
+        self.pruned = 0
+        self.least_gain = []
+        self.distinct = []
+        # score of sets found elsewhere that no set of this search can beat
+        self.floor = -1.0
+        self.monitor = monitor
+        self.on_solution = on_solution
+
+    def initial_domains(self):
+        domains = []
+        for candidates in self.junctions:
+            bits = 0
+            for candidate in candidates:
+                bits |= 1 << candidate[0]
+            domains.append(bits)
+        return domains
+
+    def initial_state(self):
+        state = self.scorer.empty_state()
+        for code in self.fixed_codes:
+            state = self.scorer.add(state, code)
+        return state
+
+    @staticmethod
+    def select_junction(domains, assignment):
+        best = -1
+        best_count = 0
+        for j, domain in enumerate(domains):
+            if assignment[j] is None:
+                count = domain.bit_count()
+                if best == -1 or count < best_count:
+                    best = j
+                    best_count = count
+        return best
+
+    def bound(self):
+        if len(self.heap) < self.max_sets:
+            return -1.0
+        return self.heap[0][0]
+
+    # whether a branch whose sets score at most value can be dropped
+    def cut(self, value):
+        return value <= self.bound() or value <= self.floor
+
+    # whether enough sets are found to stop a search without scorer
+    def enough(self):
+        return len(self.solutions) >= self.max_sets
+
+    def visit(self, left):
+        self.explored += 1
+        if self.monitor is not None and self.explored % self.REPORT_INTERVAL == 0:
+            if self.monitor.cancelled():
+                raise SearchCancelled()
+            self.monitor.progress({'stage': 'search', 'evaluated': self.explored, 'found': self.found or len(self.solutions),
+                                   'junctions_done': len(self.junctions) - left, 'junctions': len(self.junctions)})
+
+    def out_of_budget(self):
+        if self.max_nodes is not None and self.explored >= self.max_nodes:
+            self.exhaustive = False
+            return True
+        return False
+
+    # (score, solution) pairs, best first
+    def ranked(self):
+        if self.scorer is None:
+            return [(None, x) for x in self.solutions]
+        return [(score, solution) for score, order, solution in sorted(self.heap, key=lambda x: (-x[0], -x[1]))]
+
+    def prepare(self):
+        if self.scorer is not None:
+            if not self.least_gain:
+                self.least_gain = [self.scorer.least_gain([candidate[0] for candidate in candidates])
+                                   for candidates in self.junctions]
+            if not self.distinct:
+                self.distinct = [self.distinct_candidates(candidates) for candidates in self.junctions]
+            return self.initial_domains(), self.initial_state()
+        return self.initial_domains(), None
+
+    # (candidate index, code) of the first candidate of every overhang and candidate protospacer (the items after
+    # the position) of a junction
+    @staticmethod
+    def distinct_candidates(candidates):
+        seen = set()
+        distinct = []
+        for order, candidate in enumerate(candidates):
+            key = (candidate[0],) + tuple(candidate[2:])
+            if key not in seen:
+                seen.add(key)
+                distinct.append((order, candidate[0]))
+        return distinct
+
+    # the overhangs whose row sums the nodes below can read: the candidates left at the unassigned junctions and
+    # their reverse complements
+    def readable(self, domains, assignment):
+        rc = self.tables.reverse_complement
+        union = 0
+        for k, domain in enumerate(domains):
+            if assignment[k] is None:
+                union |= domain
+        codes = []
+        while union:
+            low = union & -union
+            code = low.bit_length() - 1
+            codes += (code, rc[code])
+            union ^= low
+        return codes
+
+    # for every overhang, the sum of the least gains of the junctions not assigned yet
+    def remaining_gain(self, assignment):
+        remaining = [0.0] * self.tables.size
+        for j, gains in enumerate(self.least_gain):
+            if assignment[j] is None:
+                remaining = [r + g for r, g in zip(remaining, gains)]
+        return remaining
+
+    # the junction searched first and its candidate indexes in visiting order
+    def root_branches(self, domains, state):
+        assignment = [None] * len(self.junctions)
+        j = self.select_junction(domains, assignment)
+        if self.scorer is None:
+            return j, [order for order, candidate in enumerate(self.junctions[j]) if (domains[j] >> candidate[0]) & 1]
+        return j, [order for estimate, order, code in self.sorted_branches(domains, j, state)]
+
+    def run(self):
+        if self.max_sets <= 0:
+            return []
+        if not self.junctions:
+            self.record([])
+            return self.ranked()
+        domains, state = self.prepare()
+        if all(domains):
+            assignment = [None] * len(self.junctions)
+            if self.scorer is None:
+                self._search(domains, assignment, len(self.junctions))
+            else:
+                self._search_scored(domains, assignment, len(self.junctions), state,
+                                    self.remaining_gain(assignment))
+        return self.ranked()
+
+    # search only below one candidate of the first junction
+    def run_branch(self, j, order):
+        domains, state = self.prepare()
+        assignment = [None] * len(self.junctions)
+        candidate = self.junctions[j][order]
+        self.explored += 1
+        new_domains = self.narrow(domains, assignment, j, candidate[0])
+        if new_domains is None:
+            self.pruned += 1
+            return self.ranked()
+        assignment[j] = candidate
+        left = len(self.junctions) - 1
+        if left == 0:
+            self.record(assignment)
+        elif self.scorer is None:
+            self._search(new_domains, assignment, left)
+        else:
+            self._search_scored(new_domains, assignment, left,
+                                self.scorer.add(state, candidate[0], self.readable(new_domains, assignment)),
+                                self.remaining_gain(assignment))
+        return self.ranked()
+
+    def record(self, assignment):
+        self.found += 1
+        if self.scorer is None:
+            self.solutions.append(list(assignment))
+            if self.on_solution is not None:
+                self.on_solution(None, self.solutions[-1])
+            return
+        key = set_key(assignment)
+        if key in self.kept:
+            return
+        score = self.scorer.fidelity(self.fixed_codes + [candidate[0] for candidate in assignment])
+        # ties are broken by discovery order, the earlier set wins
+        item = (score, -self.found, list(assignment))
+        if len(self.heap) < self.max_sets:
+            heapq.heappush(self.heap, item)
+        elif item[:2] > self.heap[0][:2]:
+            self.kept.discard(set_key(heapq.heapreplace(self.heap, item)[2]))
+        else:
+            return
+        self.kept.add(key)
+
+    def narrow(self, domains, assignment, j, code):
+        mask = self.tables.compatible[code]
+        new_domains = []
+        for k, domain in enumerate(domains):
+            if assignment[k] is None and k != j:
+                domain &= mask
+                if not domain:
+                    return None
+            new_domains.append(domain)
+        return new_domains
+
+    def _search(self, domains, assignment, left):
+        if left == 0:
+            self.record(assignment)
+            return
+        j = self.select_junction(domains, assignment)
+        for candidate in self.junctions[j]:
+            code = candidate[0]
+            if not (domains[j] >> code) & 1:
+                continue
+            if self.out_of_budget():
+                return
+            self.visit(left)
+            new_domains = self.narrow(domains, assignment, j, code)
+            if new_domains is None:
+                self.pruned += 1
+                continue
+            assignment[j] = candidate
+            self._search(new_domains, assignment, left - 1)
+            assignment[j] = None
+            if self.enough():
+                return
+
+    # upper bound of every set below a node: each end gets, on top of the ends present, the least ligation
+    # frequency every unassigned junction adds, and each unassigned junction contributes its best candidate.
+    # remaining holds the sum of the least gains of the unassigned junctions, kept by the search from node to node
+    def upper_bound(self, domains, assignment, state, remaining):
+        ends, denominators, row_sums = state
+        correct = self.scorer.correct
+        matrix = self.scorer.matrix
+        rc = self.tables.reverse_complement
+        bound = 1.0 + BOUND_SLACK
+        for e, d in zip(ends, denominators):
+            d += remaining[e]
+            if d <= 0:
+                return 0.0
+            bound *= correct[e] / d
+        for j in range(len(domains)):
+            if assignment[j] is not None:
+                continue
+            own = self.least_gain[j]
+            best = 0.0
+            domain = domains[j]
+            while domain:
+                low = domain & -domain
+                domain ^= low
+                code = low.bit_length() - 1
+                r = rc[code]
+                d1 = row_sums[code] + matrix[code][code] + matrix[code][r] + remaining[code] - own[code]
+                d2 = row_sums[r] + matrix[r][code] + matrix[r][r] + remaining[r] - own[r]
+                if d1 > 0 and d2 > 0:
+                    factor = correct[code] / d1 * correct[r] / d2
+                    if factor > best:
+                        best = factor
+            bound *= best
+            if self.cut(bound):
+                break
+        return bound
+
+    # (-estimate, candidate index, code) of the candidates of junction j, best first; score * optimistic is an
+    # upper bound of the score after adding the candidate, so the branches can be cut in this order
+    def sorted_branches(self, domains, j, state):
+        scorer = self.scorer
+        score = scorer.score(state)
+        branches = []
+        for order, code in self.distinct[j]:
+            if (domains[j] >> code) & 1:
+                branches.append((-score * scorer.optimistic(state, code), order, code))
+        branches.sort()
+        return branches
+
+    def _search_scored(self, domains, assignment, left, state, remaining):
+        if self.cut(self.upper_bound(domains, assignment, state, remaining)):
+            self.pruned += 1
+            return
+        j = self.select_junction(domains, assignment)
+        branches = self.sorted_branches(domains, j, state)
+        if left > 1:
+            own = self.least_gain[j]
+            remaining = [r - g for r, g in zip(remaining, own)]
+        for i, (negative_estimate, order, code) in enumerate(branches):
+            if self.cut(-negative_estimate):
+                self.pruned += len(branches) - i
+                return
+            if self.out_of_budget():
+                return
+            self.visit(left)
+            new_domains = self.narrow(domains, assignment, j, code)
+            if new_domains is None:
+                self.pruned += 1
+                continue
+            assignment[j] = self.junctions[j][order]
+            if left == 1:
+                self.record(assignment)
+            else:
+                self._search_scored(new_domains, assignment, left - 1,
+                                    self.scorer.add(state, code, self.readable(new_domains, assignment)), remaining)
+            assignment[j] = None
+
+
+# one branch of the first junction in a worker process; found[i] and worst[i] hold what branch i has published
+class BranchSearch(OverhangSearch):
+    POLL_INTERVAL = 64
+
+    def __init__(self, branch, found, worst, stop, *args):
+        super().__init__(*args)
+        self.branch = branch
+        self.stop = stop
+        self.shared_found = found
+        self.shared_worst = worst
+        self.before_found = 0
+        self.before_worst = -1.0
+        self.any_worst = -1.0
+        self.polled = 0
+
+    def poll(self):
+        self.polled += 1
+        if self.polled % self.POLL_INTERVAL != 1:
+            return
+        if self.stop.value:
+            raise SearchCancelled()
+        self.before_found = sum(self.shared_found[:self.branch])
+        # the scores of the other branches depend on how far they got: under a node budget they would change the
+        # sets found with the number of workers
+        if self.max_nodes is None:
+            self.before_worst = max(self.shared_worst[:self.branch], default=-1.0)
+            self.any_worst = max(self.shared_worst[:], default=-1.0)
+
+    def cut(self, value):
+        self.poll()
+        # a tie with a set of an earlier branch loses, with one of a later branch it wins
+        return super().cut(value) or value <= self.before_worst or value < self.any_worst
+
+    def enough(self):
+        self.poll()
+        return len(self.solutions) + self.before_found >= self.max_sets
+
+    def record(self, assignment):
+        super().record(assignment)
+        self.shared_found[self.branch] = self.found
+        if self.scorer is not None and len(self.heap) >= self.max_sets:
+            self.shared_worst[self.branch] = self.heap[0][0]
+
+
+_worker = {}
+
+
+def _init_worker(found, worst, stop, args):
+    _worker['found'] = found
+    _worker['worst'] = worst
+    _worker['stop'] = stop
+    _worker['args'] = args
+
+
+def _run_branch(branch, j, order, max_nodes=None, floor=-1.0):
+    search = BranchSearch(branch, _worker['found'], _worker['worst'], _worker['stop'], *_worker['args'])
+    search.max_nodes = max_nodes
+    search.floor = floor
+    # the least gains only depend on the input, compute them once per process
+    search.least_gain = _worker.get('least_gain', [])
+    try:
+        ranked = search.run_branch(j, order)
+    except SearchCancelled:
+        ranked = []
+    _worker['least_gain'] = search.least_gain
+    return branch, ranked, search.explored, search.pruned, search.exhaustive
+
+
+def _add_stats(stats, explored, pruned, exhaustive):
+    if stats is not None:
+        stats['explored'] = stats.get('explored', 0) + explored
+        stats['pruned'] = stats.get('pruned', 0) + pruned
+        stats['exhaustive'] = stats.get('exhaustive', True) and exhaustive
+
+
+# the ranked sets of every branch in a process pool, budgets[i] nodes for branch i (None for no limit); returns
+# them with whether every branch finished
+def _pool_branches(args, j, orders, budgets, floor, workers, stats, monitor, evaluated=0):
+    # imported here, the process pool is only needed with several workers and is slow to import
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    found = multiprocessing.Array('q', len(orders), lock=False)
+    worst = multiprocessing.Array('d', [-1.0] * len(orders), lock=False)
+    stop = multiprocessing.Value('b', 0, lock=False)
+    results = [[] for order in orders]
+    done_num = 0
+    finished = True
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(found, worst, stop, args)) as pool:
+        pending = set()
+        for branch, order in enumerate(orders):
+            if budgets[branch] == 0:
+                finished = False
+                done_num += 1
+            else:
+                pending.add(pool.submit(_run_branch, branch, j, order, budgets[branch], floor))
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            if monitor is not None and monitor.cancelled():
+                stop.value = 1
+                for future in pending:
+                    future.cancel()
+                raise SearchCancelled()
+            for future in done:
+                branch, ranked, explored, pruned, exhaustive = future.result()
+                results[branch] = ranked
+                evaluated += explored
+                done_num += 1
+                finished = finished and exhaustive
+                _add_stats(stats, explored, pruned, True)
+            if monitor is not None:
+                monitor.progress({'stage': 'search', 'evaluated': evaluated, 'found': sum(found[:]),
+                                  'branches_done': done_num, 'branches': len(orders)})
+    return results, finished
+
+
+# the sets found before the branches (first) and those of every branch in visiting order, ranked by score with a
+# scorer; a set found several times is kept from the first of them, as the serial search keeps it
+def _merge(first, results, scored, max_sets):
+    merged = [(score, -1, rank, solution) for rank, (score, solution) in enumerate(first)]
+    for branch, ranked in enumerate(results):
+        merged += [(score, branch, rank, solution) for rank, (score, solution) in enumerate(ranked)]
+    if scored:
+        merged.sort(key=lambda x: (-x[0], x[1], x[2]))
+    key = set_key if scored else tuple
+    seen = set()
+    distinct = []
+    for x in merged:
+        if key(x[3]) not in seen:
+            seen.add(key(x[3]))
+            distinct.append((x[0], x[3]))
+    return distinct[:max_sets]
+
+
+def parallel_search_overhang_sets(junctions, tables, max_sets=10, scorer=None, fixed_overhangs=(), max_nodes=None,
+                                  workers=2, stats=None, monitor=None, on_solution=None):
+    args = (junctions, tables, max_sets, scorer, fixed_overhangs, max_nodes)
+    if max_sets <= 0 or len(junctions) < 2 or max_nodes is not None:
+        return search_overhang_sets(*args, workers=workers, stats=stats, monitor=monitor, on_solution=on_solution)
+    root = OverhangSearch(*args)
+    domains, state = root.prepare()
+    if not all(domains):
+        return []
+    j, orders = root.root_branches(domains, state)
+    results, finished = _pool_branches(args, j, orders, [None] * len(orders), -1.0, workers, stats, monitor)
+    _add_stats(stats, 0, 0, finished)
+    ranked = _merge([], results, scorer is not None, max_sets)
+    if on_solution is not None and scorer is None:
+        for score, solution in ranked:
+            on_solution(score, solution)
+    return ranked
+
+
+# the second stage of a search with a node budget, after the search first did not finish
+def _search_branches(first, ranked, max_nodes, workers, stats, monitor, on_solution):
+    domains, state = first.prepare()
+    j, orders = first.root_branches(domains, state)
+    left = max_nodes - first.explored
+    budgets = [left // len(orders) + (branch < left % len(orders)) for branch in range(len(orders))]
+    scored = first.scorer is not None
+    floor = first.bound() if scored else -1.0
+    args = (first.junctions, first.tables, first.max_sets, first.scorer, first.fixed_codes)
+    if workers > 1:
+        results, finished = _pool_branches(args + (max_nodes,), j, orders, budgets, floor, workers, stats,
+                                           monitor, first.explored)
+    else:
+        results = []
+        finished = True
+        found = 0
+        explored = first.explored
+        for branch, order in enumerate(orders):
+            # without scorer the branches stop once the ones before them found enough sets
+            if budgets[branch] == 0 or found >= first.max_sets:
+                finished = finished and found >= first.max_sets
+                results.append([])
+                continue
+            search = OverhangSearch(*args, explored + budgets[branch], monitor)
+            search.explored = explored
+            search.least_gain = first.least_gain
+            search.distinct = first.distinct
+            search.floor = floor
+            if not scored:
+                search.max_sets = first.max_sets - found
+            results.append(search.run_branch(j, order))
+            found += len(search.solutions)
+            _add_stats(stats, search.explored - explored, search.pruned, True)
+            explored = search.explored
+            finished = finished and search.exhaustive
+    merged = _merge(ranked, results, scored, first.max_sets)
+    if not scored and len(merged) >= first.max_sets:
+        # enough sets, as a search without scorer that stops early
+        finished = True
+    _add_stats(stats, 0, 0, finished)
+    if on_solution is not None and not scored:
+        for score, solution in merged[len(ranked):]:
+            on_solution(score, solution)
+    return merged
+
+
+def search_overhang_sets(junctions, tables, max_sets=10, scorer=None, fixed_overhangs=(), max_nodes=None,
+                         workers=1, stats=None, monitor=None, on_solution=None):
+    if workers > 1 and max_nodes is None:
+        return parallel_search_overhang_sets(junctions, tables, max_sets, scorer, fixed_overhangs, max_nodes,
+                                             workers, stats, monitor, on_solution)
+    staged = max_nodes is not None and len(junctions) > 1
+    search = OverhangSearch(junctions, tables, max_sets, scorer, fixed_overhangs,
+                            int(max_nodes * FIRST_STAGE_SHARE) if staged else max_nodes, monitor, on_solution)
+    ranked = search.run()
+    if search.exhaustive or not staged:
+        _add_stats(stats, search.explored, search.pruned, search.exhaustive)
+        return ranked
+    _add_stats(stats, search.explored, search.pruned, True)
+    return _search_branches(search, ranked, max_nodes, workers, stats, monitor, on_solution)
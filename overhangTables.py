@@ -0,0 +1,162 @@
+# -- coding: utf-8 --
+
+# Precomputed lookup tables for overhangs.
+#
+# An overhang of length k is encoded as an int of 2k bits (A=0, C=1, G=2, T=3,
+# first base in the highest bits), so there are only 4^k of them (256 for the
+# usual 4 nt overhangs). Sets of overhangs are python ints used as bitsets:
+# bit c is set when overhang c is in the set.
+
+BASES = 'ACGT'
+BASE_CODE = {'A': 0, 'C': 1, 'G': 2, 'T': 3, 'a': 0, 'c': 1, 'g': 2, 't': 3}
+
+# sequences at least this long are filtered with NumPy when it is installed, shorter ones are faster in Python
+NUMPY_MIN_LENGTH = 128
+
+# NumPy takes longer to import than all of GoGo, it is only imported for the first long sequence
+np = None
+_numpy_tried = False
+_BYTE_CODE = None
+
+
+def _load_numpy():
+    global np, _numpy_tried, _BYTE_CODE
+    if not _numpy_tried:
+        _numpy_tried = True
+        try:
+            import numpy
+        except ImportError:
+            return None
+        # byte -> base code, 4 for anything that is not ACGT
+        _BYTE_CODE = numpy.full(256, 4, dtype=numpy.uint8)
+        for base, code in BASE_CODE.items():
+            _BYTE_CODE[ord(base)] = code
+        np = numpy
+    return np
+
+
+class OverhangTables:
+    def __init__(self, length=4, bad_self_pair_seq=()):
+        self.length = length
+        self.size = 4 ** length
+        self.mask = self.size - 1
+        # two overhangs are "similar" when at least this many bases are the same
+        self.similar = length - 1
+        self.all = (1 << self.size) - 1
+
+        self.seq = [self._decode(c) for c in range(self.size)]
+        self.code = {seq: c for c, seq in enumerate(self.seq)}
+        self.reverse_complement = [self._reverse_complement(c) for c in range(self.size)]
+
+        self.palindrome = 0
+        for c in range(self.size):
+            if self.reverse_complement[c] == c:
+                self.palindrome |= 1 << c
+
+        self.bad_self_pair = 0
+        for seq in bad_self_pair_seq:
+            self.bad_self_pair |= 1 << self.code[seq.upper()]
+
+        # compatible[a] has bit b set when a and b can be used in the same assembly: they share less than
+        # `similar` bases and neither does b with the reverse complement of a. The relation is symmetric.
+        # a ^ b has a zero 2-bit group for every base a and b share
+        same = [self._same_counts(x, 0) for x in range(self.size)]
+        dissimilar = 0
+        for x in range(self.size):
+            if same[x] < self.similar:
+                dissimilar |= 1 << x
+        self.compatible = []
+        for a in range(self.size):
+            rc = self.reverse_complement[a]
+            bits = 0
+            for b in range(self.size):
+                if (dissimilar >> (a ^ b)) & 1 and (dissimilar >> (rc ^ b)) & 1:
+                    bits |= 1 << b
+            self.compatible.append(bits)
+        self._lookup_key = None
+        self._lookup = None
+
+    def _decode(self, code):
+        return ''.join(BASES[(code >> (2 * (self.length - 1 - i))) & 3] for i in range(self.length))
+
+    def _reverse_complement(self, code):
+        rc = 0
+        for i in range(self.length):
+            rc = (rc << 2) | (3 - (code & 3))
+            code >>= 2
+        return rc
+
+    def _same_counts(self, a, b):
+        same = 0
+        for i in range(self.length):
+            if (a >> (2 * i)) & 3 == (b >> (2 * i)) & 3:
+                same += 1
+        return same
+
+    def encode(self, seq):
+        return self.code[seq.upper()]
+
+    def is_compatible(self, a, b):
+        return (self.compatible[a] >> b) & 1 == 1
+
+    # overhangs usable inside the array: no palindromes, no bad self pairs and compatible with every fixed overhang
+    def allowed_mask(self, fixed_overhangs=()):
+        allowed = self.all & ~self.palindrome & ~self.bad_self_pair
+        for seq in fixed_overhangs:
+            allowed &= self.compatible[self.encode(seq)]
+        return allowed
+
+    # (code, position) of every window of the sequence whose overhang is in the bitset allowed (see allowed_mask),
+    # in the order of the positions
+    def allowed_windows(self, sequence, allowed):
+        if len(sequence) >= NUMPY_MIN_LENGTH and _load_numpy() is not None:
+            return self._allowed_windows_numpy(sequence, allowed)
+        return [(code, i) for code, i in self.window_codes(sequence) if (allowed >> code) & 1]
+
+    # every window at once: the sequence is encoded to a uint8 array, its windows are a strided view of it, and
+    # the palindrome, bad pair and similarity masks all are in the lookup array of allowed
+    def _allowed_windows_numpy(self, sequence, allowed):
+        if len(sequence) < self.length:
+            return []
+        bases = _BYTE_CODE[np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)]
+        windows = np.lib.stride_tricks.sliding_window_view(bases, self.length)
+        weights = 4 ** np.arange(self.length - 1, -1, -1, dtype=np.int64)
+        codes = windows.astype(np.int64) @ weights
+        lookup = self._allowed_array(allowed)
+        keep = (windows < 4).all(axis=1)
+        keep[keep] = lookup[codes[keep]]
+        positions = np.flatnonzero(keep)
+        return list(zip(codes[positions].tolist(), positions.tolist()))
+
+    def _allowed_array(self, allowed):
+        if self._lookup_key != allowed:
+            bits = np.frombuffer(allowed.to_bytes(self.size // 8, 'little'), dtype=np.uint8)
+            self._lookup = np.unpackbits(bits, bitorder='little').astype(bool)
+            self._lookup_key = allowed
+        return self._lookup
+
+    # (code, position) of every window of the sequence, windows with a non ACGT base are skipped
+    def window_codes(self, sequence):
+        windows = []
+        code = 0
+        valid = 0
+        for i, base in enumerate(sequence):
+            b = BASE_CODE.get(base)
+            if b is None:
+                valid = 0
+                continue
+            code = ((code << 2) | b) & self.mask
+            valid += 1
+            if valid >= self.length:
+                windows.append((code, i - self.length + 1))
+        return windows
+
+
+_tables = {}
+
+
+def get_tables(length=4, bad_self_pair_seq=()):
+    key = (length, tuple(sorted(x.upper() for x in bad_self_pair_seq)))
+    if key not in _tables:
+        _tables[key] = OverhangTables(length, key[1])
+    return _tables[key]
@@ -0,0 +1,150 @@
+# -- coding: utf-8 --
+
+# Command line entry of GoGo for headless machines. It only uses the
+# Qt-free engine, PySide2 is never imported here.
+
+import argparse
+import json
+import re
+import sys
+
+import primerMakerEngine as engine
+from crossHybrid import CrossCheck
+from designCache import DesignCache
+from enzymeSites import ENZYMES, PROFILES, get_scanner
+from designExport import EXPORT_FORMATS, ExportMonitor, open_exporter
+from primerThermo import PrimerChecker
+from protospacerScanner import fasta_candidates, is_fasta
+from ligationFidelity import default_matrix_path
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='primerMakerCLI',
+                                     description='Design Golden Gate primers for a multiplex sgRNA array.')
+    parser.add_argument('-i', '--input', required=True,
+                        help='file with one module per line: "sequence" or "name<TAB>sequence" ("-" for stdin), '
+                             'or a FASTA file (.fa, .fasta, ...) with one record per module')
+    parser.add_argument('--spacer-length', type=int, default=20,
+                        help='length of the NGG protospacers found in a FASTA input (default: 20)')
+    parser.add_argument('--max-candidates', type=int, default=10,
+                        help='candidate protospacers kept per FASTA record (default: 10)')
+    parser.add_argument('-o', '--output', default='-', help='output file (default: stdout)')
+    parser.add_argument('-f', '--format', default='text', choices=['text'] + list(EXPORT_FORMATS),
+                        help='text report (default), a table (tsv, csv), JSON Lines or a 96/384-well plate order; '
+                             'the non text formats are written while the designs are found')
+    parser.add_argument('-d', '--donor', default='pGN1101', choices=engine.DONORS)
+    parser.add_argument('-p', '--promoter-order', default=None,
+                        help='comma separated promoters of modules 2..n, e.g. m6a,m6b,m3 (default order if omitted)')
+    parser.add_argument('--upstream-overhang', default='', help='upstream overhang of custom_donor')
+    parser.add_argument('--downstream-overhang', default='', help='downstream overhang of custom_donor')
+    parser.add_argument('-n', '--max-designs', type=int, default=5, help='number of designs to report')
+    parser.add_argument('--fidelity-matrix', default=None,
+                        help='ligation frequency matrix file; rank overhang sets by predicted ligation fidelity '
+                             '(default: data/ligation_frequency.tsv when present and the overhangs are 4 nt)')
+    parser.add_argument('-e', '--enzyme', default=engine.DEFAULT_PROFILE, choices=list(PROFILES),
+                        help='assembly enzyme: its site starts the primers and sets the overhang length (SapI: 3 nt; '
+                             'default: %(default)s)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of processes searching the overhang sets (default: 1)')
+    parser.add_argument('--report', default=None,
+                        help='write the stage times, overhangs kept and rejected per junction and search counters '
+                             'as JSON to this file ("-" prints them to stderr)')
+    parser.add_argument('--enzymes', default=None,
+                        help='comma separated enzymes whose recognition sites the protospacers must not have, among '
+                             f'{", ".join(ENZYMES)} (default: the assembly enzyme)')
+    parser.add_argument('--screen', action='store_true',
+                        help='only list every recognition site of --enzymes in the candidate protospacers, '
+                             'one per line, instead of designing')
+    parser.add_argument('--thermo', action='store_true',
+                        help='check the Tm, hairpins and 3\' dimers of the primers of %d times more candidate '
+                             'designs and keep those failing the fewest checks' % engine.THERMO_CANDIDATES)
+    parser.add_argument('--cross-check', action='store_true',
+                        help="do not use the candidates that would bring in a site for the 3' end of a primer of the "
+                             "array (10 paired bases or more)")
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory keeping the designs already made, reused across runs and batch workers')
+    return parser
+
+
+def write_report(report, path):
+    if path == '-':
+        sys.stderr.write('\n'.join(engine.format_report(report)) + '\n')
+        return
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
+        f.write('\n')
+
+
+# every site of every candidate: module, candidate (1-based), enzyme, site, strand, position (1-based)
+def write_screen(candidate_target_seq, module_name, enzymes, f):
+    f.write('Module\tCandidate\tSequence\tEnzyme\tSite\tStrand\tPosition\n')
+    for x in get_scanner(enzymes).scan_modules(candidate_target_seq):
+        f.write(f'{module_name[x.module - 1]}\t{x.candidate + 1}\t{x.sequence}\t{x.hit.enzyme}\t{x.hit.site}\t'
+                f'{x.hit.strand}\t{x.hit.start + 1}\n')
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    exporter = None
+    report = {} if args.report else None
+    try:
+        if args.input == '-':
+            candidate_target_seq, module_num, module_name = engine.parse_target_lines(sys.stdin)
+        elif is_fasta(args.input):
+            candidate_target_seq, module_num, module_name = \
+                fasta_candidates(args.input, args.spacer_length, args.max_candidates)
+        else:
+            candidate_target_seq, module_num, module_name = \
+                engine.get_candidate_target_seq_from_file(args.input)
+        enzymes = (args.enzyme,)
+        if args.enzymes:
+            enzymes = tuple(x.strip() for x in args.enzymes.split(',') if x.strip())
+        for enzyme in enzymes:
+            if enzyme not in ENZYMES:
+                raise engine.DesignError(f'Unknown enzyme {enzyme}')
+        if args.screen:
+            if args.output == '-':
+                write_screen(candidate_target_seq, module_name, enzymes, sys.stdout)
+            else:
+                with open(args.output, 'w') as f:
+                    write_screen(candidate_target_seq, module_name, enzymes, f)
+            return 0
+        promoter_order = None
+        if args.promoter_order:
+            promoter_order = [x.strip() for x in args.promoter_order.split(',') if x.strip()]
+        fidelity_matrix = args.fidelity_matrix
+        if fidelity_matrix is None:
+            fidelity_matrix = default_matrix_path(PROFILES[args.enzyme].overhang_length)
+        monitor = None
+        if args.format != 'text':
+            exporter = open_exporter(sys.stdout if args.output == '-' else args.output, args.format)
+            monitor = ExportMonitor(exporter)
+        result = engine.design(candidate_target_seq, module_name, args.donor, promoter_order,
+                               args.upstream_overhang, args.downstream_overhang, args.max_designs,
+                               fidelity_matrix, workers=args.workers, monitor=monitor,
+                               cache=DesignCache(args.cache_dir) if args.cache_dir else None, report=report, enzymes=enzymes,
+                               profile=args.enzyme,
+                               thermo=PrimerChecker() if args.thermo else None,
+                               cross_check=CrossCheck() if args.cross_check else None)
+    except (engine.DesignError, OSError) as e:
+        sys.stderr.write(f'Error: {e}\n')
+        return 1
+    finally:
+        if exporter is not None:
+            exporter.close()
+        if report is not None:
+            write_report(report, args.report)
+    if exporter is not None:
+        return 0
+
+    text = re.sub(' *\t', '\t', '\n'.join(engine.format_result(result)))
+    if args.output == '-':
+        sys.stdout.write(text + '\n')
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
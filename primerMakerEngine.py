@@ -0,0 +1,934 @@
+# -- coding: utf-8 --
+
+# Qt-free design engine of GoGo. Everything in here can be used from scripts,
+# the command line and the GUI; nothing imports PySide2.
+
+import itertools
+import os
+import time
+from overhangTables import get_tables
+from overhangSearch import SearchCancelled, search_overhang_sets
+from ligationFidelity import FidelityError, load_scorer
+from designModel import Design, DesignResult, PrimerPair
+from designCache import cache_key
+from enzymeSites import ENZYMES, PROFILES, EnzymeProfile, check_overhang_length, format_hit, get_scanner
+from primerThermo import rank_sets
+
+
+class DesignError(Exception):
+    pass
+
+
+class DesignCancelled(DesignError):
+    pass
+
+
+# design() reports to a monitor while it runs; the GUI runs it on a worker thread and forwards these calls as
+# signals. progress gets a dict with 'stage' ('filter' or 'search') and, while searching, 'evaluated' (search
+# nodes), 'found' (overhang sets) and the junctions or branches done so far. Returning True from cancelled()
+# stops the design with DesignCancelled.
+class DesignMonitor:
+    def started(self, result):
+        pass
+
+    def progress(self, info):
+        pass
+
+    def design_found(self, result, one_design):
+        pass
+
+    def cancelled(self):
+        return False
+
+
+def _check_cancelled(monitor):
+    if monitor.cancelled():
+        raise DesignCancelled('The design was cancelled.\n')
+
+
+DOWNSTREAM_OVERHANG = 'GTTT'
+
+SEQ_DECODE = {'1': 'AGCCAAGCCAGCAC',
+              '2': 'ACAAGCGGCAGCGC',
+              '3': 'GCCTCAGCGCAGCAG',
+              '4': 'ACGGATCATCTGCACAA',
+              5: ['ggctacGGTCTCt', 'GTTTCAGAGCTAGAAATAGCAAGTT', 'ggctacGGTCTCt{}']
+              }
+
+PROMOTER_ENCODE = {'m6a': '1',
+                   'm6b': '2',
+                   'm6c': '3',
+                   'm3': '4',
+                   'pGN1101': '5',
+                   'pGN1102': '6',
+                   'pGN1103': '7',
+                   'pGN1104': '8',
+                   'custom_donor': '9'
+                   }
+
+PROMOTER_DECODE = dict(zip(PROMOTER_ENCODE.values(), PROMOTER_ENCODE.keys()))
+
+PROMOTER_DOWNSTREAM = {'1': 'GCCG',
+                       '2': 'GTTG',
+                       '3': 'TCAG',
+                       '4': 'GGCA',
+                       '5': 'GCCG',
+                       '6': 'GGCA',
+                       '7': 'TCAG',
+                       '8': 'GGCA'
+                       }
+
+PROMOTERS = ['m6a', 'm6b', 'm6c', 'm3']
+DONORS = ['pGN1101', 'pGN1102', 'pGN1103', 'pGN1104', 'custom_donor']
+
+# bad_self_pair_seq = ['AGGG', 'CCCT', 'TAAA', 'TTTA', 'TTGA', 'TCAA', 'CCCC', 'GGGG', 'CGCC', 'GGCG']
+BAD_SELF_PAIR_SEQ = ['GTTT', 'GTGT', 'GCGT', 'GTCT', 'TGCT', 'GGCT', 'AGGG', 'CCCT', 'TAAA', 'TTTA',
+                     'TTGA', 'TCAA', 'TCGG', 'GTCA', 'GACA', 'TGCG', 'CTTG', 'CGTG', 'CGAG', 'CCCC',
+                     'GGGG', 'CGCC', 'GGCG', 'GGAC']
+
+# enzymes whose recognition sites must not be in the processed protospacers: the assembly enzyme
+DEFAULT_ENZYMES = ('BsaI',)
+# the assembly enzyme, see enzymeSites.PROFILES; SEQ_DECODE[5] is the primer ends of this one
+DEFAULT_PROFILE = 'BsaI'
+
+# node budget of the overhang search
+MAX_SEARCH_NODES = 200000
+# candidate designs checked per design kept, with primer thermodynamics checks
+THERMO_CANDIDATES = 10
+
+DEFAULT_ORDER = {0: '',
+                 1: '1',
+                 2: '12',
+                 3: '123',
+                 4: '1234',
+                 5: '11234',
+                 6: '112234',
+                 7: '1122334',
+                 8: '11223344'
+                 }
+
+
+def get_reverse_complement(sequence):
+    sequence = list(sequence.upper())
+    sequence.reverse()
+    temp = []
+    for i in sequence:
+        if i == 'A':
+            temp.append('T')
+        elif i == 'T':
+            temp.append('A')
+        elif i == 'C':
+            temp.append('G')
+        elif i == 'G':
+            temp.append('C')
+    sequence = ''.join(temp)
+    return sequence
+
+
+def hammingDistance(x, y):
+    same_counts = 0
+    for i in range(len(x)):
+        if x[i].upper() == y[i].upper():
+            same_counts += 1
+    return same_counts
+
+
+def is_DNA_seq(seq):
+    define = []
+    DNA_seq = ['A', 'T', 'C', 'G']
+    for bp in seq:
+        if bp in DNA_seq:
+            define.append(True)
+        else:
+            define.append(False)
+    return all(define)
+
+
+# one module per line: either "sequence" or "name<TAB>sequence"; several candidate sequences of one module are
+# separated by commas or further tabs, e.g. "name<TAB>sequence1,sequence2"
+def parse_target_lines(lines):
+    candidate_target_seq = {}
+    module_num = 0
+    module_name = []
+    for line in lines:
+        line = line.replace('\n', '').replace('\r', '')
+        if line.strip() == '':
+            continue
+        module_num += 1
+        record = line.split('\t')
+        if len(record) == 1:
+            module_name.append(str(module_num))
+        else:
+            module_name.append(record[0])
+            record = record[1:]
+        candidate_target_seq[module_num] = [x.strip().upper() for field in record for x in field.split(',')
+                                            if x.strip()]
+        if not candidate_target_seq[module_num]:
+            raise DesignError(f'Module {module_num} has no target sequence.\n')
+    return candidate_target_seq, module_num, module_name
+
+
+def get_candidate_target_seq_from_file(filename):
+    with open(filename, 'r') as f:
+        return parse_target_lines(f)
+
+
+def get_promoter_order(module_num, if_default, donor, promoter_encode, promoter_order_temp):
+    promoter_order = promoter_encode[donor]
+    if if_default == 'y':
+        if module_num - 1 <= 8:
+            promoter_order += DEFAULT_ORDER[module_num - 1]
+        else:
+            for i in range(module_num - 1):
+                promoter_order += DEFAULT_ORDER[8][i % 8]
+        return list(promoter_order)
+    else:
+        promoter_order += promoter_order_temp
+        return list(promoter_order)
+
+
+# the encoded promoter order (donor first) of an array of module_num modules from promoter_order, None for the default
+# order or the names of the promoters of modules 2..n
+def resolve_promoter_order(module_num, donor, promoter_order=None):
+    if promoter_order is None:
+        return get_promoter_order(module_num, 'y', donor, PROMOTER_ENCODE, '')
+    if len(promoter_order) != module_num - 1:
+        raise DesignError(f'Please input the correct amount of modules ！\n with your input data should be '
+                          f'{module_num - 1}')
+    promoter_order_temp = ''
+    for promoter in promoter_order:
+        if promoter.lower() not in PROMOTERS:
+            raise DesignError(f'Unknown promoter {promoter}\n')
+        promoter_order_temp += PROMOTER_ENCODE[promoter.lower()]
+    return get_promoter_order(module_num, 'n', donor, PROMOTER_ENCODE, promoter_order_temp)
+
+
+# cut candidate target sequence according to the promoter downstream and get overhang produced sequence
+def deal_candidate_target_seq(promoter_order, candidate_target_seq, promoter_downstream, module_num):
+    deal_target_seq = {}
+    for promoter_position in range(len(promoter_order)):
+        module_position = promoter_position + 1
+        seq_deal = []
+        for target_seq in candidate_target_seq[module_position]:
+            if target_seq[0] == promoter_downstream[promoter_order[promoter_position]][-1]:
+                seq_deal.append(promoter_downstream[promoter_order[promoter_position]] + target_seq[1:])
+            else:
+                seq_deal.append(promoter_downstream[promoter_order[promoter_position]] + target_seq)
+        deal_target_seq[module_position] = seq_deal
+    return deal_target_seq
+
+
+# for every module, {candidate index: [(overhang, position), ...]} with the candidates free of the recognition sites
+# of enzymes (names of enzymeSites.ENZYMES, on either strand); the first and the last module have no junction inside,
+# their lists are empty. The sites of all the modules are found in one pass and, when some modules have no candidate
+# left, the DesignError lists every site of these modules.
+# memo (a dict) keeps the lists of the modules of this call for the next one, a module whose processed sequences did
+# not change is not filtered again
+# counts, when given a dict, gets for every module with a junction how many overhang windows were kept and why the
+# others were rejected (see count_rejections)
+def filter_targets(deal_target_seq, module_num, promoter_order, promoter_downstream, bad_self_pair_seq,
+                   downstream_overhang, memo=None, counts=None, enzymes=DEFAULT_ENZYMES, overhang_length=4):
+    tables = get_tables(overhang_length, bad_self_pair_seq)
+    scanner = get_scanner(enzymes)
+    allowed = tables.allowed_mask([downstream_overhang, promoter_downstream[promoter_order[0]]])
+    filtered_target = {}
+    used = {}
+    memo_keys = {module_position: (tuple(deal_target_seq[module_position]), module_position in (1, module_num),
+                                   allowed, tuple(enzymes), overhang_length)
+                 for module_position in deal_target_seq.keys()}
+    todo = {module_position: deal_target_seq[module_position] for module_position in deal_target_seq.keys()
+            if memo is None or memo_keys[module_position] not in memo}
+    hits = scanner.scan_modules(todo)
+    with_site = {(x.module, x.candidate) for x in hits}
+    if counts is not None:
+        for module_position in range(2, module_num):
+            counts[module_position] = count_rejections(tables, deal_target_seq[module_position], allowed, scanner)
+    without_candidate = []
+    for module_position in deal_target_seq.keys():
+        memo_key = memo_keys[module_position]
+        if module_position not in todo:
+            filtered_target[module_position] = used[memo_key] = memo[memo_key]
+            continue
+        filtered_overhang = {}
+        for target in range(len(deal_target_seq[module_position])):
+            if (module_position, target) in with_site:
+                continue
+            filtered_overhang[target] = []
+            if module_position != 1 and module_position != module_num:
+                filtered_overhang[target] = [(tables.seq[code], i) for code, i in
+                                             tables.allowed_windows(deal_target_seq[module_position][target], allowed)]
+        if not filtered_overhang:
+            without_candidate.append(module_position)
+        filtered_target[module_position] = used[memo_key] = filtered_overhang
+    if without_candidate:
+        raise DesignError(''.join(format_hit(x) + '\n' for x in hits if x.module in without_candidate))
+    if memo is not None:
+        memo.clear()
+        memo.update(used)
+    return filtered_target
+
+
+# the junction candidates of filtered_overhang ({module position: [(overhang, position, candidate index), ...]}) with
+# the overhangs of overhang_plan, one entry per junction: an overhang, a list of overhangs or None for all
+def apply_overhang_plan(filtered_overhang, overhang_plan):
+    if len(overhang_plan) != len(filtered_overhang):
+        raise DesignError(f'The overhang plan has {len(overhang_plan)} junctions, the array has '
+                          f'{len(filtered_overhang)}\n')
+    planned = {}
+    for module_position, entry in zip(sorted(filtered_overhang), overhang_plan):
+        candidates = filtered_overhang[module_position]
+        if entry is not None:
+            entry = {entry.upper()} if isinstance(entry, str) else {x.upper() for x in entry}
+            candidates = [x for x in candidates if x[0] in entry]
+            if not candidates:
+                raise DesignError(f'No candidate of module {module_position} has a planned overhang '
+                                  f'({", ".join(sorted(entry))})\n')
+        planned[module_position] = candidates
+    return planned
+
+
+# the tables of the overhang codes and, for every junction of the array (modules 2..n-1), the bitset of the overhangs
+# it can take, with the arguments of design; the library planner chooses overhangs shared by many arrays from them
+def junction_domains(candidate_target_seq, donor='pGN1101', promoter_order=None, upstream_overhang='',
+                     downstream_overhang='', enzymes=None, profile=DEFAULT_PROFILE):
+    if donor not in DONORS:
+        raise DesignError(f'Unknown donor {donor}\n')
+    profile = get_profile(profile)
+    enzymes = (profile.enzyme,) if enzymes is None else tuple(enzymes)
+    for enzyme in enzymes:
+        if enzyme not in ENZYMES:
+            raise DesignError(f'Unknown enzyme {enzyme}\n')
+    module_num = len(candidate_target_seq)
+    if module_num == 0:
+        raise DesignError('No target sequence was given.\n')
+    promoter_downstream, downstream, bad_self_pair_seq = profile_overhangs(profile)
+    if donor == 'custom_donor':
+        upstream, downstream = check_custom_donor(upstream_overhang, downstream_overhang, profile.overhang_length)
+        promoter_downstream[PROMOTER_ENCODE[donor]] = upstream
+    for module_position in range(1, module_num + 1):
+        for target_seq in candidate_target_seq[module_position]:
+            if not target_seq or not is_DNA_seq(target_seq.upper()):
+                raise DesignError(f'The candidate target {target_seq} of module {module_position} '
+                                  f'is not a DNA sequence\n')
+    candidate_target_seq = {k: [x.upper() for x in v] for k, v in candidate_target_seq.items()}
+    promoter_order = resolve_promoter_order(module_num, donor, promoter_order)
+    deal_target_seq = deal_candidate_target_seq(promoter_order, candidate_target_seq, promoter_downstream,
+                                                module_num)
+    filtered_target = filter_targets(deal_target_seq, module_num, promoter_order, promoter_downstream,
+                                     bad_self_pair_seq, downstream, enzymes=enzymes,
+                                     overhang_length=profile.overhang_length)
+    tables = get_tables(profile.overhang_length, bad_self_pair_seq)
+    domains = []
+    for module_position in range(2, module_num):
+        domain = 0
+        for windows in filtered_target[module_position].values():
+            for seq, site in windows:
+                domain |= 1 << tables.code[seq]
+        domains.append(domain)
+    return tables, domains
+
+
+# filtered_target without the candidates that would put in a primer or a PCR product a site for the 3' end of one of
+# the primers, ends being the 3' parts shared by the primers (scaffold and promoters): the whole candidate of the first
+# and the last module, the parts of a junction candidate on either side of its overhang. All the candidates are put in
+# one crossHybrid.SeedIndex and looked up once per end. counts (see filter_targets) gets the junction candidates vetoed
+# as cross_hybrid.
+def veto_cross_hybrid(cross_check, deal_target_seq, filtered_target, module_num, ends, counts=None):
+    options = {}
+    for module_position in range(1, module_num + 1):
+        for target, windows in filtered_target[module_position].items():
+            sequence = deal_target_seq[module_position][target]
+            if module_position in (1, module_num):
+                options[(module_position, target, None)] = [sequence]
+            for seq, site in windows:
+                options[(module_position, target, site)] = [sequence[site:], sequence[:site + len(seq)]]
+    vetoed = cross_check.vetoed(options, ends)
+    # filtered_target can be the memo of filter_targets, it is not changed
+    kept = {}
+    without_candidate = []
+    for module_position in range(1, module_num + 1):
+        if module_position in (1, module_num):
+            kept[module_position] = {target: windows for target, windows in filtered_target[module_position].items()
+                                     if (module_position, target, None) not in vetoed}
+        else:
+            kept[module_position] = {}
+            removed = 0
+            for target, windows in filtered_target[module_position].items():
+                left = [x for x in windows if (module_position, target, x[1]) not in vetoed]
+                removed += len(windows) - len(left)
+                if left:
+                    kept[module_position][target] = left
+            if counts is not None and module_position in counts:
+                counts[module_position]['kept'] -= removed
+                counts[module_position]['cross_hybrid'] = removed
+        if not kept[module_position]:
+            without_candidate.append(module_position)
+    if without_candidate:
+        raise DesignError(f"No candidate of module {', '.join(map(str, without_candidate))} is free of sites for the "
+                          f"3' ends of the primers\n")
+    return kept
+
+
+# kept and rejected overhang windows of the candidates of one module, by reason: enzyme_site (whole candidates with a
+# recognition site found by scanner), invalid_base, palindrome, bad_self_pair, similar_to_donor (similar to the donor
+# overhangs or to their reverse complements)
+def count_rejections(tables, sequences, allowed, scanner=None):
+    if scanner is None:
+        scanner = get_scanner(DEFAULT_ENZYMES)
+    counts = {'kept': 0, 'enzyme_site': 0, 'invalid_base': 0, 'palindrome': 0, 'bad_self_pair': 0,
+              'similar_to_donor': 0}
+    for sequence in sequences:
+        if scanner.contains_site(sequence):
+            counts['enzyme_site'] += 1
+            continue
+        windows = tables.window_codes(sequence)
+        counts['invalid_base'] += max(len(sequence) - tables.length + 1, 0) - len(windows)
+        for code, i in windows:
+            if (allowed >> code) & 1:
+                counts['kept'] += 1
+            elif (tables.palindrome >> code) & 1:
+                counts['palindrome'] += 1
+            elif (tables.bad_self_pair >> code) & 1:
+                counts['bad_self_pair'] += 1
+            else:
+                counts['similar_to_donor'] += 1
+    return counts
+
+
+# the candidate overhangs of every junction are tuples (overhang, position, ...); returns (score, combination) pairs,
+# best first, the score is None without a ligation fidelity scorer
+def target_combination(filtered_target, bad_self_pair_seq=BAD_SELF_PAIR_SEQ, max_sets=10, scorer=None,
+                       fixed_overhangs=(), max_nodes=None, workers=1, stats=None, monitor=None, on_solution=None,
+                       overhang_length=4):
+    tables = get_tables(overhang_length, bad_self_pair_seq)
+    junctions = [[(tables.encode(x[0]),) + tuple(x[1:]) for x in candidates] for candidates in filtered_target.values()]
+    on_coded_solution = None
+    if on_solution is not None:
+        def on_coded_solution(score, solution):
+            on_solution(score, [(tables.seq[x[0]],) + tuple(x[1:]) for x in solution])
+    ranked = search_overhang_sets(junctions, tables, max_sets, scorer, fixed_overhangs, max_nodes, workers, stats,
+                                  monitor, on_coded_solution)
+    return [(score, [(tables.seq[x[0]],) + tuple(x[1:]) for x in solution]) for score, solution in ranked]
+
+
+# the overhang of a junction is (overhang, position) in the first candidate of its module or
+# (overhang, position, candidate index); end_targets are the candidate indexes of the first and the last module
+def primerMakerForOneTarget(target_combo, promoter_order, seq_decode, deal_target_seq, end_targets=(0, 0)):
+    primer_list = []
+    for filtered_overhang in target_combo:
+        chosen = [end_targets[0]] + [x[2] if len(x) > 2 else 0 for x in filtered_overhang] + [end_targets[1]]
+        target_seq = {module_position: deal_target_seq[module_position][chosen[module_position - 1]]
+                      for module_position in range(1, len(promoter_order) + 1)}
+        primers = []
+        for promoter_position in range(len(promoter_order)):
+            module_position = promoter_position + 1
+            overhang_position = module_position - 2
+            if module_position == 1:
+                upstream = seq_decode[5][0] + target_seq[module_position] + seq_decode[5][1]
+                downstream = seq_decode[5][0] + get_reverse_complement(
+                    target_seq[module_position + 1][:filtered_overhang[overhang_position + 1][1] +
+                                                    len(filtered_overhang[overhang_position + 1][0])]) + \
+                    seq_decode[promoter_order[module_position]]
+                primers.append([upstream, downstream])
+            elif 1 < module_position < len(promoter_order) - 1:
+                upstream = seq_decode[5][0] + target_seq[module_position][
+                                              filtered_overhang[overhang_position][1]:] + seq_decode[5][1]
+                downstream = seq_decode[5][0] + get_reverse_complement(
+                    target_seq[module_position + 1][:filtered_overhang[overhang_position + 1][1] +
+                                                    len(filtered_overhang[overhang_position + 1][0])]) + \
+                    seq_decode[promoter_order[module_position]]
+                primers.append([upstream, downstream])
+            elif module_position == len(promoter_order) - 1:
+                upstream = seq_decode[5][0] + target_seq[module_position][
+                                              filtered_overhang[overhang_position][1]:] + seq_decode[5][1]
+                downstream = seq_decode[5][2] + get_reverse_complement(target_seq[module_position + 1]) + \
+                    seq_decode[promoter_order[module_position]]
+                primers.append([upstream, downstream])
+        primer_list.append(primers)
+    return primer_list
+
+
+def check_custom_donor(upstream_overhang, downstream_overhang, overhang_length=4):
+    upstream_overhang = upstream_overhang.upper()
+    downstream_overhang = downstream_overhang.upper() or DOWNSTREAM_OVERHANG[:overhang_length]
+    if not is_DNA_seq(upstream_overhang) or not is_DNA_seq(downstream_overhang) or \
+            len(upstream_overhang) != overhang_length or len(downstream_overhang) != overhang_length:
+        raise DesignError(f'The user-defined donors must be in correct format.(A string of length {overhang_length} '
+                          f'containing only four elements of A,T,C and G)')
+    if hammingDistance(upstream_overhang, downstream_overhang) >= overhang_length - 1 or \
+            hammingDistance(get_reverse_complement(upstream_overhang), downstream_overhang) >= overhang_length - 1:
+        raise DesignError('The upstream overhang and downstream overhangs of user-defined donors are homologous '
+                          'or complementary, causing error-prone assembly.')
+    return upstream_overhang, downstream_overhang
+
+
+# the enzyme profile of a name of enzymeSites.PROFILES or an EnzymeProfile
+def get_profile(profile):
+    if isinstance(profile, EnzymeProfile):
+        # _replace does not go through EnzymeProfile.__new__
+        check_overhang_length(profile.enzyme, profile.overhang_length)
+        if profile.enzyme not in ENZYMES:
+            raise DesignError(f'Unsupported enzyme profile {profile}\n')
+        return profile
+    if profile not in PROFILES:
+        raise DesignError(f'Unknown enzyme profile {profile}\n')
+    return PROFILES[profile]
+
+
+# the overhangs of the vectors and the bad self pairs for the overhang length of profile: the promoter overhangs
+# are the bases just before the protospacer, the downstream overhang the first bases of the sgRNA scaffold; the bad
+# self pairs are only known for 4 nt overhangs
+def profile_overhangs(profile):
+    length = profile.overhang_length
+    promoter_downstream = {k: v[-length:] for k, v in PROMOTER_DOWNSTREAM.items()}
+    bad_self_pair_seq = BAD_SELF_PAIR_SEQ if length == 4 else []
+    return promoter_downstream, DOWNSTREAM_OVERHANG[:length], bad_self_pair_seq
+
+
+def design(candidate_target_seq, module_name=None, donor='pGN1101', promoter_order=None,
+           upstream_overhang='', downstream_overhang='', max_designs=5, fidelity_matrix=None,
+           max_nodes=MAX_SEARCH_NODES, workers=1, monitor=None, cache=None, incremental=None, report=None,
+           enzymes=None, profile=DEFAULT_PROFILE, thermo=None, cross_check=None,
+           overhang_plan=None):
+    """Design the primers of one sgRNA array.
+
+    candidate_target_seq maps the module position (1, 2, ...) to its list of
+    candidate protospacers, promoter_order is None for the default order or a
+    list of promoter names (e.g. ['m6a', 'm3']) for modules 2..n.  With
+    fidelity_matrix (the path of a ligation frequency file) the designs are
+    the max_designs overhang sets of highest predicted ligation fidelity
+    among the first max_nodes search nodes (None for no limit). workers > 1
+    searches the overhang sets in a process pool of that size, with the same
+    result as a single worker. monitor is a DesignMonitor told about the
+    progress and every design as soon as it is ready. With a
+    designCache.DesignCache, a design already made from the same processed
+    inputs is taken from it. incremental is the IncrementalDesigner of the
+    previous design of the same array, see IncrementalDesigner.design.
+    report, when given a dict, is filled with the time of every stage, the
+    overhangs kept and rejected at every junction and the search counters
+    (see format_report); it is also filled up to the failing stage when the
+    design raises DesignError. profile is the assembly enzyme, a name of
+    enzymeSites.PROFILES or an enzymeSites.EnzymeProfile: its recognition
+    site, spacer and flank start the primers and its overhang length (3 or 4)
+    is the length of the junction overhangs. Candidates with a recognition
+    site of one of enzymes (names of enzymeSites.ENZYMES, by default the
+    enzyme of profile) on either strand are not used. With a
+    primerThermo.PrimerChecker as thermo, THERMO_CANDIDATES times
+    max_designs overhang sets are made, each with every choice of the
+    candidates of the first and the last module, the primers of all are
+    checked (Tm, hairpin, 3' dimer) and the designs failing the fewest checks
+    are kept, in their order otherwise; their designs are only shown once all
+    are checked. With a crossHybrid.CrossCheck as cross_check, the candidates
+    of an array of two or more modules that would bring in a site for the 3'
+    end of one of its primers are not used (see veto_cross_hybrid).
+    overhang_plan restricts the junction overhangs of an array of three or
+    more modules, e.g. to overhangs shared by a library (see libraryPlan):
+    one entry per junction, an overhang, a list of overhangs or None for no
+    restriction.
+    Returns a designModel.DesignResult that can be rendered with format_result.
+    """
+    if monitor is None:
+        monitor = DesignMonitor()
+    start = _stage(report, None, None)
+    if donor not in DONORS:
+        raise DesignError(f'Unknown donor {donor}\n')
+    profile = get_profile(profile)
+    overhang_length = profile.overhang_length
+    enzymes = (profile.enzyme,) if enzymes is None else tuple(enzymes)
+    for enzyme in enzymes:
+        if enzyme not in ENZYMES:
+            raise DesignError(f'Unknown enzyme {enzyme}\n')
+    module_num = len(candidate_target_seq)
+    if module_num == 0:
+        raise DesignError('No target sequence was given.\n')
+    if module_name is None:
+        module_name = [str(i) for i in range(1, module_num + 1)]
+    promoter_downstream, downstream, bad_self_pair_seq = profile_overhangs(profile)
+    for module_position in range(1, module_num + 1):
+        for target_seq in candidate_target_seq[module_position]:
+            if not target_seq or not is_DNA_seq(target_seq.upper()):
+                raise DesignError(f'The candidate target {target_seq} of module {module_position} '
+                                  f'is not a DNA sequence\n')
+    candidate_target_seq = {k: [x.upper() for x in v] for k, v in candidate_target_seq.items()}
+
+    scorer = None
+    if fidelity_matrix is not None:
+        try:
+            scorer = load_scorer(fidelity_matrix, get_tables(overhang_length, bad_self_pair_seq))
+        except (OSError, FidelityError) as e:
+            raise DesignError(f'Cannot load the ligation frequency matrix: {e}\n')
+
+    if donor == 'custom_donor':
+        upstream, downstream = check_custom_donor(upstream_overhang, downstream_overhang, overhang_length)
+        promoter_downstream[PROMOTER_ENCODE[donor]] = upstream
+    seq_decode = dict(SEQ_DECODE)
+    seq_decode[5] = [profile.prefix, SEQ_DECODE[5][1], profile.prefix + get_reverse_complement(downstream)]
+
+    promoter_order = resolve_promoter_order(module_num, donor, promoter_order)
+    promoter_order_decode = [PROMOTER_DECODE[x] for x in promoter_order]
+
+    result = DesignResult(candidate_target_seq, module_num, module_name, promoter_order, promoter_order_decode,
+                          'oligo' if module_num == 1 else 'single' if module_num == 2 else 'multi')
+
+    _check_cancelled(monitor)
+    monitor.progress({'stage': 'filter', 'junctions': max(module_num - 2, 0)})
+    start = _stage(report, 'prepare', start)
+    deal_target_seq = deal_candidate_target_seq(promoter_order, candidate_target_seq, promoter_downstream,
+                                                module_num)
+    start = _stage(report, 'deal_candidate_target_seq', start)
+    key = None
+    if cache is not None:
+        key = design_key(candidate_target_seq, deal_target_seq, module_name, promoter_order,
+                         promoter_downstream[PROMOTER_ENCODE[donor]], downstream, max_designs, fidelity_matrix,
+                         max_nodes, enzymes, profile, thermo, cross_check, overhang_plan)
+        cached = cache.get(key)
+        if report is not None:
+            report['cache'] = 'miss' if cached is None else 'hit'
+        if cached is not None:
+            _stage(report, 'cache', start)
+            monitor.started(cached)
+            for one_design in cached.designs:
+                monitor.design_found(cached, one_design)
+            return cached
+    junction_counts = None
+    if report is not None:
+        junction_counts = report['junctions'] = {}
+    filtered_target = filter_targets(deal_target_seq, module_num, promoter_order, promoter_downstream,
+                                     bad_self_pair_seq, downstream,
+                                     incremental.filter_memo if incremental is not None else None, junction_counts,
+                                     enzymes, overhang_length)
+    start = _stage(report, 'filter_targets', start)
+    if cross_check is not None and module_num > 1:
+        ends = [seq_decode[5][1]] + [seq_decode[promoter_order[i]] for i in range(1, module_num)]
+        filtered_target = veto_cross_hybrid(cross_check, deal_target_seq, filtered_target, module_num, ends,
+                                            junction_counts)
+        start = _stage(report, 'cross_hybrid', start)
+
+    donor_downstream = promoter_downstream[PROMOTER_ENCODE[donor]]
+    if module_num == 1:
+        # the annealed oligos of one module are made to pair with each other, they are not checked
+        thermo = None
+    candidates = max_designs * THERMO_CANDIDATES if thermo is not None else max_designs
+
+    def chosen_targets(chosen):
+        return [candidate_target_seq[module_position][target] for module_position, target in enumerate(chosen, 1)]
+
+    if module_num <= 2:
+        # no junction to search, every combination of the candidates is a design
+        choices = itertools.islice(itertools.product(*[sorted(filtered_target[module_position].keys())
+                                                       for module_position in range(1, module_num + 1)]),
+                                   candidates)
+        for chosen in choices:
+            if module_num == 1:
+                ops1 = deal_target_seq[1][chosen[0]]
+                ps1 = ops1[overhang_length:]
+                primers = [PrimerPair(f'{module_name[0]}_f', ops1, f'{module_name[0]}_r',
+                                      get_reverse_complement(downstream) + get_reverse_complement(ps1))]
+            else:
+                upstream = seq_decode[5][0] + deal_target_seq[1][chosen[0]] + seq_decode[5][1]
+                reverse = seq_decode[5][2] + get_reverse_complement(deal_target_seq[2][chosen[1]]) + \
+                    seq_decode[promoter_order[1]]
+                primer_name = f'{module_name[0]}&{module_name[1]}_{promoter_order_decode[1]}'
+                primers = [PrimerPair(f'{primer_name}_f', upstream, f'{primer_name}_r', reverse)]
+            result.designs.append(Design(len(result.designs) + 1, primers, [donor_downstream, downstream],
+                                         chosen_targets(chosen)))
+        result.designs = rank_designs(thermo, result.designs, max_designs, len(profile.prefix), report)
+        _stage(report, 'primers', start)
+        monitor.started(result)
+        for one_design in result.designs:
+            monitor.design_found(result, one_design)
+        if cache is not None:
+            cache.put(key, result)
+        return result
+
+    # the junction of module m can be in any of its candidates: (overhang, position, candidate index); the first and
+    # the last module have no junction, their candidates do not change the overhangs nor the fidelity of a set and
+    # are only chosen among by the primer checks, without them they keep their first candidate
+    filtered_overhang = {}
+    for module_position in range(2, module_num):
+        filtered_overhang[module_position] = [(seq, site, target)
+                                              for target in sorted(filtered_target[module_position].keys())
+                                              for seq, site in filtered_target[module_position][target]]
+    if overhang_plan is not None:
+        filtered_overhang = apply_overhang_plan(filtered_overhang, overhang_plan)
+    end_choices = [(min(filtered_target[1].keys()), min(filtered_target[module_num].keys()))]
+    if thermo is not None:
+        end_choices = list(itertools.product(sorted(filtered_target[1].keys()),
+                                             sorted(filtered_target[module_num].keys())))
+
+    def make_design(score, combo, end_targets=end_choices[0]):
+        primers = primerMakerForOneTarget([combo], promoter_order, seq_decode, deal_target_seq, end_targets)[0]
+        named = []
+        for i in range(len(primers)):
+            if i != len(primers) - 1:
+                primer_name = f'{module_name[i]}_{promoter_order_decode[i + 1]}'
+            else:
+                primer_name = f'{module_name[i]}&{module_name[i + 1]}_{promoter_order_decode[i + 1]}'
+            named.append(PrimerPair(f'{primer_name}_f', primers[i][0], f'{primer_name}_r', primers[i][1]))
+        overhang = [donor_downstream] + [x[0] for x in combo] + [downstream]
+        chosen = [end_targets[0]] + [x[2] for x in combo] + [end_targets[1]]
+        return Design(len(result.designs) + 1, named, overhang, chosen_targets(chosen), score)
+
+    def add_design(score, combo):
+        result.designs.append(make_design(score, combo))
+        monitor.design_found(result, result.designs[-1])
+
+    # without scorer and thermo the sets come out of the search in their final order and are shown as soon as they
+    # are found, ranked sets are only known at the end
+    monitor.started(result)
+    search_stats = {}
+
+    def search(junctions):
+        return target_combination(junctions, bad_self_pair_seq, max_sets=candidates, scorer=scorer,
+                                  fixed_overhangs=[donor_downstream, downstream], max_nodes=max_nodes,
+                                  workers=workers, stats=search_stats, monitor=monitor,
+                                  on_solution=add_design if scorer is None and thermo is None else None,
+                                  overhang_length=overhang_length)
+
+    try:
+        if incremental is not None:
+            settings = (candidates, _matrix_identity(fidelity_matrix), donor_downstream, downstream, max_nodes,
+                        profile, thermo.identity() if thermo is not None else None)
+            scored, result.repaired = incremental.search(filtered_overhang, search, settings)
+        else:
+            scored = search(filtered_overhang)
+    except SearchCancelled:
+        raise DesignCancelled('The design was cancelled.\n')
+    finally:
+        if report is not None:
+            report['search'] = dict(search_stats)
+            start = _stage(report, 'target_combination', start)
+    if not scored:
+        if not search_stats.get('exhaustive', True):
+            raise DesignError(f'No suitable overhang combination was found within the node limit ({max_nodes}).\n')
+        raise DesignError('No suitable overhang combination was found for the modules.\n')
+    result.exhaustive = search_stats.get('exhaustive', True)
+    if thermo is not None:
+        # every set with every choice of the end candidates; the first candidates come first with every set, so that
+        # the others are only ranked above a set when they fail fewer checks
+        designs = [make_design(score, combo, end_targets) for end_targets in end_choices for score, combo in scored]
+        for one_design in rank_designs(thermo, designs, max_designs, len(profile.prefix), report):
+            result.designs.append(one_design)
+            monitor.design_found(result, one_design)
+    else:
+        for score, combo in scored[len(result.designs):]:
+            add_design(score, combo)
+    _stage(report, 'primers', start)
+    if report is not None:
+        report['repaired'] = result.repaired
+    # a repaired set depends on the previous design, it is not the design of these inputs alone
+    if cache is not None and not result.repaired:
+        cache.put(key, result)
+    return result
+
+
+# keeps what a design of an array computed so that the next design of the same array, after editing one module or
+# one promoter, only redoes what the edit touched:
+# - the overhang lists of the modules whose processed sequences did not change are reused;
+# - the junctions whose candidate overhangs did not change keep the overhang of the previous best set and only the
+#   changed junctions are searched; only when that has no solution is the whole array searched again.
+# A repaired design is not necessarily the best set of the new inputs (result.repaired is True).
+class IncrementalDesigner:
+    def __init__(self):
+        self.filter_memo = {}
+        self.previous = None
+
+    def design(self, *args, **kwargs):
+        return design(*args, incremental=self, **kwargs)
+
+    def reset(self):
+        self.filter_memo.clear()
+        self.previous = None
+
+    # search(junctions) runs the overhang search, settings is everything else the sets depend on
+    def search(self, junctions, search, settings):
+        previous = self.previous
+        scored = []
+        repaired = False
+        if previous is not None and previous['settings'] == settings and \
+                list(previous['junctions']) == list(junctions):
+            changed = [m for m in junctions if junctions[m] != previous['junctions'][m]]
+            if not changed:
+                scored, repaired = previous['scored'], previous['repaired']
+            else:
+                best = previous['scored'][0][1]
+                scored = search({m: junctions[m] if m in changed else [best[i]]
+                                 for i, m in enumerate(junctions)})
+                repaired = bool(scored)
+        if not scored:
+            scored = search(junctions)
+        if scored:
+            self.previous = {'settings': settings, 'junctions': junctions, 'scored': scored, 'repaired': repaired}
+        return scored, repaired
+
+
+# the max_designs designs whose primers fail the fewest thermodynamic checks, renumbered, with their checks; tail is
+# the length of the enzyme tail of the primers, left out of their Tm
+def rank_designs(thermo, designs, max_designs, tail, report=None):
+    if thermo is None:
+        return designs
+    checks, order = rank_sets(thermo, [[x for pair in one_design.primers for x in (pair.forward, pair.reverse)]
+                                       for one_design in designs], tail)
+    ranked = []
+    for number, i in enumerate(order[:max_designs], 1):
+        designs[i].number = number
+        designs[i].thermo = checks[i]
+        ranked.append(designs[i])
+    if report is not None:
+        report['thermo'] = {'candidates': len(designs), 'passing': sum(1 for x in checks if not x['failed'])}
+    return ranked
+
+
+def _matrix_identity(fidelity_matrix):
+    if fidelity_matrix is None:
+        return None
+    stat = os.stat(fidelity_matrix)
+    return [os.path.abspath(fidelity_matrix), stat.st_size, stat.st_mtime_ns]
+
+
+# adds the time since start to the stage name of report and returns the new start (name None only starts the
+# clock); does nothing without report
+def _stage(report, name, start):
+    if report is None:
+        return None
+    now = time.perf_counter()
+    stages = report.setdefault('stages', {})
+    if name is not None:
+        stages.pop('total', None)
+        stages[name] = stages.get(name, 0.0) + now - start
+        stages['total'] = sum(stages.values())
+    return now
+
+
+# render the report filled by design(report=...)
+def format_report(report):
+    lines = ['Stage times:']
+    for name, seconds in report.get('stages', {}).items():
+        lines.append(f'  {name:28}{seconds * 1000:10.2f} ms')
+    if report.get('cache'):
+        lines.append(f'Design cache: {report["cache"]}')
+    junctions = report.get('junctions', {})
+    if junctions:
+        lines.append('Overhangs per junction (kept / rejected by reason):')
+        for module_position, counts in junctions.items():
+            rejected = ', '.join(f'{reason} {n}' for reason, n in counts.items() if reason != 'kept' and n)
+            lines.append(f'  module {module_position}: kept {counts["kept"]}' + (f'; {rejected}' if rejected else ''))
+    search = report.get('search')
+    if search:
+        lines.append(f'Search: {search.get("explored", 0)} partial combinations explored, '
+                     f'{search.get("pruned", 0)} pruned' +
+                     ('' if search.get('exhaustive', True) else ', stopped at the node limit'))
+    thermo = report.get('thermo')
+    if thermo:
+        lines.append(f'Primer checks: {thermo["passing"]} of {thermo["candidates"]} candidate designs pass')
+    if report.get('repaired'):
+        lines.append('Only the changed junctions were searched (incremental re-design).')
+    return lines
+
+
+# the cache key of a design: everything its result depends on, with the ligation frequency file identified by
+# its path, size and modification time
+def design_key(candidate_target_seq, deal_target_seq, module_name, promoter_order, donor_downstream, downstream,
+               max_designs, fidelity_matrix, max_nodes, enzymes=DEFAULT_ENZYMES, profile=PROFILES[DEFAULT_PROFILE],
+               thermo=None, cross_check=None, overhang_plan=None):
+    return cache_key({'candidate_target_seq': sorted(candidate_target_seq.items()),
+                      'deal_target_seq': sorted(deal_target_seq.items()),
+                      'module_name': module_name,
+                      'promoter_order': promoter_order,
+                      'overhangs': [donor_downstream, downstream],
+                      'bad_self_pair_seq': BAD_SELF_PAIR_SEQ if profile.overhang_length == 4 else [],
+                      'max_designs': max_designs,
+                      'max_nodes': max_nodes,
+                      'fidelity': _matrix_identity(fidelity_matrix),
+                      'enzymes': {x: ENZYMES[x] for x in enzymes},
+                      'profile': list(profile),
+                      'thermo': thermo.identity() if thermo is not None else None,
+                      'cross_check': cross_check.identity() if cross_check is not None else None,
+                      'overhang_plan': overhang_plan})
+
+
+def _layout(result):
+    module_name = result.module_name
+    if result.mode == 'oligo':
+        primer_name_len_max = len(module_name[0]) + 2 + 10
+        width = 30
+    else:
+        primer_name_len_max = len(module_name[-1]) + len(module_name[-2]) + 1 + 7 + 10
+        width = 65
+    with_choice = result.mode == 'multi' or len(result.designs) > 1
+    return primer_name_len_max, width, with_choice
+
+
+# what was designed, result can still be without designs for an array of more than two modules
+def format_summary(result):
+    lines = ['The candidate target sequence for every module is:']
+    candidate_target_seq = result.candidate_target_seq
+    for modulePosition in candidate_target_seq.keys():
+        lines.append('Module\t{}:\t{}'.format(modulePosition, '\t'.join(candidate_target_seq[modulePosition])))
+    lines.append('\n')
+    lines.append('The total amount of module is:\t{}\n'.format(result.module_num))
+    lines.append('The donor and the promoter order is:')
+    lines.append('{}\n\n'.format(' ---> '.join(result.promoter_order_decode)))
+    lines.append('The program is running, finding the suitable overhang combination.\n\n')
+    return lines
+
+
+# the lines shown before the designs: the summary and the header of the primer table
+def format_header(result):
+    lines = format_summary(result)
+    primer_name_len_max, width, with_choice = _layout(result)
+    pad = " " * (primer_name_len_max - len("PrimerName"))
+    header = f'PrimerName{pad}\t{"Forward":{width}}\tLength\tPrimerName{pad}\t{"Reverse":{width}}\tLength\n'
+    if with_choice:
+        header = f'{"Choice":6}\t' + header
+    lines.append(header)
+    return lines
+
+
+def format_design(result, one_design):
+    primer_name_len_max, width, with_choice = _layout(result)
+    lines = []
+    for pair in one_design.primers:
+        name_f, forward, name_r, reverse = pair.forward_name, pair.forward, pair.reverse_name, pair.reverse
+        line = f'{name_f}{" " * (primer_name_len_max - len(name_f))}\t{forward:{width}}\t{len(forward)}\t' \
+               f'{name_r}{" " * (primer_name_len_max - len(name_r))}\t{reverse:{width}}\t{len(reverse)}\n'
+        if with_choice:
+            line = f'{one_design.number:6}\t' + line
+        lines.append(line)
+    if result.multi_candidates:
+        lines.append('Targets:\t{}\n'.format(','.join(one_design.targets)))
+    lines.append('Overhangs:\t{}\n\n'.format(','.join(one_design.overhangs)))
+    if one_design.fidelity is not None:
+        lines[-1] = lines[-1][:-1] + 'Fidelity:\t{:.4f}\n\n'.format(one_design.fidelity)
+    if one_design.thermo is not None:
+        thermo = one_design.thermo
+        lines[-1] = lines[-1][:-1] + 'Tm:\t{:.1f}-{:.1f}\tHairpin dG:\t{:.2f}\t3\' dimer dG:\t{:.2f}\t' \
+            'Failed checks:\t{}\n\n'.format(thermo['tm_min'], thermo['tm_max'], thermo['hairpin_dg'],
+                                            thermo['dimer_dg'], thermo['failed'])
+    return lines
+
+
+def format_footer(result):
+    lines = []
+    if result.repaired:
+        lines.append('Only the junctions changed since the previous design were searched again, the other overhangs '
+                     'were kept.\n\n')
+    if not result.exhaustive:
+        lines.append('The search stopped at its node limit, these are the best overhang sets found before it.\n\n')
+    candidate_target_seq = result.candidate_target_seq
+    if result.mode == 'multi' and result.designs and result.designs[0].thermo is None and \
+            (len(candidate_target_seq[1]) > 1 or len(candidate_target_seq[result.module_num]) > 1):
+        lines.append('The first and the last module have no junction to search, they keep their first usable '
+                     'candidate; check the primers to choose among their candidates.\n\n')
+    if result.mode == 'oligo':
+        lines.append('Annealed oligonucleotide pair for direct introduction of protospacer without PCR.\n\n')
+    lines.append('The program is finished.\n')
+    return lines
+
+
+# render a design result as the lines shown in the output window
+def format_result(result):
+    lines = format_header(result)
+    for one_design in result.designs:
+        lines += format_design(result, one_design)
+    return lines + format_footer(result)
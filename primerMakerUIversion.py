@@ -1,29 +1,233 @@
 # -- coding: utf-8 --
 
-import re
-from functools import reduce
-import random
-import os
 import time
+
+# the startup time is measured from here, see main(['--startup-time'])
+START_TIME = time.perf_counter()
+
+import hashlib
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import threading
 import webbrowser
 
-from PySide2.QtWidgets import QApplication, QMessageBox, QFileDialog, QComboBox
+from PySide2.QtWidgets import QApplication, QMessageBox, QFileDialog, QComboBox, QStyledItemDelegate, \
+    QTableWidgetItem, QAbstractItemView, QWidget
 
-from PySide2.QtUiTools import QUiLoader
 from PySide2.QtGui import QIcon
+from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt, QThread, QTimer, Signal
 
 import PySide2
 
+# the engine tables and the ligation scorer are only built on the first Run; the exporter and the FASTA scanner
+# are imported when first used
+import primerMakerEngine as engine
+from designModel import COLUMNS, pair_row
+from designCache import DesignCache, default_cache_dir
+from ligationFidelity import default_matrix_path
+
 os.environ['QT_MAC_WANTS_LAYER'] = '1'
 PySide2_dir = os.path.dirname(PySide2.__file__)
 plugin_path = os.path.join(PySide2_dir, 'plugins', 'platforms')
 os.environ['QT_QPA_PLATFORM_PLUGIN_PATH'] = plugin_path
 
 
+UI_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'primerMaker.ui')
+# module compiled from UI_FILE with "python primerMakerUIversion.py --compile-ui"
+COMPILED_UI_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'primerMaker_ui.py')
+# first line of a compiled module, with the sha1 of the .ui it was compiled from
+UI_DIGEST_LINE = '# sha1 of the .ui: '
+
+
+def ui_digest(ui_file=UI_FILE):
+    with open(ui_file, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# the sha1 of the .ui a compiled module was made from, None when it does not say
+def compiled_digest(compiled_file):
+    try:
+        with open(compiled_file, 'r', encoding='utf-8') as f:
+            line = f.readline()
+    except OSError:
+        return None
+    return line[len(UI_DIGEST_LINE):].strip() if line.startswith(UI_DIGEST_LINE) else None
+
+
+# compiles ui_file with pyside2-uic (from the PATH or next to this Python) into compiled_file, headed by the sha1 of
+# the .ui; False when it cannot
+def compile_ui(ui_file=UI_FILE, compiled_file=COMPILED_UI_FILE):
+    uic = shutil.which('pyside2-uic') or shutil.which('pyside2-uic', path=os.path.dirname(sys.executable))
+    if uic is None:
+        return False
+    try:
+        os.makedirs(os.path.dirname(compiled_file), exist_ok=True)
+        compiled = subprocess.run([uic, ui_file], check=True, capture_output=True, text=True).stdout
+        with open(compiled_file + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(f'{UI_DIGEST_LINE}{ui_digest(ui_file)}\n{compiled}')
+        os.replace(compiled_file + '.tmp', compiled_file)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+# the form class compiled from ui_file: primerMaker_ui.py when it was compiled from this very .ui (same sha1), else
+# a module compiled into the cache directory and named after the sha1 of the .ui; None when neither can be had
+def compiled_form(ui_file=UI_FILE, compiled_file=COMPILED_UI_FILE):
+    digest = ui_digest(ui_file)
+    path = compiled_file
+    if compiled_digest(compiled_file) != digest:
+        path = os.path.join(default_cache_dir(), 'ui', f'primerMaker_ui_{digest[:16]}.py')
+        if compiled_digest(path) != digest and not compile_ui(ui_file, path):
+            return None
+    try:
+        spec = importlib.util.spec_from_file_location('primerMaker_ui', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.Ui_primerMaker
+    except Exception:
+        # a broken compiled module only costs the fallback
+        return None
+
+
+# the window with its children as attributes, like QUiLoader gives it
+def load_ui(ui_file=UI_FILE):
+    form = compiled_form(ui_file)
+    if form is None:
+        from PySide2.QtUiTools import QUiLoader
+        return QUiLoader().load(ui_file)
+    widget = QWidget()
+    ui = form()
+    ui.setupUi(widget)
+    for name, value in vars(ui).items():
+        setattr(widget, name, value)
+    return widget
+
+
+# the promoter cells are plain items, a combo box is only created while one is edited
+class PromoterDelegate(QStyledItemDelegate):
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(engine.PROMOTERS)
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentText(index.data() or engine.PROMOTERS[0])
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText())
+
+
+SAVE_FILTERS = {'Table (*.tsv)': 'tsv',
+                'Comma separated table (*.csv)': 'csv',
+                'JSON Lines (*.jsonl)': 'jsonl',
+                '96-well plate order (*.tsv)': 'plate96',
+                '384-well plate order (*.tsv)': 'plate384'}
+
+
+# forwards the calls of the engine, made on the worker thread, as queued signals to the window
+class WorkerMonitor(engine.DesignMonitor):
+    def __init__(self, worker):
+        self.worker = worker
+
+    def started(self, result):
+        self.worker.designStarted.emit(result)
+
+    def progress(self, info):
+        self.worker.designProgress.emit(info)
+
+    def design_found(self, result, one_design):
+        self.worker.designFound.emit(result, one_design)
+
+    def cancelled(self):
+        return self.worker.cancel_event.is_set()
+
+
+# the designs of one result, one row per primer pair; the view only asks for the cells it shows
+class DesignTableModel(QAbstractTableModel):
+    def __init__(self):
+        super().__init__()
+        self.result = None
+        self.pairs = []
+
+    # with_designs=False starts with no row, for a result whose designs come one by one through addDesign
+    def setResult(self, result, with_designs=True):
+        self.beginResetModel()
+        self.result = result
+        self.pairs = []
+        if result is not None and with_designs:
+            self.pairs = [(one_design, pair) for one_design in result.designs for pair in one_design.primers]
+        self.endResetModel()
+
+    def addDesign(self, one_design):
+        first = len(self.pairs)
+        self.beginInsertRows(QModelIndex(), first, first + len(one_design.primers) - 1)
+        self.pairs += [(one_design, pair) for pair in one_design.primers]
+        self.endInsertRows()
+
+    def designs(self):
+        last = None
+        for one_design, pair in self.pairs:
+            if one_design is not last:
+                last = one_design
+                yield one_design
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.pairs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return str(pair_row(*self.pairs[index.row()])[index.column()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+
+class DesignWorker(QThread):
+    designStarted = Signal(object)
+    designProgress = Signal(object)
+    designFound = Signal(object, object)
+    designFinished = Signal(object)
+    designFailed = Signal(str)
+    designCancelled = Signal()
+
+    def __init__(self, design, args, kwargs):
+        super().__init__()
+        self.design = design
+        self.args = args
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            result = self.design(*self.args, monitor=WorkerMonitor(self), **self.kwargs)
+        except engine.DesignCancelled:
+            self.designCancelled.emit()
+        except (engine.DesignError, OSError) as e:
+            self.designFailed.emit(str(e))
+        # any other error still ends the run, or the window would wait for it forever
+        except Exception as e:
+            self.designFailed.emit(f'{type(e).__name__}: {e}')
+        else:
+            self.designFinished.emit(result)
+
+
 class PrimerMaker:
     def __init__(self):
         # initialize ui
-        self.ui = QUiLoader().load('primerMaker.ui')
+        self.ui = load_ui()
         self.ui.fileReader.setEnabled(False)
         self.ui.targetSeqInput.setEnabled(True)
         self.ui.promoterInput.setEnabled(False)
@@ -37,40 +241,7 @@ class PrimerMaker:
 
         # define initial data
         self.donorType = 'pGN1101'
-        self.downstream_overhang = 'GTTT'
-
         self.ifDefaultOrder = 'y'
-        self.seq_decode = {'1': 'AGCCAAGCCAGCAC',
-                           '2': 'ACAAGCGGCAGCGC',
-                           '3': 'GCCTCAGCGCAGCAG',
-                           '4': 'ACGGATCATCTGCACAA',
-                            5 : ['ggctacGGTCTCt', 'GTTTCAGAGCTAGAAATAGCAAGTT',
-                                 'ggctacGGTCTCt{}'.format(self.get_reverse_complement(self.downstream_overhang))]
-                           }
-        self.promoter_encode = {'m6a': '1',
-                                'm6b': '2',
-                                'm6c': '3',
-                                'm3': '4',
-                                'pGN1101': '5',
-                                'pGN1102': '6',
-                                'pGN1103': '7',
-                                'pGN1104': '8',
-                                'custom_donor': '9'
-                                }
-        self.promoter_decode = dict(zip(self.promoter_encode.values(), self.promoter_encode.keys()))
-        self.promoter_downstream = {'1': 'GCCG',
-                                    '2': 'GTTG',
-                                    '3': 'TCAG',
-                                    '4': 'GGCA',
-                                    '5': 'GCCG',
-                                    '6': 'GGCA',
-                                    '7': 'TCAG',
-                                    '8': 'GGCA'
-                                    }
-        # bad_self_pair_seq = ['AGGG', 'CCCT', 'TAAA', 'TTTA', 'TTGA', 'TCAA', 'CCCC', 'GGGG', 'CGCC', 'GGCG']
-        self.bad_self_pair_seq = ['GTTT', 'GTGT', 'GCGT', 'GTCT', 'TGCT', 'GGCT', 'AGGG', 'CCCT', 'TAAA', 'TTTA',
-                                  'TTGA', 'TCAA', 'TCGG', 'GTCA', 'GACA', 'TGCG', 'CTTG', 'CGTG', 'CGAG', 'CCCC',
-                                  'GGGG', 'CGCC', 'GGCG', 'GGAC']
 
         # input choice
         self.input_source = 'n'
@@ -86,6 +257,9 @@ class PrimerMaker:
 
         # table actions
         self.ui.promoterInput.setRowCount(0)
+        self.promoterDelegate = PromoterDelegate(self.ui.promoterInput)
+        self.ui.promoterInput.setItemDelegateForColumn(0, self.promoterDelegate)
+        self.ui.promoterInput.setEditTriggers(QAbstractItemView.AllEditTriggers)
         self.ui.addPromoter.clicked.connect(self.tableAdd)
         self.ui.dropPromoter.clicked.connect(self.tableDrop)
         self.ui.clearPromoter.clicked.connect(self.tableClear)
@@ -94,15 +268,32 @@ class PrimerMaker:
         self.ui.donorGroup.buttonClicked.connect(self.donorGroupSelect)
         self.ui.promoterOrderGroup.buttonClicked.connect(self.promoterOrderGroupSelect)
 
-        # run the program
+        # run the program, the run button cancels a running design
+        self.worker = None
+        self.cache = DesignCache(default_cache_dir())
+        # editing one module or promoter between two runs only searches the junctions it touches again
+        self.designer = engine.IncrementalDesigner()
         self.ui.runButton.clicked.connect(self.mainProgram)
 
+        # designs
+        self.designModel = DesignTableModel()
+        self.ui.designTable.setModel(self.designModel)
+
+        # stage times, overhangs kept and rejected per junction and search counters of the last run
+        self.report = {}
+        self.ui.reportPanel.setVisible(False)
+        self.ui.reportToggle.toggled.connect(self.reportToggled)
+
         # save result
         self.ui.saveButton.clicked.connect(self.saveMotion)
 
         # help
         self.ui.helpButton.clicked.connect(self.helpConnect)
 
+    def reportToggled(self, checked):
+        self.ui.reportPanel.setVisible(checked)
+        self.ui.reportToggle.setArrowType(Qt.DownArrow if checked else Qt.RightArrow)
+
     def inputBoxClear(self):
         self.ui.targetSeqInput.clear()
         self.ui.targetSeqInput.repaint()
@@ -110,9 +301,7 @@ class PrimerMaker:
     def tableAdd(self):
         currentRow = self.ui.promoterInput.currentRow()
         self.ui.promoterInput.insertRow(currentRow + 1)
-        promoter_comboBox = QComboBox()
-        promoter_comboBox.addItems(['m6a', 'm6b', 'm6c', 'm3'])
-        self.ui.promoterInput.setCellWidget(currentRow + 1, 0, promoter_comboBox)
+        self.ui.promoterInput.setItem(currentRow + 1, 0, QTableWidgetItem(engine.PROMOTERS[0]))
         self.ui.promoterInput.repaint()
         self.ui.promoterInput.repaint()
 
@@ -171,19 +360,20 @@ class PrimerMaker:
 
     def saveMotion(self):
         file_name = f'primers_{time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime())}.tsv'
-        fileName, _ = QFileDialog.getSaveFileName(self.ui,
-                                                  'Save as ...',
-                                                  f'{self.workPath}/{file_name}'
-                                                  )
+        fileName, fileFilter = QFileDialog.getSaveFileName(self.ui,
+                                                           'Save as ...',
+                                                           f'{self.workPath}/{file_name}',
+                                                           ';;'.join(SAVE_FILTERS)
+                                                           )
 
-        if fileName == '':
+        if fileName == '' or self.designModel.result is None:
             return
             # fileName = f'{self.workPath}/{file_name}'
-        f = open(fileName, 'w')
-        result = self.ui.outputwindow.toPlainText()
-        result = re.sub(' *\t', '\t', result)
-        f.write(result)
-        f.close()
+        from designExport import open_exporter
+
+        with open_exporter(fileName, SAVE_FILTERS.get(fileFilter)) as exporter:
+            for one_design in self.designModel.designs():
+                exporter.write_design(self.designModel.result, one_design)
         QMessageBox.information(
             self.ui,
             'Note',
@@ -195,458 +385,122 @@ class PrimerMaker:
         workPath = os.getcwd()
         webbrowser.open(f'file://{workPath}/HelpDocument.html')
 
-    @staticmethod
-    def get_candidate_target_seq_from_file(filename):
-        f = open(filename, 'r')
-        candidate_target_seq = {}
-        module_num = 0
-        module_name = []
-        for line in f:
-            module_num += 1
-            line = line.replace('\n', '')
-            record = line.split('\t')
-            # print(record)
-            if len(record) == 1:
-                candidate_target_seq[module_num] = record
-                module_name.append(str(module_num))
-            if len(record) == 2:
-                candidate_target_seq[module_num] = [record[1]]
-                module_name.append(record[0])
-
-        f.close()
-        return candidate_target_seq, module_num, module_name
-
-    @staticmethod
-    def get_promoter_order(module_num, if_default, donor, promoter_encode, promoter_order_temp):
-        default_order = {0: '',
-                         1: '1',
-                         2: '12',
-                         3: '123',
-                         4: '1234',
-                         5: '11234',
-                         6: '112234',
-                         7: '1122334',
-                         8: '11223344'
-                         }
-
-        promoter_order = promoter_encode[donor]
-        if if_default == 'y':
-            if module_num - 1 <= 8:
-                promoter_order += default_order[module_num - 1]
-            else:
-                for i in range(module_num - 1):
-                    promoter_order += default_order[8][i % 8]
-            return list(promoter_order)
-        else:
-            promoter_order += promoter_order_temp
-            return list(promoter_order)
-
-    # cut candidate target sequence according to the promoter downstream and get overhang produced sequence
-    @staticmethod
-    def deal_candidate_target_seq(promoter_order, candidate_target_seq, promoter_downstream, module_num):
-        deal_target_seq = {}
-        for promoter_position in range(len(promoter_order)):
-            module_position = promoter_position + 1
-            seq_deal = []
-            for target_seq in candidate_target_seq[module_position]:
-                if target_seq[0] == promoter_downstream[promoter_order[promoter_position]][-1]:
-                    if module_position == module_num:
-                        seq_deal.append(promoter_downstream[promoter_order[promoter_position]] + target_seq[1:])
-                    else:
-                        seq_deal.append(promoter_downstream[promoter_order[promoter_position]] + target_seq[1:])
-                else:
-                    if module_position == module_num:
-                        seq_deal.append(promoter_downstream[promoter_order[promoter_position]] + target_seq)
-                    else:
-                        seq_deal.append(promoter_downstream[promoter_order[promoter_position]] + target_seq)
-            deal_target_seq[module_position] = seq_deal
-        return deal_target_seq
-
-    @classmethod
-    def hammingDistance(cls, x, y):
-        same_counts = 0
-        for i in range(len(x)):
-            if x[i].upper() == y[i].upper():
-                same_counts += 1
-        return same_counts
-
-    @classmethod
-    def filter_targets(cls, deal_target_seq, module_num, promoter_order, promoter_downstream, bad_self_pair_seq, self):
-        filtered_target = {}
-        for module_position in deal_target_seq.keys():
-            filtered_overhang = {}
-            for target in range(len(deal_target_seq[module_position])):
-                if re.search('ggtctc', deal_target_seq[module_position][target], re.I):
-                    QMessageBox.critical(
-                        self.ui,
-                        'Error',
-                        f'BsaI site was present within the candidate target {deal_target_seq[module_position][target]} of '
-                        f'module {module_position}\n'
-                        )
-
-                    return
-                if module_position != 1 and module_position != module_num:
-                    filtered_overhang[target] = []
-                    for i in range(len(deal_target_seq[module_position][target])):
-                        if i + 4 <= len(deal_target_seq[module_position][target]):
-                            overhang = deal_target_seq[module_position][target][i: i + 4]
-                            reverse_overhang = cls.get_reverse_complement(overhang)
-                            if overhang != reverse_overhang and \
-                                    cls.hammingDistance(overhang, self.downstream_overhang) < 3 and \
-                                    cls.hammingDistance(reverse_overhang, self.downstream_overhang) < 3 and \
-                                    cls.hammingDistance(overhang, promoter_downstream[promoter_order[0]]) < 3 and \
-                                    cls.hammingDistance(reverse_overhang,
-                                                        promoter_downstream[promoter_order[0]]) < 3 and \
-                                    overhang not in bad_self_pair_seq:
-                                filtered_overhang[target].append((overhang, i))
-
-            filtered_target[module_position] = filtered_overhang
-        return filtered_target
-
-    @classmethod
-    def target_combination(cls, filtered_target):
-        filtered_target_list = [x for x in filtered_target.values()]
-
-        # print(type(filtered_target_list))
-        def myfunc(list1, list2):
-            res = []
-            for i in list1:
-                # res = []
-                if type(i) == tuple:
-                    for j in list2:
-                        if cls.hammingDistance(i[0], j[0]) < 3 and cls.hammingDistance(cls.get_reverse_complement(i[0]),
-                                                                                       j[0]) < 3:
-                            res.append([i, j])
-                else:
-                    for j in list2:
-                        condition = 0
-                        for k in i:
-                            if cls.hammingDistance(k[0], j[0]) >= 3 or cls.hammingDistance(
-                                    cls.get_reverse_complement(k[0]),
-                                    j[0]) >= 3:
-                                condition += 1
-                            else:
-                                continue
-                            # if condition == False:
-                            #     break
-                        if condition == 0:
-                            temp = [x for x in i]
-                            temp.append(j)
-                            res.append(temp)
-                        else:
-                            continue
-            return random.sample(res, 10)
-            # return [i + sep + j for i in list1 for j in list2]
-
-        target_combo = reduce(myfunc, filtered_target_list)
-        return target_combo
-
-    # TODO the case of multi targets for each module is not concerned
-
-    @classmethod
-    def get_suitable_targets(cls, target_combo):
-        suitable_targets = []
-        conflict = []
-        for targets in target_combo:
-            is_suitable = True
-            target_list = targets.split(',')
-            for i in range(len(target_list)):
-                for j in range(i + 1, len(target_list)):
-                    if cls.hammingDistance(target_list[i][0:4], target_list[j][0:4]) < 3:
-                        is_suitable = True
-                    else:
-                        is_suitable = False
-                        record = (i, j)
-                        conflict.append(record)
-                    if not is_suitable:
-                        break
-                if not is_suitable:
-                    break
-            if is_suitable:
-                suitable_targets.append(targets)
-        return suitable_targets, conflict
-
-    @classmethod
-    def get_reverse_complement(cls, sequence):
-        sequence = list(sequence.upper())
-        sequence.reverse()
-        temp = []
-        for i in sequence:
-            if i == 'A':
-                temp.append('T')
-            elif i == 'T':
-                temp.append('A')
-            elif i == 'C':
-                temp.append('G')
-            elif i == 'G':
-                temp.append('C')
-        sequence = ''.join(temp)
-        return sequence
-
-    @classmethod
-    def primerMakerForOneTarget(cls, target_combo, promoter_order, seq_decode, deal_target_seq):
-        primer_list = []
-        for filtered_overhang in target_combo:
-            primers = []
-            for promoter_position in range(len(promoter_order)):
-                module_position = promoter_position + 1
-                overhang_position = module_position - 2
-                if module_position == 1:
-                    upstream = seq_decode[5][0] + deal_target_seq[module_position][0] + seq_decode[5][1]
-                    downstream = seq_decode[5][0] + cls.get_reverse_complement(
-                        deal_target_seq[module_position + 1][0][:filtered_overhang[overhang_position + 1][1] + 4]) + \
-                                 seq_decode[promoter_order[module_position]]
-                    primer_pair = [upstream, downstream]
-                    primers.append(primer_pair)
-                elif 1 < module_position < len(promoter_order) - 1:
-                    upstream = seq_decode[5][0] + deal_target_seq[module_position][0][
-                                                  filtered_overhang[overhang_position][1]:] + seq_decode[5][1]
-                    downstream = seq_decode[5][0] + cls.get_reverse_complement(
-                        deal_target_seq[module_position + 1][0][:filtered_overhang[overhang_position + 1][1] + 4]) + \
-                                 seq_decode[promoter_order[module_position]]
-                    primer_pair = [upstream, downstream]
-                    primers.append(primer_pair)
-                elif module_position == len(promoter_order) - 1:
-                    upstream = seq_decode[5][0] + deal_target_seq[module_position][0][
-                                                  filtered_overhang[overhang_position][1]:] + seq_decode[5][1]
-                    downstream = seq_decode[5][2] + cls.get_reverse_complement(
-                        deal_target_seq[module_position + 1][0]) + \
-                                 seq_decode[promoter_order[module_position]]
-                    primer_pair = [upstream, downstream]
-                    primers.append(primer_pair)
-            primer_list.append(primers)
-        return primer_list
-
-    @staticmethod
-    def is_DNA_seq(seq):
-        define = []
-        DNA_seq = ['A', 'T', 'C', 'G']
-        for bp in seq:
-            if bp in DNA_seq:
-                define.append(True)
-            else:
-                define.append(False)
-        return all(define)
-
-
     def mainProgram(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.ui.runButton.setEnabled(False)
+            self.ui.progressLabel.setText('Cancelling ...')
+            return
         self.ui.outputwindow.clear()
-        self.ui.outputwindow.repaint()
-        ############################
-        # Confirm the custom donor #
-        ############################
+        self.ui.reportPanel.clear()
+        self.designModel.setResult(None)
+
+        upstream_overhang = ''
+        downstream_overhang = ''
         if self.donorType == 'custom_donor':
-            upstream_overhang = self.ui.upstream_overhang.text().upper()
-            reverse_upstream_overhang = self.get_reverse_complement(upstream_overhang)
-            downstream_overhang = self.ui.downstream_overhang.text().upper()
-            if len(downstream_overhang) == 0:
-                downstream_overhang = self.downstream_overhang
-            if self.is_DNA_seq(upstream_overhang) is False or self.is_DNA_seq(downstream_overhang) is False:
-                QMessageBox.critical(
-                    self.ui,
-                    'Error',
-                    'The user-defined donors must be in correct format.(A string of length 4 containing '
-                    'only four elements of A,T,C and G)')
-                return
-            elif len(upstream_overhang) != 4 or len(downstream_overhang) != 4:
-                QMessageBox.critical(
-                    self.ui,
-                    'Error',
-                    'The user-defined donors must be in correct format.(A string of length 4 containing '
-                    'only four elements of A,T,C and G)')
-                return
-            elif self.hammingDistance(upstream_overhang, downstream_overhang) >= 3 or \
-                 self.hammingDistance(reverse_upstream_overhang, downstream_overhang) >= 3:
-                QMessageBox.critical(
-                    self.ui,
-                    'Error',
-                    'The upstream overhang and downstream overhangs of user-defined donors are homologous '
-                    'or complementary, causing error-prone assembly.')
-                return
-            else:
-                self.downstream_overhang = downstream_overhang
-                self.promoter_downstream[self.promoter_encode[self.donorType]] = upstream_overhang
-
-        #############################################
-        # Obtain module order and candidate targets #
-        #############################################
-        if self.input_source == 'y':
-            candidate_target_seq, module_num, module_name = self.get_candidate_target_seq_from_file(self.filePath)
-        else:
-            input_from_targetSeqInput = self.ui.targetSeqInput.toPlainText()
-            candidate_target_seq = {}
-            module_num = len(input_from_targetSeqInput.splitlines())
-            promoter_num = module_num
-            module_name = []
-            for i in range(1, promoter_num + 1):
-                if len(input_from_targetSeqInput.splitlines()[i - 1].split('\t')) == 1:
-                    candidate_target_seq[i] = input_from_targetSeqInput.splitlines()[i - 1].split('\t')
-                    module_name.append(str(i))
-                if len(input_from_targetSeqInput.splitlines()[i - 1].split('\t')) == 2:
-                    candidate_target_seq[i] = [input_from_targetSeqInput.splitlines()[i - 1].split('\t')[1]]
-                    module_name.append(input_from_targetSeqInput.splitlines()[i - 1].split('\t')[0])
-
-        promoter_order_temp = ''
+            upstream_overhang = self.ui.upstream_overhang.text()
+            downstream_overhang = self.ui.downstream_overhang.text()
+
+        promoter_order = None
         if self.ifDefaultOrder == 'n':
-            tableRowNum = self.ui.promoterInput.rowCount()
-            if tableRowNum != module_num - 1:
-                QMessageBox.critical(
-                    self.ui,
-                    'Error',
-                    f'Please input the correct amount of modules ！\n with your input data should be {module_num - 1}')
-                return
+            promoter_order = [self.ui.promoterInput.item(i, 0).text()
+                              for i in range(self.ui.promoterInput.rowCount())]
+
+        from protospacerScanner import fasta_candidates, is_fasta
+
+        try:
+            if self.input_source == 'y' and is_fasta(self.filePath):
+                candidate_target_seq, module_num, module_name = fasta_candidates(self.filePath)
+            elif self.input_source == 'y':
+                candidate_target_seq, module_num, module_name = \
+                    engine.get_candidate_target_seq_from_file(self.filePath)
             else:
-                for i in range(tableRowNum):
-                    rowContent = self.ui.promoterInput.cellWidget(i, 0).currentText()
-                    promoter_order_temp += self.promoter_encode[rowContent.lower()]
-        promoter_order = self.get_promoter_order(module_num, self.ifDefaultOrder, self.donorType, self.promoter_encode,
-                                                 promoter_order_temp)
-
-        #########################################################################
-        # Output the sequence that user input and the information of the module #
-        #########################################################################
-        self.ui.outputwindow.append('The candidate target sequence for every module is:')
-        for modulePosition in candidate_target_seq.keys():
-            self.ui.outputwindow.append(
-                'Module\t{}:\t{}'.format(modulePosition, '\t'.join(candidate_target_seq[modulePosition])))
-        self.ui.outputwindow.append('\n')
-
-        self.ui.outputwindow.append('The total amount of module is:\t{}\n'.format(module_num))
-
-        self.ui.outputwindow.append('The donor and the promoter order is:')
-        promoterOrderDecode = [self.promoter_decode[x] for x in promoter_order]
-        self.ui.outputwindow.append('{}\n\n'.format(' ---> '.join(promoterOrderDecode)))
-
-        # self.ui.outputwindow.append(f'{input_from_targetSeqInput}')
-        self.ui.outputwindow.repaint()
-
-        #####################################################
-        # Determine the target length based on the promoter #
-        #####################################################
-        deal_target_seq = self.deal_candidate_target_seq(promoter_order, candidate_target_seq, self.promoter_downstream,
-                                                         module_num)
-        # print(f'deal_target_seq:\n{deal_target_seq}\n')
-
-        filtered_target = self.filter_targets(deal_target_seq, module_num, promoter_order, self.promoter_downstream,
-                                              self.bad_self_pair_seq, self)
-        # print(f'filtered_target:\n{filtered_target}\n')
-
-        only1target = 0
-        for value in deal_target_seq.values():
-            if len(value) != 1:
-                only1target += 1
-        if only1target == 0:
-            filtered_overhang = {}
-            for module_position in filtered_target.keys():
-                if module_position != 1 and module_position != module_num:
-                    filtered_overhang[module_position] = filtered_target[module_position][0]
-        else:
-            QMessageBox.critical(
-                self.ui,
-                'Error',
-                'Only support one target sequence for each module.\n')
+                candidate_target_seq, module_num, module_name = \
+                    engine.parse_target_lines(self.ui.targetSeqInput.toPlainText().splitlines())
+        except (engine.DesignError, OSError) as e:
+            QMessageBox.critical(self.ui, 'Error', str(e))
             return
 
-        # print(f'filtered_overhang:\n{filtered_overhang}\n')
-
-        # print(f'promoter_order:\n{promoter_order}\n')
-
-        self.ui.outputwindow.append('The program is running, finding the suitable overhang combination.\n\n')
-
-        if module_num == 1:
-            ops1 = deal_target_seq[1][0]
-            ps1 = ops1[4:]
-            primer_list = [ops1, 'AAAC' + self.get_reverse_complement(ps1)]
-            primer_name_len_max = len(module_name[0]) + 2 + 10
-            self.ui.outputwindow.append(f'PrimerName{" " * (primer_name_len_max - 10)}\t{"Forward":30}\tLength\tPrimerName{" " * (primer_name_len_max - 10)}\t{"Reverse":30}\tLength\n')
-            self.ui.outputwindow.append(f'{module_name[0]}_f{" " * (primer_name_len_max - len(module_name[0]) - 2)}\t{primer_list[0]:30}\t{len(primer_list[0])}\t{module_name[0]}_r{" " * (primer_name_len_max - len(module_name[0]) - 2)}\t{primer_list[1]:30}\t{len(primer_list[0])}\n')
-            donor_downstream = [self.promoter_downstream[self.promoter_encode[self.donorType]]]
-            overhang = donor_downstream + [self.downstream_overhang]
-            self.ui.outputwindow.append('Overhangs:\t{}\n\n'.format(','.join(overhang)))
-            self.ui.outputwindow.append('Annealed oligonucleotide pair for direct introduction of protospacer without PCR.\n\n')
-            self.ui.outputwindow.repaint()
-
-        elif module_num == 2:
-            ops1 = deal_target_seq[1][0]
-            primer_name_len_max = len(module_name[-1]) + len(module_name[-2]) + 1 + 7 + 10
-            upstream = self.seq_decode[5][0] + ops1 + self.seq_decode[5][1]
-            downstream = self.seq_decode[5][2] + self.get_reverse_complement(deal_target_seq[2][0]) + \
-                         self.seq_decode[promoter_order[1]]
-            self.ui.outputwindow.append(f'PrimerName{" " * (primer_name_len_max - 10)}\t{"Forward":65}\tLength\tPrimerName{" " * (primer_name_len_max - 10)}\t{"Reverse":65}\tLength\n')
-            self.ui.outputwindow.append(f'{module_name[0]}&{module_name[1]}_{promoterOrderDecode[1]}_f{" " * 10}\t{upstream:65}\t{len(upstream)}\t{module_name[0]}&{module_name[1]}_{promoterOrderDecode[1]}_r{" " * 10}\t{downstream:65}\t{len(downstream)}\n')
-            donor_downstream = [self.promoter_downstream[self.promoter_encode[self.donorType]]]
-            overhang = donor_downstream + [self.downstream_overhang]
-            self.ui.outputwindow.append('Overhangs:\t{}\n\n'.format(','.join(overhang)))
-            self.ui.outputwindow.repaint()
-
-        elif module_num == 3:
-            target_combo = self.target_combination(filtered_overhang)
-            # print(f'target_combo:\n{target_combo}\n')
-            target_combo = [[x] for x in target_combo][:5]
-            primer_list = self.primerMakerForOneTarget(target_combo, promoter_order, self.seq_decode, deal_target_seq)
-
-            num = 0
-            primer_name_len_max = len(module_name[-1]) + len(module_name[-2]) + 1 + 7 + 10
-            self.ui.outputwindow.append(f'{"Choice":6}\tPrimerName{" " * (primer_name_len_max - len("PrimerName"))}\t{"Forward":65}\tLength\tPrimerName{" " * (primer_name_len_max - len("PrimerName"))}\t{"Reverse":65}\tLength\n')
-            for primers in primer_list:
-                num += 1
-                # print(type(primers))
-                for i in range(len(primers)):
-                    if i != len(primers) - 1:
-                        primer_name = f'{module_name[i]}_{promoterOrderDecode[i + 1]}'
-                        self.ui.outputwindow.append(f'{num:6}\t{primer_name}_f{" " * (primer_name_len_max - len(primer_name) - 2)}\t{primers[i][0]:65}\t{len(primers[i][0])}\t{primer_name}_r{" " * (primer_name_len_max - len(primer_name) - 2)}\t{primers[i][1]:65}\t{len(primers[i][1])}\n')
-                        # self.ui.outputwindow.append('{:6}\t{:6}\t{:65}\t{}\n'.format(num, i + 1, primers[i][0], primers[i][1]))
-                    else:
-                        primer_name = f'{module_name[i]}&{module_name[i + 1]}_{promoterOrderDecode[i + 1]}'
-                        self.ui.outputwindow.append(f'{num:6}\t{primer_name}_f{" " * (primer_name_len_max - len(primer_name) - 2)}\t{primers[i][0]:65}\t{len(primers[i][0])}\t{primer_name}_r{" " * (primer_name_len_max - len(primer_name) - 2)}\t{primers[i][1]:65}\t{len(primers[i][1])}\n')
-                donor_downstream = [self.promoter_downstream[self.promoter_encode[self.donorType]]]
-                overhang_info = target_combo[num - 1]
-                overhang = donor_downstream + [seq for seq, site in overhang_info] + [self.downstream_overhang]
-                self.ui.outputwindow.append('Overhangs:\t{}\n\n'.format(','.join(overhang)))
-            # print(f'primer_list:\n{primer_list}\n')
-
-
-        elif module_num > 3:
-            target_combo = self.target_combination(filtered_overhang)
-            # print(target_combo)
-
-            target_combo = target_combo[:5]
-            primer_list = self.primerMakerForOneTarget(target_combo, promoter_order, self.seq_decode, deal_target_seq)
-
-            num = 0
-            primer_name_len_max = len(module_name[-1]) + len(module_name[-2]) + 1 + 7 + 10
-            self.ui.outputwindow.append(
-                f'{"Choice":6}\tPrimerName{" " * (primer_name_len_max - len("PrimerName"))}\t{"Forward":65}\tLength\tPrimerName{" " * (primer_name_len_max - len("PrimerName"))}\t{"Reverse":65}\tLength\n')
-            # self.ui.outputwindow.append(f'{"Choice":6}\t{"Primer":6}\t{"forward":65}\treverse\n')
-            for primers in primer_list:
-                num += 1
-                # print(type(primers))
-                for i in range(len(primers)):
-                    if i != len(primers) - 1:
-                        primer_name = f'{module_name[i]}_{promoterOrderDecode[i + 1]}'
-                        self.ui.outputwindow.append(f'{num:6}\t{primer_name}_f{" " * (primer_name_len_max - len(primer_name) - 2)}\t{primers[i][0]:65}\t{len(primers[i][0])}\t{primer_name}_r{" " * (primer_name_len_max - len(primer_name) - 2)}\t{primers[i][1]:65}\t{len(primers[i][1])}\n')
-                        # self.ui.outputwindow.append('{:6}\t{:6}\t{:65}\t{}\n'.format(num, i + 1, primers[i][0], primers[i][1]))
-                    else:
-                        primer_name = f'{module_name[i]}&{module_name[i + 1]}_{promoterOrderDecode[i + 1]}'
-                        self.ui.outputwindow.append(f'{num:6}\t{primer_name}_f{" " * (primer_name_len_max - len(primer_name) - 2)}\t{primers[i][0]:65}\t{len(primers[i][0])}\t{primer_name}_r{" " * (primer_name_len_max - len(primer_name) - 2)}\t{primers[i][1]:65}\t{len(primers[i][1])}\n')
-                donor_downstream = [self.promoter_downstream[self.promoter_encode[self.donorType]]]
-                overhang_info = target_combo[num - 1]
-                overhang = donor_downstream + [seq for seq, site in overhang_info] + [self.downstream_overhang]
-                self.ui.outputwindow.append('Overhangs:\t{}\n\n'.format(','.join(overhang)))
-
-        self.ui.outputwindow.append(f'The program is finished.\n')
-        self.ui.outputwindow.repaint()
-
-
-
-
-def main():
+        self.report = {}
+        self.worker = DesignWorker(self.designer.design,
+                                   (candidate_target_seq, module_name, self.donorType, promoter_order,
+                                    upstream_overhang, downstream_overhang),
+                                   {'fidelity_matrix': default_matrix_path(), 'cache': self.cache,
+                                    'report': self.report})
+        self.worker.designStarted.connect(self.designStarted)
+        self.worker.designProgress.connect(self.designProgress)
+        self.worker.designFound.connect(self.designFound)
+        self.worker.designFinished.connect(self.designFinished)
+        self.worker.designFailed.connect(self.designFailed)
+        self.worker.designCancelled.connect(self.designCancelled)
+        self.ui.runButton.setText('Cancel')
+        self.ui.saveButton.setEnabled(False)
+        self.ui.progressLabel.setText('Starting ...')
+        self.worker.start()
+
+    def designStarted(self, result):
+        for line in engine.format_summary(result):
+            self.ui.outputwindow.append(line)
+        # the designs are added as they arrive, result.designs is still being filled by the worker
+        self.designModel.setResult(result, with_designs=False)
+
+    def designProgress(self, info):
+        if info['stage'] == 'filter':
+            self.ui.progressLabel.setText('Filtering the candidate overhangs ...')
+        else:
+            self.ui.progressLabel.setText(f'Searching: {info["evaluated"]} evaluated, {info["found"]} found')
+
+    def designFound(self, result, one_design):
+        self.designModel.addDesign(one_design)
+
+    def designFinished(self, result):
+        for line in engine.format_footer(result):
+            self.ui.outputwindow.append(line)
+        self.designDone('')
+
+    def designFailed(self, message):
+        self.designDone('')
+        QMessageBox.critical(self.ui, 'Error', message)
+
+    def designCancelled(self):
+        self.ui.outputwindow.append('The design was cancelled.\n')
+        self.designDone('Cancelled')
+
+    def designDone(self, status):
+        self.worker.wait()
+        self.ui.reportPanel.setPlainText('\n'.join(engine.format_report(self.report)))
+        self.worker = None
+        self.ui.runButton.setText('Run')
+        self.ui.runButton.setEnabled(True)
+        self.ui.saveButton.setEnabled(True)
+        self.ui.progressLabel.setText(status)
+
+
+# seconds from the start of this module to the window shown, on the lab machines
+STARTUP_TARGET = 1.0
+
+
+# "--startup-time" shows the window, prints how long it took and quits; "--compile-ui" writes primerMaker_ui.py
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if '--compile-ui' in argv:
+        if not compile_ui():
+            print('pyside2-uic is needed to compile primerMaker.ui', file=sys.stderr)
+            return 1
+        print(f'{COMPILED_UI_FILE} written')
+        return 0
     app = QApplication([])
     app.setWindowIcon(QIcon('5Goligo.png'))
     primerMaker = PrimerMaker()
     primerMaker.ui.show()
-    app.exec_()
+    if '--startup-time' in argv:
+        def startup_time():
+            elapsed = time.perf_counter() - START_TIME
+            print(f'startup: {elapsed:.3f} s (target {STARTUP_TARGET:.1f} s)')
+            app.quit()
+        QTimer.singleShot(0, startup_time)
+    return app.exec_()
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
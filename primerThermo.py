@@ -0,0 +1,198 @@
+# -- coding: utf-8 --
+
+# Primer thermodynamics: nearest-neighbour melting temperature (SantaLucia
+# 1998 unified parameters), the most stable hairpin of a primer and the most
+# stable duplex the 3' end of a primer can form with another primer (or
+# itself).
+#
+# A PrimerChecker scores many primers at once: the stacking sums of every
+# primer are memoised (the same flanks and promoter ends come back in every
+# candidate set), the Tm of a batch is array arithmetic over the encoded
+# primers when NumPy is installed, and a set of primers fails a check when one
+# primer is outside the Tm range, has a hairpin below hairpin_dg or a 3' dimer
+# below dimer_dg (kcal/mol at 37 C).
+
+import math
+
+import overhangTables
+
+# (dH kcal/mol, dS cal/K/mol) of the stack of the two bases, 5' to 3' on one strand
+NN = {'AA': (-7.9, -22.2), 'TT': (-7.9, -22.2),
+      'AT': (-7.2, -20.4),
+      'TA': (-7.2, -21.3),
+      'CA': (-8.5, -22.7), 'TG': (-8.5, -22.7),
+      'GT': (-8.4, -22.4), 'AC': (-8.4, -22.4),
+      'CT': (-7.8, -21.0), 'AG': (-7.8, -21.0),
+      'GA': (-8.2, -22.2), 'TC': (-8.2, -22.2),
+      'CG': (-10.6, -27.2),
+      'GC': (-9.8, -24.4),
+      'GG': (-8.0, -19.9), 'CC': (-8.0, -19.9)}
+# duplex initiation, per terminal base pair
+INIT = {'G': (0.1, -2.8), 'C': (0.1, -2.8), 'A': (2.3, 4.1), 'T': (2.3, 4.1)}
+# dG (kcal/mol, 37 C) of a hairpin loop of n bases, longer loops are extrapolated
+HAIRPIN_LOOP = {3: 5.4, 4: 5.6, 5: 5.7, 6: 5.4, 7: 6.0, 8: 6.1, 9: 6.2}
+MIN_LOOP = 3
+R = 1.987
+T37 = 310.15
+
+# primers not seen yet from which the Tm of a batch is computed with NumPy
+NUMPY_MIN_PRIMERS = 256
+
+DEFAULT_OLIGO_CONC = 250e-9
+DEFAULT_NA_CONC = 0.05
+DEFAULT_TM_MIN = 55.0
+DEFAULT_TM_MAX = 80.0
+DEFAULT_HAIRPIN_DG = -6.0
+DEFAULT_DIMER_DG = -7.0
+
+_COMPLEMENT = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A'}
+_TRANSLATE = str.maketrans('ACGT', 'TGCA')
+_NN_INDEX = {a + b: 4 * overhangTables.BASE_CODE[a] + overhangTables.BASE_CODE[b] for a in 'ACGT' for b in 'ACGT'}
+
+
+def _dg(dh, ds):
+    return dh - T37 * ds / 1000
+
+
+def _loop_dg(n):
+    if n in HAIRPIN_LOOP:
+        return HAIRPIN_LOOP[n]
+    return HAIRPIN_LOOP[9] + 1.75 * R * T37 / 1000 * math.log(n / 9)
+
+
+class PrimerChecker:
+    def __init__(self, tm_min=DEFAULT_TM_MIN, tm_max=DEFAULT_TM_MAX, hairpin_dg=DEFAULT_HAIRPIN_DG,
+                 dimer_dg=DEFAULT_DIMER_DG, oligo_conc=DEFAULT_OLIGO_CONC, na_conc=DEFAULT_NA_CONC):
+        self.tm_min = tm_min
+        self.tm_max = tm_max
+        self.hairpin_dg = hairpin_dg
+        self.dimer_dg = dimer_dg
+        self.oligo_conc = oligo_conc
+        self.na_conc = na_conc
+        self._stacks = {}
+        self._hairpins = {}
+        self._dimers = {}
+
+    # settings the scores depend on, for cache keys
+    def identity(self):
+        return [self.tm_min, self.tm_max, self.hairpin_dg, self.dimer_dg, self.oligo_conc, self.na_conc]
+
+    # (dH, dS) summed over the stacks and the initiations of the duplex of seq, memoised
+    def stacks(self, seq):
+        value = self._stacks.get(seq)
+        if value is None:
+            dh, ds = INIT[seq[0]][0] + INIT[seq[-1]][0], INIT[seq[0]][1] + INIT[seq[-1]][1]
+            for i in range(len(seq) - 1):
+                h, s = NN[seq[i:i + 2]]
+                dh += h
+                ds += s
+            value = self._stacks[seq] = (dh, ds)
+        return value
+
+    def _tm(self, dh, ds, n):
+        ds += 0.368 * (n - 1) * math.log(self.na_conc)
+        return 1000 * dh / (ds + R * math.log(self.oligo_conc / 4)) - 273.15
+
+    # the Tm of a primer whose first tail bases (the enzyme flank, site and spacer) do not anneal to the template
+    def tm(self, primer, tail=0):
+        seq = primer[tail:].upper()
+        dh, ds = self.stacks(seq)
+        return self._tm(dh, ds, len(seq))
+
+    # the Tm of every primer: the stacks of all the primers not seen yet are summed at once over their encoded
+    # dinucleotides when NumPy is installed and they are many
+    def tms(self, primers, tail=0):
+        seqs = [x[tail:].upper() for x in primers]
+        todo = list({x for x in seqs if x not in self._stacks and len(x) > 1})
+        np = overhangTables._load_numpy() if len(todo) >= NUMPY_MIN_PRIMERS else None
+        if np is not None:
+            width = max(len(x) for x in todo) - 1
+            dh_table = np.zeros(17)
+            ds_table = np.zeros(17)
+            for pair, index in _NN_INDEX.items():
+                dh_table[index], ds_table[index] = NN[pair]
+            # 16 is the padding of the shorter primers, its stack is zero
+            index = np.full((len(todo), width), 16, dtype=np.int64)
+            for row, seq in enumerate(todo):
+                index[row, :len(seq) - 1] = [_NN_INDEX[seq[i:i + 2]] for i in range(len(seq) - 1)]
+            dh = dh_table[index].sum(axis=1)
+            ds = ds_table[index].sum(axis=1)
+            for row, seq in enumerate(todo):
+                self._stacks[seq] = (float(dh[row]) + INIT[seq[0]][0] + INIT[seq[-1]][0],
+                                     float(ds[row]) + INIT[seq[0]][1] + INIT[seq[-1]][1])
+        return [self._tm(*self.stacks(seq), len(seq)) for seq in seqs]
+
+    # dG of the most stable hairpin of the primer: a stem of paired bases closing a loop of at least MIN_LOOP
+    # bases; 0.0 when there is none
+    def hairpin(self, primer):
+        seq = primer.upper()
+        value = self._hairpins.get(seq)
+        if value is not None:
+            return value
+        n = len(seq)
+        best = 0.0
+        # stems along every antidiagonal i + j = d, grown outwards from the loop with running stacking sums
+        for d in range(MIN_LOOP + 1, 2 * n - MIN_LOOP - 2):
+            i = (d - MIN_LOOP - 1) // 2
+            j = d - i
+            run = 0
+            while i >= 0 and j < n:
+                if _COMPLEMENT[seq[i]] == seq[j]:
+                    if run == 0:
+                        loop = j - i - 1
+                        dh = ds = 0.0
+                    else:
+                        h, s = NN[seq[i:i + 2]]
+                        dh += h
+                        ds += s
+                        best = min(best, _dg(dh, ds) + _loop_dg(loop))
+                    run += 1
+                else:
+                    run = 0
+                i -= 1
+                j += 1
+        self._hairpins[seq] = best
+        return best
+
+    # dG of the most stable duplex between the 3' end of a and any part of b, the 3' base of a being paired;
+    # 0.0 when there is none
+    def dimer(self, a, b):
+        a = a.upper()
+        b = b.upper()
+        value = self._dimers.get((a, b))
+        if value is not None:
+            return value
+        # the bases of b paired with the 3' end of a read the reverse complement of a from its start, and as every
+        # stack is stabilising the longest such run is the most stable
+        rc = a.translate(_TRANSLATE)[::-1]
+        longest = 0
+        k = b.find(rc[:2])
+        while k >= 0:
+            run = 2
+            while run < len(rc) and k + run < len(b) and rc[run] == b[k + run]:
+                run += 1
+            longest = max(longest, run)
+            k = b.find(rc[:2], k + 1)
+        best = min(_dg(*self.stacks(a[len(a) - longest:])), 0.0) if longest else 0.0
+        self._dimers[(a, b)] = best
+        return best
+
+    # the scores of a set of primers and the number of checks it fails
+    def check(self, primers, tail=0):
+        tms = self.tms(primers, tail)
+        hairpin = min((self.hairpin(x) for x in primers), default=0.0)
+        dimer = min((self.dimer(a, b) for a in primers for b in primers), default=0.0)
+        failed = sum(1 for x in tms if not self.tm_min <= x <= self.tm_max) + \
+            sum(1 for x in primers if self.hairpin(x) < self.hairpin_dg) + \
+            sum(1 for a in primers for b in primers if self.dimer(a, b) < self.dimer_dg)
+        return {'tm_min': round(min(tms), 2), 'tm_max': round(max(tms), 2), 'hairpin_dg': round(hairpin, 2),
+                'dimer_dg': round(dimer, 2), 'failed': failed}
+
+
+# the checks of every set of primers and the set numbers in ranking order: fewest failed checks first, the order of
+# primer_sets otherwise
+def rank_sets(checker, primer_sets, tail=0):
+    # one batch for the Tm of all the primers, the checks of the sets then only read memoised values
+    checker.tms([x for primers in primer_sets for x in primers], tail)
+    checks = [checker.check(primers, tail) for primers in primer_sets]
+    return checks, sorted(range(len(primer_sets)), key=lambda i: checks[i]['failed'])
@@ -0,0 +1,120 @@
+# -- coding: utf-8 --
+
+# Protospacer discovery in FASTA files. The file is memory-mapped and every
+# record is read in fixed-size windows, so chromosomes of hundreds of MB are
+# never held as one Python string. A protospacer is the `length` bases before
+# an NGG PAM on either strand; protospacers with a BsaI site (GGTCTC or its
+# reverse complement GAGACC) are dropped since they cannot be cloned.
+#
+# Every record is one module of the array: fasta_candidates returns the same
+# (candidate_target_seq, module_num, module_name) as
+# primerMakerEngine.get_candidate_target_seq_from_file.
+
+import mmap
+import os
+import re
+from collections import namedtuple
+
+from primerMakerEngine import DesignError
+
+WINDOW_SIZE = 1 << 20
+FIRST_WINDOW_SIZE = 1 << 12
+FASTA_EXTENSIONS = ('.fa', '.fasta', '.fna', '.ffn', '.fas')
+BSAI_SITES = (b'GGTCTC', b'GAGACC')
+
+# start is the 0-based position of the protospacer on the + strand of the record, strand is '+' or '-', spacer is
+# read 5' to 3' on its own strand
+Protospacer = namedtuple('Protospacer', ['record', 'start', 'strand', 'spacer'])
+
+_COMPLEMENT = bytes.maketrans(b'ACGT', b'TGCA')
+_NOT_SEQUENCE = b' \t\r\n'
+
+
+def is_fasta(filename):
+    return filename.lower().endswith(FASTA_EXTENSIONS)
+
+
+# (name, first byte, end byte) of the sequence of every record
+def iter_records(mm):
+    start = mm.find(b'>')
+    while start != -1:
+        header_end = mm.find(b'\n', start)
+        if header_end == -1:
+            header_end = len(mm)
+        name = mm[start + 1:header_end].split(maxsplit=1)
+        name = name[0].decode('ascii', 'replace') if name else ''
+        end = mm.find(b'\n>', header_end)
+        yield name, header_end + 1, len(mm) if end == -1 else end + 1
+        start = -1 if end == -1 else end + 1
+
+
+def scan_region(mm, name, start, end, length=20, window=WINDOW_SIZE):
+    forward = re.compile(rb'(?=([ACGT]{%d})[ACGT]GG)' % length)
+    reverse = re.compile(rb'(?=CC[ACGT]([ACGT]{%d}))' % length)
+    # the end of a window that could still start a protospacer with its PAM; it is too short to hold a whole one,
+    # so no site is found twice
+    carry = b''
+    offset = 0
+    # - protospacers at the end of a window, a + one found in the next window can start before them
+    held = []
+    # windows grow from FIRST_WINDOW_SIZE up to window, so a caller that only wants the first hits reads little
+    a = start
+    size = min(FIRST_WINDOW_SIZE, window)
+    while a < end:
+        chunk = carry + mm[a:min(a + size, end)].translate(None, _NOT_SEQUENCE).upper()
+        a += size
+        size = min(size * 2, window)
+        hits = held
+        for m in forward.finditer(chunk):
+            spacer = m.group(1)
+            if not any(site in spacer for site in BSAI_SITES):
+                hits.append(Protospacer(name, offset + m.start(), '+', spacer.decode('ascii')))
+        for m in reverse.finditer(chunk):
+            spacer = m.group(1)
+            if not any(site in spacer for site in BSAI_SITES):
+                hits.append(Protospacer(name, offset + m.start(1), '-',
+                                        spacer.translate(_COMPLEMENT)[::-1].decode('ascii')))
+        hits.sort(key=lambda x: (x[1], x[2]))
+        keep = min(len(chunk), length + 2)
+        offset += len(chunk) - keep
+        carry = chunk[len(chunk) - keep:]
+        held = [x for x in hits if x[1] >= offset] if a < end else []
+        yield from hits[:len(hits) - len(held)]
+
+
+# every protospacer of every record, record by record and by position within a record
+def scan_fasta(filename, length=20, window=WINDOW_SIZE):
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for name, start, end in iter_records(mm):
+                yield from scan_region(mm, name, start, end, length, window)
+
+
+# the first max_candidates protospacers of every record as the candidates of one module; the rest of a record is
+# not scanned once it has enough
+def fasta_candidates(filename, length=20, max_candidates=10, window=WINDOW_SIZE):
+    candidate_target_seq = {}
+    module_name = []
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise DesignError(f'The FASTA file {filename} is empty.\n')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for name, start, end in iter_records(mm):
+                hits = scan_region(mm, name, start, end, length, window)
+                spacers = []
+                seen = set()
+                for hit in hits:
+                    if hit.spacer not in seen:
+                        seen.add(hit.spacer)
+                        spacers.append(hit.spacer)
+                    if max_candidates is not None and len(spacers) >= max_candidates:
+                        break
+                if not spacers:
+                    raise DesignError(f'No protospacer without BsaI site was found in {name}.\n')
+                module_name.append(name or str(len(module_name) + 1))
+                candidate_target_seq[len(module_name)] = spacers
+    if not module_name:
+        raise DesignError(f'No FASTA record was found in {filename}.\n')
+    return candidate_target_seq, len(module_name), module_name
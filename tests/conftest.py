@@ -0,0 +1,35 @@
+# -- coding: utf-8 --
+
+# Fixtures shared by the tests: a seeded ligation frequency matrix of 4 nt
+# overhangs, written like the published ones (see ligationFidelity).
+
+import random
+
+import pytest
+
+import primerMakerEngine as engine
+
+
+@pytest.fixture(scope='session')
+def tables():
+    return engine.get_tables(4, engine.BAD_SELF_PAIR_SEQ)
+
+
+# a 256 x 256 matrix: the Watson-Crick pairs ligate most, a fifth of the mismatched pairs ligate a little
+@pytest.fixture(scope='session')
+def fidelity_matrix(tmp_path_factory, tables):
+    rng = random.Random(7)
+    rc = tables.reverse_complement
+    lines = ['Overhang\t' + '\t'.join(tables.seq)]
+    for a in range(tables.size):
+        row = [rng.uniform(300, 1000) if b == rc[a] else rng.uniform(1, 40) if rng.random() < 0.2 else 0.0
+               for b in range(tables.size)]
+        lines.append(tables.seq[a] + '\t' + '\t'.join(f'{x:.3f}' for x in row))
+    path = tmp_path_factory.mktemp('fidelity') / 'ligation_frequency.tsv'
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def scorer(fidelity_matrix, tables):
+    return engine.load_scorer(fidelity_matrix, tables)
@@ -0,0 +1,57 @@
+# -- coding: utf-8 --
+
+# Batch runs: a bad construct only fails itself, and a results file cut by an
+# interruption is resumed without designing a construct twice.
+
+import io
+import json
+
+import batchDesign
+
+OPTIONS = {'donor': 'pGN1101', 'max_designs': 2, 'enzyme': 'BsaI', 'fidelity_matrix': None, 'max_nodes': None,
+           'cache_dir': None}
+
+MANIFEST = [{'id': 'a', 'modules': ['g1\tGATTACAGCTAGCTAGGCATCG', 'g2\tTTGACCGATGCATCGATCGATG']},
+            {'id': 'b', 'modules': [1, 2]},
+            'not json',
+            {'id': 'c', 'modules': ['g1\tACGTTGCAAGCTTGCATGCAAC', 'g2\tCCATGGAGCTCAGTCAGTACGA',
+                                    'g3\tAGCTTCGAATCGCGATACGCTA']},
+            {'id': 'a', 'modules': ['GATTACAGCTAGCTAGGCATCG']}]
+
+
+def manifest_lines():
+    return [x if isinstance(x, str) else json.dumps(x) for x in MANIFEST]
+
+
+def run(done=()):
+    output = io.StringIO()
+    counts = batchDesign.run_batch(manifest_lines(), output, OPTIONS, chunk_size=2, done=done)
+    return counts, [json.loads(x) for x in output.getvalue().splitlines()]
+
+
+# a result without its design time
+def timeless(x):
+    return {k: v for k, v in x.items() if k != 'seconds'}
+
+
+def test_bad_constructs_only_fail_themselves():
+    (designed, failed), results = run()
+    status = {x['id']: x['status'] for x in results}
+    assert status == {'a': 'ok', 'b': 'error', 'line 3': 'error', 'c': 'ok', 'line 5': 'error'}
+    assert (designed, failed) == (2, 3)
+
+
+def test_resume_truncates_a_cut_line_and_skips_the_done(tmp_path):
+    counts, results = run()
+    path = tmp_path / 'results.jsonl'
+    lines = [json.dumps(x) + '\n' for x in results]
+    # the run was stopped while writing its fourth line
+    path.write_text(''.join(lines[:3]) + lines[3][:len(lines[3]) // 2])
+    done = batchDesign.completed_ids(str(path))
+    assert done == {x['id'] for x in results[:3]}
+    assert path.read_text() == ''.join(lines[:3])
+    with open(path, 'a') as output:
+        batchDesign.run_batch(manifest_lines(), output, OPTIONS, chunk_size=2, done=done)
+    resumed = [json.loads(x) for x in path.read_text().splitlines()]
+    assert sorted(x['id'] for x in resumed) == sorted(x['id'] for x in results)
+    assert {x['id']: timeless(x) for x in resumed} == {x['id']: timeless(x) for x in results}
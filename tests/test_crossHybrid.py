@@ -0,0 +1,62 @@
+# -- coding: utf-8 --
+
+# Cross-hybridisation: the seed index reports the 3' end sites of a
+# comparison of every primer with every position of every sequence, and the
+# veto names the options holding such a site.
+
+import random
+
+import pytest
+
+from crossHybrid import CrossCheck, reverse_complement
+
+
+# (primer, target, strand, start, length) of every site where min_match bases or more of the 3' end anneal
+def naive_hits(primers, templates, min_match):
+    targets = [(name, '+', x.upper()) for name, x in primers.items()]
+    targets += [(name, strand, x) for name, sequence in templates.items()
+                for strand, x in (('+', sequence.upper()), ('-', reverse_complement(sequence.upper())))]
+    hits = set()
+    for primer, sequence in primers.items():
+        probe = reverse_complement(sequence.upper())
+        for target, strand, x in targets:
+            for start in range(len(x)):
+                length = 0
+                while length < len(probe) and start + length < len(x) and probe[length] == x[start + length]:
+                    length += 1
+                if length >= min_match:
+                    hits.add((primer, target, strand, start, length))
+    return hits
+
+
+@pytest.fixture
+def pool():
+    rng = random.Random(4)
+
+    def random_sequence(n):
+        return ''.join(rng.choice('ACGT') for _ in range(n))
+
+    primers = {f'p{i}': random_sequence(25) for i in range(12)}
+    templates = {f't{i}': random_sequence(60) for i in range(6)}
+    # the 3' ends of p0 and p1 anneal to t0 and to p2, p3 repeats p4
+    templates['t0'] = templates['t0'][:20] + reverse_complement(primers['p0'][-12:]) + templates['t0'][32:]
+    primers['p2'] = primers['p2'][:5] + reverse_complement(primers['p1'][-14:]) + primers['p2'][19:]
+    primers['p3'] = primers['p4']
+    return primers, templates
+
+
+def test_hits_match_a_comparison_of_every_position(pool):
+    primers, templates = pool
+    check = CrossCheck(seed_length=6, min_match=10)
+    hits = {tuple(x) for x in check.hits(primers, templates)}
+    assert hits == naive_hits(primers, templates, 10)
+    assert {('p0', 't0'), ('p1', 'p2')} <= {x[:2] for x in hits}
+
+
+def test_veto_names_the_options_with_a_site(pool):
+    primers, templates = pool
+    options = {'a': [templates['t1']], 'b': [templates['t2'], reverse_complement(templates['t0'])]}
+    assert CrossCheck().vetoed(options, [primers['p0'].lower()]) == {'b'}
+    assert CrossCheck().vetoed(options, [primers['p5']]) == set()
+    with pytest.raises(ValueError):
+        CrossCheck(seed_length=12, min_match=10)
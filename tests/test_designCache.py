@@ -0,0 +1,29 @@
+# -- coding: utf-8 --
+
+# The cache directory stays under its size limit without being scanned on
+# every write.
+
+import os
+
+import designCache
+import primerMakerEngine as engine
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, names in os.walk(directory)
+               for name in names)
+
+
+def test_put_get_and_eviction(tmp_path, monkeypatch):
+    result = engine.design({1: ['GATTACAGCTAGCTAGGCATCG'], 2: ['TTGACCGATGCATCGATCGATG']})
+    cache = designCache.DesignCache(str(tmp_path), memory_items=2, max_bytes=50000)
+    scans = []
+    walk = os.walk
+    monkeypatch.setattr(os, 'walk', lambda *args, **kwargs: scans.append(1) or walk(*args, **kwargs))
+    for n in range(300):
+        cache.put('%064x' % n, result)
+    monkeypatch.undo()
+    assert directory_size(str(tmp_path)) <= 50000
+    assert len(scans) < 100
+    assert engine.format_result(cache.get('%064x' % 299)) == engine.format_result(result)
+    assert designCache.DesignCache(str(tmp_path)).get('%064x' % 0) is None
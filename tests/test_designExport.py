@@ -0,0 +1,78 @@
+# -- coding: utf-8 --
+
+# Exported designs: every format writes one row per primer pair (per design
+# for jsonl, per oligo for the plates), the exporters flush by chunks, and a
+# monitor writes the designs of design() as they come.
+
+import csv
+import io
+import json
+
+import pytest
+
+import primerMakerEngine as engine
+from designExport import DesignExporter, ExportMonitor, guess_format, open_exporter, plate_well
+from designModel import COLUMNS
+
+from .test_primerMakerEngine import ARRAY
+
+
+@pytest.fixture(scope='module')
+def result():
+    return engine.design(ARRAY)
+
+
+def export(result, fmt, chunk_size=256):
+    output = io.StringIO()
+    with open_exporter(output, fmt, chunk_size) as exporter:
+        exporter.write_result(result)
+    return output.getvalue()
+
+
+def test_the_base_exporter_is_abstract():
+    with pytest.raises(TypeError):
+        DesignExporter(io.StringIO())
+
+
+@pytest.mark.parametrize('fmt,delimiter', [('tsv', '\t'), ('csv', ',')])
+def test_tables_have_a_row_per_primer_pair(result, fmt, delimiter):
+    rows = list(csv.reader(io.StringIO(export(result, fmt)), delimiter=delimiter))
+    assert rows[0] == COLUMNS
+    pairs = [(one_design, pair) for one_design in result.designs for pair in one_design.primers]
+    assert len(rows) == len(pairs) + 1
+    for row, (one_design, pair) in zip(rows[1:], pairs):
+        assert row[:3] == [str(one_design.number), pair.forward_name, pair.forward]
+        assert row[7] == ','.join(one_design.overhangs)
+
+
+def test_json_lines_have_an_object_per_design(result):
+    records = [json.loads(x) for x in export(result, 'jsonl').splitlines()]
+    assert [x['overhangs'] for x in records] == [x.overhangs for x in result.designs]
+    assert all(x['module_name'] == result.module_name for x in records)
+
+
+def test_plates_fill_the_wells_column_by_column(result):
+    assert [plate_well(n) for n in (0, 7, 8, 95, 96)] == [(1, 'A1'), (1, 'H1'), (1, 'A2'), (1, 'H12'), (2, 'A1')]
+    assert plate_well(16, 16, 24) == (1, 'A2')
+    rows = export(result, 'plate96').splitlines()
+    oligos = [x for one_design in result.designs for pair in one_design.primers for x in (pair.forward, pair.reverse)]
+    assert len(rows) == len(oligos) + 1
+    assert rows[1].split('\t')[:2] == ['1', 'A1']
+    assert [x.split('\t')[3] for x in rows[1:]] == oligos
+
+
+def test_exporters_write_by_chunks(result):
+    output = io.StringIO()
+    exporter = open_exporter(output, 'tsv', chunk_size=1)
+    assert output.getvalue() == ''
+    exporter.write_design(result, result.designs[0])
+    assert output.getvalue().count('\n') == 1 + len(result.designs[0].primers)
+    exporter.close()
+
+
+def test_the_monitor_exports_every_design(result):
+    output = io.StringIO()
+    with open_exporter(output, 'tsv') as exporter:
+        engine.design(ARRAY, monitor=ExportMonitor(exporter))
+    assert output.getvalue() == export(result, 'tsv')
+    assert [guess_format(x) for x in ('a.csv', 'a.json', 'a.plate384', 'a.txt')] == ['csv', 'jsonl', 'plate384', 'tsv']
@@ -0,0 +1,70 @@
+# -- coding: utf-8 --
+
+# The design service over loopback HTTP: concurrent requests are designed in
+# batches with the answers of a batch run, a bad construct only fails its own
+# request, and malformed requests get their HTTP error.
+
+import asyncio
+import io
+import json
+
+import batchDesign
+from designService import DesignService
+
+from .test_batchDesign import OPTIONS, manifest_lines, timeless
+
+
+async def request(port, method, path, body=b'', requests=1):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    answers = []
+    try:
+        # keep-alive: the same request several times on one connection
+        for _ in range(requests):
+            writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n'
+                         .encode('latin-1') + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line == b'\r\n':
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            answers.append((status, json.loads(await reader.readexactly(int(headers['content-length'])))))
+    finally:
+        writer.close()
+    return answers
+
+
+async def exchange(lines):
+    service = DesignService(OPTIONS, workers=1, batch_window=0.05)
+    server = await service.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        designed = await asyncio.gather(*[request(port, 'POST', '/design', x.encode()) for x in lines])
+        errors = [await request(port, 'POST', '/design', b'{"id":'),
+                  await request(port, 'GET', '/design'),
+                  await request(port, 'GET', '/nowhere'),
+                  await request(port, 'GET', '/health', requests=2)]
+        metrics = (await request(port, 'GET', '/metrics'))[0][1]
+    finally:
+        await service.close()
+    return [x[0] for x in designed], errors, metrics
+
+
+def test_requests_get_the_answers_of_a_batch_run():
+    # constructs a, b and c: the line that is not JSON is a bad request for the service, and the service does not
+    # check that the ids of its requests are unique
+    lines = [x for x in manifest_lines() if x.startswith('{')][:3]
+    designed, errors, metrics = asyncio.run(exchange(lines))
+    output = io.StringIO()
+    batchDesign.run_batch(lines, output, OPTIONS)
+    expected = [json.loads(x) for x in output.getvalue().splitlines()]
+    assert [status for status, answer in designed] == [200] * len(lines)
+    assert sorted((timeless(answer) for status, answer in designed), key=lambda x: x['id']) == \
+        sorted((timeless(x) for x in expected), key=lambda x: x['id'])
+    assert {answer['id']: answer['status'] for status, answer in designed}['b'] == 'error'
+    assert [[status for status, answer in x] for x in errors] == [[400], [405], [404], [200, 200]]
+    assert metrics['answers'] == {'200': len(lines), '400': 1, '405': 1}
+    assert metrics['batches'] < len(lines)
@@ -0,0 +1,52 @@
+# -- coding: utf-8 --
+
+# Site scanning: the automaton reports every site of every enzyme on both
+# strands, as a search for each site on its own does. Enzyme profiles: only
+# the 3 and 4 nt overhangs the overhang tables are built for are accepted.
+
+import random
+
+import pytest
+
+import primerMakerEngine as engine
+from enzymeSites import ENZYMES, PROFILES, EnzymeProfile, SiteScanner, reverse_complement
+
+
+# (enzyme, site, strand, start) of every site, searched one at a time
+def naive_scan(sequence, enzymes):
+    hits = []
+    for enzyme in enzymes:
+        site = ENZYMES[enzyme]
+        for strand, pattern in (('+', site), ('-', reverse_complement(site))):
+            hits += [(enzyme, site, strand, i) for i in range(len(sequence)) if sequence.startswith(pattern, i)]
+    return sorted(hits, key=lambda x: (x[3], x[0], x[2]))
+
+
+def test_scanner_matches_a_search_for_every_site():
+    rng = random.Random(5)
+    enzymes = ('BsaI', 'BbsI', 'Esp3I', 'SapI')
+    scanner = SiteScanner(enzymes)
+    sites = [ENZYMES[x] for x in enzymes] + [reverse_complement(ENZYMES[x]) for x in enzymes]
+    for _ in range(50):
+        parts = [''.join(rng.choice('ACGT') for _ in range(rng.randrange(8))) + rng.choice(sites)
+                 for _ in range(rng.randrange(1, 6))]
+        sequence = ''.join(parts)
+        hits = sorted((tuple(x) for x in scanner.scan(sequence.lower())), key=lambda x: (x[3], x[0], x[2]))
+        assert hits == naive_scan(sequence, enzymes)
+        assert scanner.contains_site(sequence)
+    assert not scanner.contains_site('ACGT' * 20)
+
+
+def test_module_hits_name_their_candidate():
+    hits = SiteScanner().scan_modules({1: ['ACGTACGT'], 2: ['AAAA', 'TTGAGACCTT']})
+    assert [(x.module, x.candidate, x.hit.strand, x.hit.start) for x in hits] == [(2, 1, '-', 2)]
+    with pytest.raises(KeyError):
+        SiteScanner(('NotAnEnzyme',))
+
+
+@pytest.mark.parametrize('length', [1, 2, 5])
+def test_profiles_reject_other_overhang_lengths(length):
+    with pytest.raises(ValueError, match='3 or 4 nt'):
+        EnzymeProfile('BsaI', 'GGTCTC', 't', length, 'ggctac')
+    with pytest.raises(ValueError, match='3 or 4 nt'):
+        engine.get_profile(PROFILES['BsaI']._replace(overhang_length=length))
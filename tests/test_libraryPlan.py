@@ -0,0 +1,78 @@
+# -- coding: utf-8 --
+
+# Library plans: the planned overhangs are compatible, the arrays a plan
+# reports covered are the ones that can take it, and the batch designs the
+# covered arrays within the plan.
+
+import io
+import itertools
+import json
+
+import pytest
+
+import batchDesign
+import libraryPlan
+import primerMakerEngine as engine
+
+from .test_batchDesign import OPTIONS
+from .test_primerMakerEngine import random_array
+
+
+@pytest.fixture(scope='module')
+def library():
+    lines = []
+    for seed in range(6):
+        array = random_array(seed, 5, 3)
+        lines.append(json.dumps({'id': f'a{seed}', 'modules': [f'g{m}\t' + ','.join(v) for m, v in array.items()]}))
+    domains = []
+    for construct_id, record, error in batchDesign.read_manifest(lines):
+        tables, junctions = engine.junction_domains(batchDesign.construct_inputs(record)[0])
+        domains.append(junctions)
+    return lines, tables, domains
+
+
+def check_compatible(tables, codes):
+    for a, b in itertools.combinations(codes, 2):
+        assert tables.is_compatible(a, b)
+
+
+def test_position_plan(library):
+    lines, tables, domains = library
+    plan, covered = libraryPlan.plan_positions(tables, domains)
+    check_compatible(tables, [x for x in plan if x is not None])
+    expected = [all(plan[p] is not None and (domain >> plan[p]) & 1 for p, domain in enumerate(junctions))
+                for junctions in domains]
+    assert [bool(covered >> i & 1) for i in range(len(domains))] == expected
+    assert any(expected)
+
+
+def test_global_plan(library):
+    lines, tables, domains = library
+    plan, covered = libraryPlan.plan_global(tables, domains)
+    check_compatible(tables, plan)
+    # an array is covered when its junctions can take different overhangs of the plan
+    expected = [any(all((domain >> code) & 1 for domain, code in zip(junctions, codes))
+                    for codes in itertools.permutations(plan, len(junctions)))
+                for junctions in domains]
+    assert [bool(covered >> i & 1) for i in range(len(domains))] == expected
+    assert any(expected)
+    assert len(libraryPlan.plan_global(tables, domains, max_overhangs=2)[0]) <= 2
+
+
+def test_covered_arrays_are_designed_within_the_plan(library):
+    lines, tables, domains = library
+    constructs = list(batchDesign.read_manifest(lines))
+    plans = libraryPlan.plan_library(constructs, OPTIONS, 'position')
+    output = io.StringIO()
+    batchDesign.run_batch((json.dumps(dict(record, id=construct_id)) for construct_id, record, error in constructs),
+                          output, OPTIONS)
+    results = [json.loads(x) for x in output.getvalue().splitlines()]
+    shared = [x for x in results if x.get('plan') == 'shared']
+    assert len(shared) >= plans['BsaI']['covered']
+    # a junction that cannot take the overhang of its position chooses its own
+    planned = {construct_id: record['overhang_plan'] for construct_id, record, error in constructs}
+    assert sum(None not in x for x in planned.values()) == plans['BsaI']['covered']
+    for x in shared:
+        for one_design in x['result']['designs']:
+            junctions = one_design['overhangs'][1:-1]
+            assert all(want is None or got == want for got, want in zip(junctions, planned[x['id']]))
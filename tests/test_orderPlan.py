@@ -0,0 +1,56 @@
+# -- coding: utf-8 --
+
+# Oligo orders: a primer shared by several constructs is ordered once, a
+# construct takes the tied design whose primers the others already order,
+# and the sheets of a batch name the well of every construct primer.
+
+import csv
+import io
+import json
+
+import batchDesign
+import orderPlan
+from designModel import Design, DesignResult, PrimerPair
+
+from .test_batchDesign import OPTIONS
+
+
+def result(*designs):
+    return DesignResult({}, 3, [], [], [], 'multi', designs=list(designs))
+
+
+def one_design(number, *pairs):
+    return Design(number, [PrimerPair('f', forward, 'r', reverse) for forward, reverse in pairs], [], [])
+
+
+def test_constructs_take_the_tied_design_sharing_primers():
+    constructs = [('a', result(one_design(1, ('ACGTACGT', 'CCCCAAAA')), one_design(2, ('GGGGTTTT', 'TTTTGGGG')))),
+                  ('b', result(one_design(1, ('ggggtttt', 'TTTTGGGG'))))]
+    chosen = orderPlan.plan_designs(constructs)
+    assert chosen['a'].number == 2
+    oligos = orderPlan.order_oligos(constructs, chosen)
+    assert len(oligos) == 2
+    assert all(len(uses) == 2 for sequence, uses in oligos.values())
+    # a design ranking below the first is not taken
+    chosen['a'].fidelity = 0.5
+    constructs[0][1].designs[0].fidelity = 0.9
+    assert orderPlan.plan_designs(constructs)['a'].number == 1
+
+
+def test_batch_order_sheets(tmp_path):
+    modules = ['g1\tGATTACAGCTAGCTAGGCATCG', 'g2\tTTGACCGATGCATCGATCGATG', 'g3\tACGTTGCAAGCTTGCATGCAAC']
+    manifest = [json.dumps({'id': 'x', 'modules': modules}), json.dumps({'id': 'y', 'modules': modules}),
+                json.dumps({'id': 'z', 'modules': modules[:2]})]
+    output = io.StringIO()
+    batchDesign.run_batch(manifest, output, OPTIONS)
+    order, constructs = tmp_path / 'order.tsv', tmp_path / 'constructs.tsv'
+    primers, distinct = orderPlan.plan_order(output.getvalue().splitlines(), str(order), str(constructs))
+    rows = list(csv.DictReader(io.StringIO(order.read_text()), delimiter='\t'))
+    uses = list(csv.DictReader(io.StringIO(constructs.read_text()), delimiter='\t'))
+    assert len(rows) == distinct < primers == len(uses)
+    # x and y are the same array: every oligo of x is also one of y
+    assert {x['OligoID'] for x in uses if x['Construct'] == 'x'} == {x['OligoID'] for x in uses if x['Construct'] == 'y'}
+    sequences = {x['OligoID']: x['Sequence'] for x in rows}
+    wells = {x['OligoID']: (x['Plate'], x['Well']) for x in rows}
+    assert [wells[x['OligoID']] for x in uses] == [(x['Plate'], x['Well']) for x in uses]
+    assert all(orderPlan.oligo_id(sequences[x['OligoID']]) == x['OligoID'] for x in uses)
@@ -0,0 +1,120 @@
+# -- coding: utf-8 --
+
+# The overhang set search: every set it returns is valid, the branch and
+# bound search finds the best sets of brute force over every combination of
+# candidates, max_nodes bounds it with or without a scorer and the sets found
+# do not depend on the number of workers, even when the budget is hit.
+
+import itertools
+import random
+
+import pytest
+
+from overhangSearch import search_overhang_sets, set_key
+
+FIXED = ['GCCG', 'GTTT']
+
+
+# junctions of (code, position, candidate index): every junction has overhangs of two candidate protospacers, some
+# of them repeated at several positions
+def random_junctions(tables, rng, junction_num, size):
+    allowed = tables.allowed_mask(FIXED)
+    codes = [c for c in range(tables.size) if (allowed >> c) & 1]
+    junctions = []
+    for _ in range(junction_num):
+        candidates = [(rng.choice(codes), rng.randrange(20), rng.randrange(2)) for _ in range(size)]
+        candidates += [(code, position + 1, candidate) for code, position, candidate in candidates[:2]]
+        junctions.append(candidates)
+    return junctions
+
+
+# the fidelity of the best max_sets distinct sets, by scoring every combination
+def brute_force(junctions, tables, scorer, max_sets):
+    fixed_codes = [tables.encode(x) for x in FIXED]
+    best = {}
+    for combo in itertools.product(*junctions):
+        codes = [x[0] for x in combo]
+        if all(tables.is_compatible(a, b) for a, b in itertools.combinations(codes, 2)):
+            best[set_key(combo)] = scorer.fidelity(fixed_codes + codes)
+    return sorted(best.values(), reverse=True)[:max_sets]
+
+
+def check_solution(junctions, tables, solution):
+    assert len(solution) == len(junctions)
+    for candidates, candidate in zip(junctions, solution):
+        assert tuple(candidate) in candidates
+    for a, b in itertools.combinations([x[0] for x in solution], 2):
+        assert tables.is_compatible(a, b)
+
+
+def test_unscored_search_finds_valid_sets(tables):
+    junctions = random_junctions(tables, random.Random(11), 5, 8)
+    ranked = search_overhang_sets(junctions, tables, 10, None, FIXED)
+    assert ranked
+    for score, solution in ranked:
+        assert score is None
+        check_solution(junctions, tables, solution)
+
+
+def test_unscored_search_is_deterministic(tables):
+    junctions = random_junctions(tables, random.Random(12), 6, 8)
+    assert search_overhang_sets(junctions, tables, 10, None, FIXED) == \
+        search_overhang_sets(junctions, tables, 10, None, FIXED)
+
+
+# 20 junctions of 7 overhangs: far too many partial sets to visit them all
+def test_node_limit_bounds_the_unscored_search(tables):
+    junctions = random_junctions(tables, random.Random(9), 20, 5)
+    stats = {}
+    ranked = search_overhang_sets(junctions, tables, 5, None, FIXED, max_nodes=500, stats=stats)
+    assert stats['explored'] <= 500
+    assert stats['exhaustive'] is False
+    for score, solution in ranked:
+        check_solution(junctions, tables, solution)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_scored_search_matches_brute_force(tables, scorer, seed):
+    rng = random.Random(seed)
+    junctions = random_junctions(tables, rng, 4, 6)
+    expected = brute_force(junctions, tables, scorer, 5)
+    ranked = search_overhang_sets(junctions, tables, 5, scorer, FIXED)
+    assert [score for score, solution in ranked] == pytest.approx(expected, rel=1e-12, abs=0)
+    for score, solution in ranked:
+        check_solution(junctions, tables, solution)
+    assert len({set_key(solution) for score, solution in ranked}) == len(ranked)
+
+
+def test_node_limit_bounds_the_scored_search(tables, scorer):
+    junctions = random_junctions(tables, random.Random(8), 6, 8)
+    stats = {}
+    search_overhang_sets(junctions, tables, 5, scorer, FIXED, max_nodes=10, stats=stats)
+    assert stats['explored'] <= 10
+    assert stats['exhaustive'] is False
+
+
+@pytest.mark.parametrize('scored', [True, False])
+def test_parallel_search_matches_serial(tables, scorer, scored):
+    junctions = random_junctions(tables, random.Random(5), 5, 8)
+    scorer = scorer if scored else None
+    serial = search_overhang_sets(junctions, tables, 5, scorer, FIXED)
+    parallel = search_overhang_sets(junctions, tables, 5, scorer, FIXED, workers=2)
+    assert parallel == serial
+
+
+# the budget is spent the same way whatever the number of workers
+@pytest.mark.parametrize('scored', [True, False])
+def test_parallel_search_matches_serial_within_the_node_limit(tables, scorer, scored):
+    if scored:
+        junctions, max_nodes = random_junctions(tables, random.Random(0), 8, 8), 2000
+    else:
+        junctions, max_nodes, scorer = random_junctions(tables, random.Random(9), 20, 5), 500, None
+    serial_stats = {}
+    serial = search_overhang_sets(junctions, tables, 5, scorer, FIXED, max_nodes=max_nodes, stats=serial_stats)
+    parallel_stats = {}
+    parallel = search_overhang_sets(junctions, tables, 5, scorer, FIXED, max_nodes=max_nodes, workers=2,
+                                    stats=parallel_stats)
+    assert serial_stats['exhaustive'] is False
+    assert serial_stats['explored'] <= max_nodes
+    assert parallel == serial
+    assert parallel_stats['exhaustive'] is False
@@ -0,0 +1,59 @@
+# -- coding: utf-8 --
+
+# The bitset tables against the pairwise checks they replaced: two overhangs
+# go together when they share fewer than 3 bases and neither does one with
+# the reverse complement of the other.
+
+import random
+
+import pytest
+
+import primerMakerEngine as engine
+
+
+def baseline_compatible(a, b):
+    return engine.hammingDistance(a, b) < 3 and engine.hammingDistance(engine.get_reverse_complement(a), b) < 3
+
+
+# the windows the original filter_targets kept
+def baseline_windows(sequence, fixed_overhangs, bad_self_pair_seq):
+    windows = []
+    for i in range(len(sequence) - 3):
+        overhang = sequence[i:i + 4]
+        reverse_overhang = engine.get_reverse_complement(overhang)
+        if overhang != reverse_overhang and overhang not in bad_self_pair_seq and \
+                all(engine.hammingDistance(overhang, x) < 3 and engine.hammingDistance(reverse_overhang, x) < 3
+                    for x in fixed_overhangs):
+            windows.append((overhang, i))
+    return windows
+
+
+def test_compatible_matches_baseline(tables):
+    for a in range(tables.size):
+        for b in range(tables.size):
+            assert tables.is_compatible(a, b) == baseline_compatible(tables.seq[a], tables.seq[b])
+
+
+def test_compatible_is_symmetric(tables):
+    for a in range(tables.size):
+        for b in range(tables.size):
+            assert tables.is_compatible(a, b) == tables.is_compatible(b, a)
+
+
+def test_allowed_windows_match_baseline(tables):
+    rng = random.Random(2)
+    fixed = ['GTTT', 'GCCG']
+    allowed = tables.allowed_mask(fixed)
+    for length in (3, 4, 24, 30, 500):
+        sequence = ''.join(rng.choice('ACGT') for _ in range(length))
+        expected = baseline_windows(sequence, fixed, engine.BAD_SELF_PAIR_SEQ)
+        assert [(tables.seq[c], i) for c, i in tables.allowed_windows(sequence, allowed)] == expected
+
+
+def test_numpy_windows_match_python(tables):
+    pytest.importorskip('numpy')
+    rng = random.Random(3)
+    allowed = tables.allowed_mask(['GTTT', 'GCCG'])
+    sequence = ''.join(rng.choice('ACGTN') for _ in range(2000))
+    python = [(c, i) for c, i in tables.window_codes(sequence) if (allowed >> c) & 1]
+    assert tables._allowed_windows_numpy(sequence, allowed) == python
@@ -0,0 +1,151 @@
+# -- coding: utf-8 --
+
+# Whole designs: the same inputs give the same primers in any process, the
+# overhang sets of a fixed array stay those of the reference search, the
+# node budget bounds a design the same way with any number of workers, and the
+# candidates of every module are used, with 4 or 3 nt overhangs; a redesign
+# after one module changed only searches its junction again.
+
+import itertools
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import primerMakerEngine as engine
+from enzymeSites import PROFILES
+from primerThermo import PrimerChecker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ARRAY = {1: ['GATTACAGCTAGCTAGGCATCG'],
+         2: ['TTGACCGATGCATCGATCGATG'],
+         3: ['ACGTTGCAAGCTTGCATGCAAC'],
+         4: ['CCATGGAGCTCAGTCAGTACGA'],
+         5: ['AGCTTCGAATCGCGATACGCTA']}
+
+
+def random_array(seed, module_num, candidate_num=1):
+    rng = random.Random(seed)
+    array = {}
+    for module_position in range(1, module_num + 1):
+        array[module_position] = []
+        for _ in range(candidate_num):
+            spacer = 'GGTCTC'
+            while 'GGTCTC' in spacer or 'GAGACC' in spacer:
+                spacer = ''.join(rng.choice('ACGT') for _ in range(20))
+            array[module_position].append(spacer)
+    return array
+
+
+def run_cli(path, hash_seed):
+    env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'primerMakerCLI.py'), '-i', str(path)], env=env,
+                          cwd=ROOT, capture_output=True, text=True, check=True).stdout
+
+
+def test_design_is_deterministic_across_processes(tmp_path):
+    path = tmp_path / 'targets.tsv'
+    path.write_text(''.join(f'g{m}\t{",".join(v)}\n' for m, v in ARRAY.items()))
+    outputs = {run_cli(path, seed) for seed in (0, 1, 123)}
+    assert len(outputs) == 1
+    assert 'Overhangs:' in outputs.pop()
+
+
+def test_design_is_deterministic_in_process(fidelity_matrix):
+    first = engine.design(ARRAY, fidelity_matrix=fidelity_matrix)
+    second = engine.design(ARRAY, fidelity_matrix=fidelity_matrix)
+    assert engine.format_result(first) == engine.format_result(second)
+
+
+def test_overhang_sets_are_unchanged():
+    result = engine.design(ARRAY)
+    assert [x.overhangs for x in result.designs] == [['GCCG', 'CCGT', 'TGAC', 'TCAG', 'GTTT'],
+                                                     ['GCCG', 'CCGT', 'TGAC', 'AGCC', 'GTTT'],
+                                                     ['GCCG', 'CCGT', 'TGAC', 'TGGA', 'GTTT'],
+                                                     ['GCCG', 'CCGT', 'TGAC', 'GGAG', 'GTTT'],
+                                                     ['GCCG', 'CCGT', 'TGAC', 'GAGC', 'GTTT']]
+
+
+# a 32 module array has no set the unscored search finds quickly, the budget stops it
+def test_node_limit_bounds_an_unscored_design():
+    report = {}
+    with pytest.raises(engine.DesignError, match='node limit'):
+        engine.design(random_array(1, 32), max_nodes=1000, report=report)
+    assert report['search']['explored'] <= 1000
+    assert report['search']['exhaustive'] is False
+
+
+# 6 modules of 10 candidates have far more sets than 2000 nodes visit: the designs do not depend on the workers
+def test_parallel_design_matches_serial_within_the_node_limit(fidelity_matrix):
+    array = random_array(4, 6, 10)
+    serial = engine.design(array, fidelity_matrix=fidelity_matrix, max_nodes=2000)
+    parallel = engine.design(array, fidelity_matrix=fidelity_matrix, max_nodes=2000, workers=2)
+    assert serial.exhaustive is False
+    assert engine.format_result(parallel) == engine.format_result(serial)
+
+
+# the protospacer of a junction is chosen with its overhang: a module whose first candidate has a BsaI site uses its
+# second one
+def test_multi_candidate_modules():
+    array = {1: ['GATTACAGCTAGCTAGGCATCG'],
+             2: ['TTGGTCTCGATGCATCGATCGA', 'TTGACCGATGCATCGATCGATG'],
+             3: ['ACGTTGCAAGCTTGCATGCAAC', 'CCATGGAGCTCAGTCAGTACGA'],
+             4: ['AGCTTCGAATCGCGATACGCTA']}
+    result = engine.design(array, max_designs=5)
+    assert result.designs
+    for one_design in result.designs:
+        assert one_design.targets[1] == array[2][1]
+        assert one_design.targets[2] in array[3]
+    assert 'Targets:' in ''.join(engine.format_result(result))
+
+
+# the end modules have no junction: without primer checks they keep their first candidate, with them another
+# candidate is taken when the first fails a check
+def test_end_candidates_are_chosen_by_the_primer_checks():
+    array = {1: ['GCGCGCGGCCGCGCGCAAAAAA', 'TTGACCGATGCATCGATCGATG'],
+             2: ['ACGTTGCAAGCTTGCATGCAAC'],
+             3: ['GGCATCGATTGCAGCTAGCTTA']}
+    result = engine.design(array, max_designs=3)
+    assert all(x.targets[0] == array[1][0] for x in result.designs)
+    assert any('first usable candidate' in x for x in engine.format_footer(result))
+    result = engine.design(array, max_designs=3, thermo=PrimerChecker(tm_max=74))
+    assert all(x.targets[0] == array[1][1] and x.thermo['failed'] == 0 for x in result.designs)
+
+
+# SapI leaves 3 nt overhangs: the sets are searched among 3 nt windows and every primer carries the SapI site
+def test_sapi_design_uses_3_nt_overhangs():
+    result = engine.design(ARRAY, profile='SapI')
+    prefix = PROFILES['SapI'].prefix
+    tables = engine.get_tables(3, [])
+    assert result.designs
+    for one_design in result.designs:
+        assert all(len(x) == 3 for x in one_design.overhangs)
+        for a, b in itertools.combinations(one_design.overhangs, 2):
+            assert tables.is_compatible(tables.encode(a), tables.encode(b))
+        for pair in one_design.primers:
+            assert pair.forward.startswith(prefix) and pair.reverse.startswith(prefix)
+        first = one_design.primers[0]
+        assert first.forward[len(prefix):].upper().startswith(one_design.overhangs[0])
+        assert first.reverse[len(prefix):].upper().startswith(engine.get_reverse_complement(one_design.overhangs[1]))
+
+
+# the other junctions keep the overhangs of the best previous set; other settings search everything again
+def test_incremental_redesign_of_a_changed_module():
+    designer = engine.IncrementalDesigner()
+    first = designer.design(ARRAY)
+    assert not first.repaired
+    assert engine.format_result(designer.design(ARRAY)) == engine.format_result(first)
+    changed = dict(ARRAY)
+    changed[3] = ['GGCATCGATTGCAGCTAGCTTA']
+    repaired = designer.design(changed)
+    assert repaired.repaired and repaired.designs
+    best = first.designs[0].overhangs
+    tables = engine.get_tables(4, engine.BAD_SELF_PAIR_SEQ)
+    for one_design in repaired.designs:
+        assert one_design.overhangs[:2] == best[:2] and one_design.overhangs[3:] == best[3:]
+        for a, b in itertools.combinations(one_design.overhangs, 2):
+            assert tables.is_compatible(tables.encode(a), tables.encode(b))
+    assert not designer.design(changed, max_designs=3).repaired
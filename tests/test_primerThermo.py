@@ -0,0 +1,73 @@
+# -- coding: utf-8 --
+
+# Primer thermodynamics: the batch Tm (NumPy or not) is the Tm of every
+# primer, the hairpin and dimer energies are those of a search over every
+# stem, and the sets are ranked by their failed checks.
+
+import random
+
+import pytest
+
+from primerThermo import MIN_LOOP, NN, PrimerChecker, _dg, _loop_dg, rank_sets
+
+COMPLEMENT = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A'}
+
+
+def random_primers(seed, number, length=30):
+    rng = random.Random(seed)
+    return [''.join(rng.choice('ACGT') for _ in range(length)) for _ in range(number)]
+
+
+# the most stable stem closing a loop, every innermost pair of a stem tried
+def naive_hairpin(seq):
+    best = 0.0
+    for i in range(len(seq)):
+        for j in range(i + MIN_LOOP + 1, len(seq)):
+            inner = j - i - 3 >= MIN_LOOP and COMPLEMENT[seq[i + 1]] == seq[j - 1]
+            if COMPLEMENT[seq[i]] != seq[j] or inner:
+                continue
+            dh = ds = 0.0
+            k = 1
+            while i - k >= 0 and j + k < len(seq) and COMPLEMENT[seq[i - k]] == seq[j + k]:
+                h, s = NN[seq[i - k:i - k + 2]]
+                dh += h
+                ds += s
+                best = min(best, _dg(dh, ds) + _loop_dg(j - i - 1))
+                k += 1
+    return best
+
+
+def test_batch_tm_is_the_tm_of_every_primer():
+    primers = random_primers(1, 300)
+    # 300 primers not seen yet: the NumPy batch when it is installed
+    batch = PrimerChecker().tms(primers, tail=6)
+    single = PrimerChecker()
+    assert batch == pytest.approx([single.tm(x, tail=6) for x in primers], rel=1e-12)
+    assert PrimerChecker().tm('GCGC' * 6) > PrimerChecker().tm('ATAT' * 6)
+
+
+def test_hairpins_match_a_search_over_every_stem():
+    checker = PrimerChecker()
+    primers = random_primers(2, 200, 24) + ['GCGCGCGCGCTTTTGCGCGCGCGC', 'ACGTACGTAC']
+    for primer in primers:
+        assert checker.hairpin(primer) == pytest.approx(naive_hairpin(primer), abs=1e-9)
+    assert checker.hairpin('GCGCGCGCGCTTTTGCGCGCGCGC') < -6.0
+
+
+def test_dimers_pair_the_3_end():
+    checker = PrimerChecker()
+    primer = 'ACGTTGCAAGCTTGCATGCAAC'
+    partner = ''.join(COMPLEMENT[x] for x in reversed(primer))
+    assert checker.dimer(primer, partner) == pytest.approx(_dg(*checker.stacks(primer)))
+    # the 3' end of primer pairs with nothing of a poly-A
+    assert checker.dimer(primer, 'A' * 30) == 0.0
+
+
+def test_sets_are_ranked_by_failed_checks():
+    checker = PrimerChecker(tm_min=55, tm_max=70)
+    good = ['ACGTTGCAAGCTTGCATGCAAC', 'CCATGGAGCTCAGTCAGTACGA']
+    hot = ['GCGCGCGGCCGCGCGCGGCCGCGCGC', 'CCATGGAGCTCAGTCAGTACGA']
+    # the hot primer is out of the Tm range, folds on itself and pairs with itself
+    checks, order = rank_sets(checker, [hot, good, hot, good])
+    assert [x['failed'] for x in checks] == [3, 0, 3, 0]
+    assert order == [1, 3, 0, 2]
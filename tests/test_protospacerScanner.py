@@ -0,0 +1,69 @@
+# -- coding: utf-8 --
+
+# FASTA scanning: the windowed scan finds the protospacers of a whole-record
+# regular expression search in the same order, including the ones across
+# window boundaries and line breaks, and drops the ones with a BsaI site.
+
+import random
+import re
+
+import pytest
+
+from primerMakerEngine import DesignError, get_reverse_complement
+from protospacerScanner import fasta_candidates, scan_fasta
+
+
+def write_fasta(path, records, line_length=60):
+    with open(path, 'w') as f:
+        for name, sequence in records:
+            f.write(f'>{name} description\n')
+            for i in range(0, len(sequence), line_length):
+                f.write(sequence[i:i + line_length] + '\n')
+
+
+# (record, start, strand, spacer) of every protospacer, by position within a record, + before -
+def reference_scan(records, length=20):
+    hits = []
+    for name, sequence in records:
+        sequence = sequence.upper()
+        found = [(name, m.start(), '+', m.group(1))
+                 for m in re.finditer(r'(?=([ACGT]{%d})[ACGT]GG)' % length, sequence)]
+        found += [(name, m.start(1), '-', get_reverse_complement(m.group(1)))
+                  for m in re.finditer(r'(?=CC[ACGT]([ACGT]{%d}))' % length, sequence)]
+        found.sort(key=lambda x: (x[1], x[2]))
+        hits += [x for x in found if 'GGTCTC' not in x[3] and 'GAGACC' not in x[3]]
+    return hits
+
+
+@pytest.fixture
+def records():
+    rng = random.Random(3)
+    sequence = ''.join(rng.choice('ACGT') for _ in range(5000))
+    # a protospacer with a BsaI site, and lower case bases
+    planted = sequence[:1000] + 'AAGGTCTCAAAAAAAAAAAATGG' + sequence[1000:2000].lower() + sequence[2000:]
+    return [('chr1', planted), ('chr2', ''.join(rng.choice('ACGT') for _ in range(3000)))]
+
+
+@pytest.mark.parametrize('window', [64, 100, 1 << 20])
+def test_windowed_scan_matches_a_whole_record_search(tmp_path, records, window):
+    path = str(tmp_path / 'genome.fa')
+    write_fasta(path, records)
+    hits = [tuple(x) for x in scan_fasta(path, window=window)]
+    assert hits == reference_scan(records)
+    assert not any('GGTCTC' in x[3] for x in hits)
+
+
+def test_fasta_candidates_take_the_first_distinct_protospacers(tmp_path, records):
+    path = str(tmp_path / 'genome.fa')
+    write_fasta(path, records)
+    candidate_target_seq, module_num, module_name = fasta_candidates(path, max_candidates=3, window=64)
+    assert (module_num, module_name) == (2, ['chr1', 'chr2'])
+    for module, (name, sequence) in enumerate(records, 1):
+        first = []
+        for hit in reference_scan([(name, sequence)]):
+            if hit[3] not in first:
+                first.append(hit[3])
+        assert candidate_target_seq[module] == first[:3]
+    write_fasta(path, [('empty', 'ACGTACGT')])
+    with pytest.raises(DesignError, match='No protospacer'):
+        fasta_candidates(path)